@@ -0,0 +1,61 @@
+"""Benchmark the IK solvers: iterations-to-convergence and wall time per solve.
+
+    python bench_ik.py [--n 500] [--seed 0]
+
+Jog targets: 1 cm Cartesian step from a random configuration (orientation kept
+for the pose solvers). Move targets: FK of a random joint offset (~10 deg/joint).
+"clamped" is the original move_cartesian loop (position only, fixed lam=0.05).
+"""
+import argparse
+import time
+import numpy as np
+
+from kinematics import forward_kinematics, JOINT_MIN, JOINT_MAX
+from ik_solver import solve_position, solve_pose
+
+
+def make_cases(n, seed):
+    rng = np.random.default_rng(seed)
+    jogs, moves = [], []
+    for _ in range(n):
+        q0 = rng.uniform(JOINT_MIN + 5, JOINT_MAX - 5, 6)
+        T0, _ = forward_kinematics(q0)
+        d = rng.normal(size=3)
+        Tj = T0.copy()
+        Tj[:3, 3] += 0.01 * d / np.linalg.norm(d)
+        jogs.append((q0, Tj))
+        q1 = np.clip(q0 + rng.normal(0, 10, 6), JOINT_MIN, JOINT_MAX)
+        moves.append((q0, forward_kinematics(q1)[0]))
+    return {"jog": jogs, "move": moves}
+
+
+SOLVERS = {
+    "clamped (current)": lambda q0, T: solve_position(q0, T[:3, 3], mode="clamped", max_iter=30),
+    "bounded position": lambda q0, T: solve_position(q0, T[:3, 3], mode="bounded", max_iter=30),
+    "pose DLS fixed lam": lambda q0, T: solve_pose(q0, T, adaptive=False),
+    "pose LM adaptive": lambda q0, T: solve_pose(q0, T, adaptive=True),
+}
+
+
+def run(cases):
+    print(f"{'case':6s} {'solver':20s} {'ok %':>6s} {'it mean':>8s} {'it p95':>7s} "
+          f"{'ms mean':>8s} {'ms p95':>7s}")
+    for name, items in cases.items():
+        for label, solve in SOLVERS.items():
+            its, times, ok = [], [], 0
+            for q0, T in items:
+                t0 = time.perf_counter()
+                r = solve(q0, T)
+                times.append((time.perf_counter() - t0) * 1000)
+                its.append(r.iterations)
+                ok += r.ok
+            print(f"{name:6s} {label:20s} {100*ok/len(items):6.1f} {np.mean(its):8.2f} "
+                  f"{np.percentile(its, 95):7.1f} {np.mean(times):8.3f} {np.percentile(times, 95):7.3f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    run(make_cases(args.n, args.seed))
@@ -0,0 +1,328 @@
+"""Fit servo pulse curves and the DH model to measured samples (batch least squares).
+
+    python calibrate.py servos servo_samples.csv [--knots 7] [--method pchip]
+    python calibrate.py model pose_samples.csv [--fit offsets,base,d,a] [--angles]
+    python calibrate.py check pose_samples.csv [--angles]
+
+servo samples, one measurement per line:
+    servo,pulse,angle        servo 1..6, commanded pulse (us), measured joint angle (deg)
+
+pose samples, one arm pose per line:
+    p1,p2,p3,p4,p5,p6,x,y,z  commanded pulses (us) (--angles: joint angles, deg),
+                             measured end-effector position (mm, measuring frame)
+
+`servos` regresses the measured angle on the commanded pulse (the exact variable)
+with a piecewise-linear curve over `knots` pulse values, one linear solve per
+servo, and writes the knots to servo_calibration.json (calibration.py).
+
+`model` converts the commanded pulses to angles through that calibration and
+fits joint zero offsets, base origin and DH d / a (optionally alpha) to the
+measured positions with Levenberg-Marquardt. All residuals and the Jacobian come
+from one joint_frames_batch() call per iteration; every column is analytic
+(offset: z x (p - o), d: z of the previous frame, a: x of the frame, base: I).
+Huber weights keep a few bad measurements from pulling the fit (gross ones are
+dropped once the model is close). A prior term
+pulls every parameter toward its nominal value (PRIOR_SIGMA: how far it may
+plausibly be off), so directions the poses cannot see - the J6 offset with the
+tool on the J6 axis, d1 against base z - stay nominal instead of wandering to
+whatever fits the noise; the report names them. The result goes to
+robot_model.json, which kinematics.load_model() installs at startup; a fit that
+runs out of iterations is not saved unless --force is given.
+"""
+import argparse
+import csv
+import math
+import numpy as np
+
+import kinematics
+from kinematics import N_JOINTS, MODEL_PATH, joint_frames_batch, set_model
+from calibration import PULSE_MIN, PULSE_MAX, DEFAULT_PATH, ServoCalibration
+
+GROUPS = ("offsets", "base", "d", "a", "alpha")
+DEFAULT_FIT = ("offsets", "base", "d", "a")
+# plausible deviation from nominal per group (deg or m) for the prior term
+PRIOR_SIGMA = {"offsets": 5.0, "base": 1.0, "d": 0.01, "a": 0.01, "alpha": 5.0}
+MEAS_SIGMA = 0.001                 # m, position noise the prior is weighed against
+
+
+def read_samples(path, columns):
+    """Numeric rows with `columns` values; '#' comments and a header line skipped."""
+    rows = []
+    with open(path, newline="") as f:
+        for lineno, row in enumerate(csv.reader(f), 1):
+            if not row or row[0].lstrip().startswith("#"):
+                continue
+            try:
+                vals = [float(v) for v in row if v.strip()]
+            except ValueError:
+                if lineno == 1:
+                    continue
+                raise ValueError(f"{path}:{lineno}: not a number: {row}")
+            if len(vals) != columns:
+                raise ValueError(f"{path}:{lineno}: expected {columns} values, got {len(vals)}")
+            rows.append(vals)
+    return np.array(rows, dtype=float).reshape(-1, columns)
+
+
+# ---------------- servo curves ----------------
+def _hat_basis(x, knots):
+    """(N, K) piecewise-linear interpolation weights of x over increasing knots."""
+    x = np.clip(x, knots[0], knots[-1])
+    k = np.clip(np.searchsorted(knots, x, side="right") - 1, 0, len(knots) - 2)
+    t = (x - knots[k]) / (knots[k + 1] - knots[k])
+    B = np.zeros((len(x), len(knots)))
+    rows = np.arange(len(x))
+    B[rows, k] = 1.0 - t
+    B[rows, k + 1] = t
+    return B
+
+
+def fit_servo_curve(pulses, angles, n_knots=7, smooth=1e-3):
+    """Least-squares angle(pulse) through n_knots evenly spaced pulse values.
+
+    A small second-difference penalty keeps knots with few samples on the line
+    through their neighbours. Returns (knot_angles, knot_pulses, residuals)."""
+    pulses = np.asarray(pulses, dtype=float)
+    angles = np.asarray(angles, dtype=float)
+    knots = np.linspace(pulses.min(), pulses.max(), max(2, min(n_knots, len(np.unique(pulses)))))
+    B = _hat_basis(pulses, knots)
+    if len(knots) > 2:
+        D = np.diff(np.eye(len(knots)), 2, axis=0) * math.sqrt(smooth * len(pulses))
+        A = np.vstack([B, D])
+        b = np.concatenate([angles, np.zeros(len(D))])
+    else:
+        A, b = B, angles
+    knot_angles = np.linalg.lstsq(A, b, rcond=None)[0]
+    return knot_angles, knots, angles - B @ knot_angles
+
+
+def fit_servos(samples, n_knots=7, method="pchip", base=None):
+    """samples: (N,3) servo, pulse, angle. Servos without samples keep their curve
+    from `base` (default: the linear GUI formula). Returns (ServoCalibration, report)."""
+    base = base or ServoCalibration.linear()
+    servos, report = [], []
+    for i in range(len(base.points)):
+        sel = samples[:, 0] == i + 1
+        if not np.any(sel):
+            servos.append(base.points[i])
+            report.append(None)
+            continue
+        a, p, res = fit_servo_curve(samples[sel, 1], samples[sel, 2], n_knots)
+        if not (np.all(np.diff(a) > 0) or np.all(np.diff(a) < 0)):
+            raise ValueError(f"servo {i + 1}: fitted curve is not monotone, check the samples")
+        servos.append((a, p))
+        report.append((int(sel.sum()), float(np.sqrt(np.mean(res ** 2))), float(np.max(np.abs(res)))))
+    return ServoCalibration(servos, method), report
+
+
+# ---------------- DH model ----------------
+def _get_params(groups):
+    dh = np.array(kinematics.DH_TABLE, dtype=float)
+    parts = {"offsets": np.array(kinematics.JOINT_OFFSETS), "base": np.array(kinematics.BASE_OFFSET),
+             "d": dh[:, 0], "a": dh[:, 1], "alpha": dh[:, 2]}
+    return np.concatenate([parts[g] for g in groups])
+
+
+def _nominal_params(groups):
+    dh = np.array(kinematics.NOMINAL_DH, dtype=float)
+    parts = {"offsets": np.zeros(N_JOINTS), "base": np.zeros(3),
+             "d": dh[:, 0], "a": dh[:, 1], "alpha": dh[:, 2]}
+    return np.concatenate([parts[g] for g in groups])
+
+
+def _param_names(groups):
+    return [f"base {c}" if g == "base" else f"{g} J{j + 1}"
+            for g in groups for j, c in enumerate("xyz" if g == "base" else [None] * N_JOINTS)]
+
+
+def _set_params(groups, x):
+    dh = np.array(kinematics.DH_TABLE, dtype=float)
+    offsets, base = list(kinematics.JOINT_OFFSETS), list(kinematics.BASE_OFFSET)
+    i = 0
+    for g in groups:
+        n = 3 if g == "base" else N_JOINTS
+        v = x[i:i + n]
+        i += n
+        if g == "offsets":
+            offsets = v
+        elif g == "base":
+            base = v
+        else:
+            dh[:, ("d", "a", "alpha").index(g)] = v
+    set_model(dh, offsets, base)
+
+
+def _residual_jacobian(q, xyz, groups):
+    """Stacked (3N,) position residuals (m) and (3N, P) Jacobian of the active model."""
+    F = joint_frames_batch(q)                         # (7,N,4,4)
+    p_end = F[-1, :, :3, 3]
+    r = (p_end - xyz).reshape(-1)
+    cols = []
+    for g in groups:
+        if g == "base":
+            cols.append(np.broadcast_to(np.eye(3), (len(q), 3, 3)))
+            continue
+        for j in range(N_JOINTS):
+            prev, this = F[j], F[j + 1]
+            if g == "offsets":                        # rotation about z_{j} (per deg)
+                c = np.cross(prev[:, :3, 2], p_end - prev[:, :3, 3]) * (math.pi / 180.0)
+            elif g == "d":
+                c = prev[:, :3, 2]
+            elif g == "a":
+                c = this[:, :3, 0]
+            else:                                     # alpha: rotation about x of the frame
+                c = np.cross(this[:, :3, 0], p_end - this[:, :3, 3]) * (math.pi / 180.0)
+            cols.append(c[:, :, None])
+    J = np.concatenate(cols, axis=2)                  # (N,3,P)
+    return r, J.reshape(-1, J.shape[2])
+
+
+def _huber(r, delta):
+    """Per-sample IRLS weights from the 3D position error (m). Once the model fits
+    most poses (median error within delta), poses off by more than 3 delta are
+    dropped: even down-weighted, a few gross errors bend the weakly seen parameters."""
+    e = np.linalg.norm(r.reshape(-1, 3), axis=1)
+    w = np.where(e <= delta, 1.0, delta / np.maximum(e, 1e-12))
+    if len(e) and np.median(e) <= delta:
+        w[e > 3 * delta] = 0.0
+    return np.repeat(np.sqrt(w), 3)
+
+
+def fit_model(q, xyz, groups=DEFAULT_FIT, max_iter=50, huber=0.005, tol=1e-9, prior=PRIOR_SIGMA):
+    """Levenberg-Marquardt over the selected parameter groups, starting from the
+    active model; installs and returns the result as a report dict. q: (N,6) deg,
+    xyz: (N,3) m. prior: per-group sigma of the pull toward nominal (None: off),
+    which keeps directions the data cannot see at their nominal values."""
+    groups = tuple(g for g in GROUPS if g in groups)
+    x = _get_params(groups)
+    x0 = _nominal_params(groups)
+    P = (np.concatenate([np.full(3 if g == "base" else N_JOINTS, MEAS_SIGMA / prior[g]) for g in groups])
+         if prior else np.zeros(len(x)))
+
+    def total(x, r, w):
+        return float(np.sum((w * r) ** 2) + np.sum((P * (x - x0)) ** 2))
+
+    r, J = _residual_jacobian(q, xyz, groups)
+    w = _huber(r, huber) if huber else np.ones_like(r)
+    cost = total(x, r, w)
+    rms0 = float(np.sqrt(np.mean(np.sum(r.reshape(-1, 3) ** 2, axis=1))))
+    lam = 1e-3
+    it = 0
+    converged = max_iter == 0
+    while it < max_iter:
+        it += 1
+        Jw = np.vstack([J * w[:, None], np.diag(P)])
+        scale = np.linalg.norm(Jw, axis=0)
+        scale[scale < 1e-12] = 1.0
+        Js = Jw / scale
+        A = np.vstack([Js, math.sqrt(lam) * np.eye(len(x))])
+        b = np.concatenate([-w * r, -P * (x - x0), np.zeros(len(x))])
+        step = np.linalg.lstsq(A, b, rcond=None)[0] / scale
+        _set_params(groups, x + step)
+        r_new, J_new = _residual_jacobian(q, xyz, groups)
+        cost_new = total(x + step, r_new, w)
+        if cost_new < cost:
+            x, r, J = x + step, r_new, J_new
+            done = cost - cost_new < tol * max(cost, 1e-12) or np.max(np.abs(step)) < 1e-10
+            cost, lam = cost_new, max(lam / 10.0, 1e-9)
+            if huber:
+                w = _huber(r, huber)
+                cost = total(x, r, w)
+            if done:
+                converged = True
+                break
+        else:
+            _set_params(groups, x)
+            lam *= 10.0
+            if lam > 1e8:                             # no downhill step left: at the minimum
+                converged = True
+                break
+    _set_params(groups, x)
+    err = np.linalg.norm(r.reshape(-1, 3), axis=1)
+    # what the data cannot determine: directions along which a plausible deviation
+    # (PRIOR_SIGMA) moves the measured points by less than the noise in total;
+    # one entry per direction, naming the parameters that trade off along it
+    sigma = np.concatenate([np.full(3 if g == "base" else N_JOINTS, PRIOR_SIGMA[g]) for g in groups])
+    _, sv, Vt = np.linalg.svd(J * (w[:, None] * sigma / MEAS_SIGMA))
+    sv = np.concatenate([sv, np.zeros(len(x) - len(sv))])
+    names = _param_names(groups)
+    weak = [" / ".join(names[k] for k in np.flatnonzero(np.abs(v) > 0.3))
+            for s_, v in zip(sv, Vt) if s_ < 1.0]
+    return {"groups": list(groups), "samples": len(q), "iterations": it, "converged": converged,
+            "rms_before_mm": rms0 * 1000.0, "rms_mm": float(np.sqrt(np.mean(err ** 2))) * 1000.0,
+            "max_mm": float(err.max()) * 1000.0 if len(err) else 0.0,
+            "median_mm": float(np.median(err)) * 1000.0 if len(err) else 0.0,
+            "outliers": int(np.sum(err > 3 * huber)) if huber else 0,
+            "unidentified": weak}
+
+
+def pose_samples(path, angles=False, calibration=None):
+    """(q deg, xyz m) from a pose sample file; pulses go through the servo calibration."""
+    data = read_samples(path, N_JOINTS + 3)
+    cmd = data[:, :N_JOINTS]
+    if not angles:
+        if np.any((cmd < PULSE_MIN) | (cmd > PULSE_MAX)):
+            raise ValueError(f"{path}: pulses outside {PULSE_MIN}..{PULSE_MAX} (angles? use --angles)")
+        cal = calibration or ServoCalibration.load() or ServoCalibration.linear()
+        cmd = cal.to_angles(cmd)
+    return cmd, data[:, N_JOINTS:] / 1000.0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("servos", help="fit per-servo pulse curves")
+    s.add_argument("samples")
+    s.add_argument("--knots", type=int, default=7)
+    s.add_argument("--method", choices=("linear", "pchip"), default="pchip")
+    s.add_argument("--out", default=DEFAULT_PATH)
+    for name in ("model", "check"):
+        m = sub.add_parser(name, help="fit the DH model" if name == "model" else "residuals of the model")
+        m.add_argument("samples")
+        m.add_argument("--angles", action="store_true", help="first six columns are angles (deg)")
+        m.add_argument("--model", default=MODEL_PATH)
+        m.add_argument("--calibration", default=DEFAULT_PATH, help="servo calibration for the pulses")
+        if name == "model":
+            m.add_argument("--fit", default=",".join(DEFAULT_FIT), help=f"groups from {','.join(GROUPS)}")
+            m.add_argument("--huber", type=float, default=5.0, help="robust threshold (mm), 0 = plain LS")
+            m.add_argument("--nominal", action="store_true", help="start from the nominal DH table")
+            m.add_argument("--no-prior", action="store_true", help="no pull toward nominal values")
+            m.add_argument("--force", action="store_true", help="save even if the fit did not converge")
+    args = ap.parse_args()
+
+    if args.cmd == "servos":
+        cal, report = fit_servos(read_samples(args.samples, 3), args.knots, args.method)
+        for i, r in enumerate(report):
+            print(f"servo {i + 1}: " + ("no samples, linear" if r is None else
+                                        f"{r[0]} samples, rms {r[1]:.2f} deg, max {r[2]:.2f} deg"))
+        cal.save(args.out)
+        print(f"-> {args.out}")
+    else:
+        if not (args.cmd == "model" and args.nominal):
+            kinematics.load_model(args.model)
+        q, xyz = pose_samples(args.samples, args.angles, ServoCalibration.load(args.calibration))
+        if args.cmd == "check":
+            err = np.linalg.norm(kinematics.forward_kinematics_batch(q)[:, :3, 3] - xyz, axis=1) * 1000
+            print(f"{len(q)} poses: rms {np.sqrt(np.mean(err ** 2)):.2f} mm, max {err.max():.2f} mm")
+        else:
+            groups = [g.strip() for g in args.fit.split(",") if g.strip()]
+            bad = set(groups) - set(GROUPS)
+            if bad:
+                raise SystemExit(f"unknown parameter groups: {', '.join(sorted(bad))}")
+            rep = fit_model(q, xyz, groups, huber=args.huber / 1000.0,
+                            prior=None if args.no_prior else PRIOR_SIGMA)
+            print(f"{rep['samples']} poses, {rep['iterations']} iterations: rms {rep['rms_before_mm']:.2f}"
+                  f" -> {rep['rms_mm']:.2f} mm (median {rep['median_mm']:.2f}, max {rep['max_mm']:.2f} mm)")
+            if rep["outliers"]:
+                print(f"  {rep['outliers']} pose(s) off by more than {3 * args.huber:g} mm, down-weighted")
+            if rep["unidentified"]:
+                held = "" if args.no_prior else " (kept near nominal by the prior)"
+                print(f"  not constrained by the data{held}: {', '.join(rep['unidentified'])}")
+            print("  offsets (deg):", np.round(kinematics.JOINT_OFFSETS, 3).tolist())
+            print("  base (mm):", np.round(np.array(kinematics.BASE_OFFSET) * 1000, 2).tolist())
+            if not rep["converged"]:
+                print(f"  did not converge in {rep['iterations']} iterations")
+                if not args.force:
+                    raise SystemExit("model not saved (--force to save anyway)")
+            kinematics.save_model(args.model, fit=rep)
+            print(f"-> {args.model}")
@@ -0,0 +1,173 @@
+"""Per-servo pulse calibration: measured (angle, pulse) points -> dense lookup tables.
+
+    python calibration.py linear                      # the GUI formula 500 + 2000*a/180
+    python calibration.py linear --step-per-10deg 72.222 50 116.7 105.55 111.11 105.55 --zero 1500
+    python calibration.py show [--path servo_calibration.json]
+
+servo_calibration.json:
+    {"method": "pchip" | "linear",
+     "servos": [{"angles": [0, 45, 90, ...], "pulses": [510, 1020, 1500, ...]}, ...]}
+
+Each servo's curve (piecewise linear, or a monotone PCHIP spline through the
+points) is sampled once into a table of RESOLUTION deg steps, and its inverse
+into a table over every integer pulse PULSE_MIN..PULSE_MAX. to_pulses() /
+to_angles() are then one fancy-indexing op for any (..., 6) array.
+"""
+import argparse
+import json
+import os
+import numpy as np
+
+from kinematics import N_JOINTS, JOINT_MIN, JOINT_MAX
+
+PULSE_MIN = 500
+PULSE_MAX = 2500
+RESOLUTION = 0.1                   # deg per forward-table entry
+METHODS = ("linear", "pchip")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "servo_calibration.json")
+
+
+def _pchip(x, y, xq):
+    """Monotone cubic Hermite interpolation (Fritsch-Carlson), x increasing."""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    m = np.zeros_like(y)
+    if len(x) == 2:
+        m[:] = delta[0]
+    else:
+        w1 = 2 * h[1:] + h[:-1]
+        w2 = h[1:] + 2 * h[:-1]
+        same = delta[:-1] * delta[1:] > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hm = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+        m[1:-1] = np.where(same, hm, 0.0)
+        # one-sided end slopes, kept shape preserving
+        m[0] = ((2 * h[0] + h[1]) * delta[0] - h[0] * delta[1]) / (h[0] + h[1])
+        m[-1] = ((2 * h[-1] + h[-2]) * delta[-1] - h[-1] * delta[-2]) / (h[-1] + h[-2])
+        for i, d in ((0, delta[0]), (-1, delta[-1])):
+            if np.sign(m[i]) != np.sign(d):
+                m[i] = 0.0
+    k = np.clip(np.searchsorted(x, xq, side="right") - 1, 0, len(x) - 2)
+    t = (xq - x[k]) / h[k]
+    t2, t3 = t * t, t * t * t
+    return ((2 * t3 - 3 * t2 + 1) * y[k] + (t3 - 2 * t2 + t) * h[k] * m[k]
+            + (-2 * t3 + 3 * t2) * y[k + 1] + (t3 - t2) * h[k] * m[k + 1])
+
+
+class ServoCalibration:
+    def __init__(self, servos, method="linear"):
+        """servos: one (angles, pulses) pair of sequences per servo."""
+        if method not in METHODS:
+            raise ValueError(f"unknown calibration method: {method}")
+        self.method = method
+        self.points = [(np.asarray(a, dtype=float), np.asarray(p, dtype=float)) for a, p in servos]
+        self.grid = np.arange(JOINT_MIN, JOINT_MAX + RESOLUTION / 2, RESOLUTION)
+        pulse_axis = np.arange(PULSE_MIN, PULSE_MAX + 1, dtype=float)
+        fwd = np.empty((len(self.points), self.grid.size))
+        inv = np.empty((len(self.points), pulse_axis.size))
+        for i, (a, p) in enumerate(self.points):
+            order = np.argsort(a)
+            a, p = a[order], p[order]
+            if len(a) < 2 or np.any(np.diff(a) <= 0):
+                raise ValueError(f"servo {i + 1}: need >= 2 points with distinct angles")
+            if not (np.all(np.diff(p) > 0) or np.all(np.diff(p) < 0)):
+                raise ValueError(f"servo {i + 1}: pulses must be strictly monotone in angle")
+            if method == "pchip" and len(a) > 2:
+                curve = _pchip(a, p, np.clip(self.grid, a[0], a[-1]))
+            else:
+                curve = np.interp(self.grid, a, p)
+            # beyond the measured range: extend with the end slopes
+            lo, hi = self.grid < a[0], self.grid > a[-1]
+            curve[lo] = p[0] + (self.grid[lo] - a[0]) * (p[1] - p[0]) / (a[1] - a[0])
+            curve[hi] = p[-1] + (self.grid[hi] - a[-1]) * (p[-1] - p[-2]) / (a[-1] - a[-2])
+            fwd[i] = curve
+            up = curve if curve[-1] > curve[0] else curve[::-1]
+            grid = self.grid if curve[-1] > curve[0] else self.grid[::-1]
+            inv[i] = np.interp(pulse_axis, up, grid)
+        self.lut = np.clip(np.rint(fwd), PULSE_MIN, PULSE_MAX).astype(np.int16)   # (6, 1801)
+        self.inverse = inv.astype(np.float32)                                      # (6, 2001)
+        self._servo = np.arange(len(self.points))
+
+    # ---------------- mapping ----------------
+    def to_pulses(self, angles):
+        """(..., n_servos) angles (deg) -> int16 pulses, one table lookup."""
+        a = np.clip(np.asarray(angles, dtype=float), JOINT_MIN, JOINT_MAX)
+        idx = np.rint((a - JOINT_MIN) / RESOLUTION).astype(np.intp)
+        return self.lut[self._servo[:a.shape[-1]], idx]
+
+    def to_angles(self, pulses):
+        """(..., n_servos) pulses (us) -> angles (deg)."""
+        p = np.clip(np.rint(np.asarray(pulses, dtype=float)), PULSE_MIN, PULSE_MAX).astype(np.intp)
+        return self.inverse[self._servo[:p.shape[-1]], p - PULSE_MIN].astype(float)
+
+    def pulse(self, servo, angle):
+        """Scalar fast path for one servo (index from 0)."""
+        i = int(round((min(max(angle, JOINT_MIN), JOINT_MAX) - JOINT_MIN) / RESOLUTION))
+        return int(self.lut[servo, i])
+
+    # ---------------- build / persist ----------------
+    @classmethod
+    def linear(cls, step_per_10deg=None, zero=1500.0, n=N_JOINTS):
+        """Straight-line calibration. Default: 500 + 2000*a/180 on every servo;
+        step_per_10deg (Group3 style): zero + (a - 90) * step/10 per servo."""
+        servos = []
+        for i in range(n):
+            if step_per_10deg is None:
+                servos.append(([0.0, 180.0], [500.0, 2500.0]))
+            else:
+                k = step_per_10deg[i] / 10.0
+                z = zero[i] if np.ndim(zero) else zero
+                servos.append(([0.0, 180.0], [z - 90.0 * k, z + 90.0 * k]))
+        return cls(servos, "linear")
+
+    def to_dict(self):
+        return {"method": self.method,
+                "servos": [{"angles": a.tolist(), "pulses": p.tolist()} for a, p in self.points]}
+
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """Load a calibration file; None (linear formula) if there is none or it
+        cannot be used (truncated, hand-edited, invalid points)."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except OSError:
+            return None
+        except ValueError as e:            # JSONDecodeError
+            print(f"{path}: not valid JSON ({e}), using the linear formula")
+            return None
+        try:
+            return cls([(s["angles"], s["pulses"]) for s in data["servos"]], data.get("method", "linear"))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"{path}: bad calibration ({e!r}), using the linear formula")
+            return None
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    lin = sub.add_parser("linear", help="write a straight-line calibration file")
+    lin.add_argument("--step-per-10deg", type=float, nargs=N_JOINTS)
+    lin.add_argument("--zero", type=float, default=1500.0)
+    lin.add_argument("--path", default=DEFAULT_PATH)
+    show = sub.add_parser("show")
+    show.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args()
+
+    if args.cmd == "linear":
+        cal = ServoCalibration.linear(args.step_per_10deg, args.zero)
+        cal.save(args.path)
+        print(f"linear calibration -> {args.path}")
+    else:
+        cal = ServoCalibration.load(args.path)
+        if cal is None:
+            raise SystemExit(f"no calibration at {args.path}")
+        for i, (a, p) in enumerate(cal.points):
+            print(f"servo {i + 1}: {len(a)} points, {cal.method}, "
+                  f"0deg={cal.lut[i, 0]} 90deg={cal.pulse(i, 90)} 180deg={cal.lut[i, -1]}")
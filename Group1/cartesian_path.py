@@ -0,0 +1,221 @@
+"""Straight-line / arc Cartesian paths with batched IK along the path.
+
+    path = LinePath(T_start, T_end)               # or ArcPath(T_start, via_xyz, T_end)
+    plan = plan_path(q_current, path, speed=0.05) # m/s
+    if plan.ok:
+        for time_ms, frame in plan.frames(): ...
+
+Orientation is SLERPed between the end poses (orientation=False solves position
+only). All waypoints are solved together: seeds are the joint-space line from
+q_current to the IK of the end pose, then vectorized DLS iterations run on the
+whole batch. Segments whose joint-interpolated midpoint leaves the Cartesian
+path by more than `tol` are split and re-solved until they fit.
+"""
+from dataclasses import dataclass
+import math
+import numpy as np
+
+from kinematics import (
+    N_JOINTS, JOINT_MIN, JOINT_MAX, forward_kinematics, joint_frames_batch,
+    jacobian_from_frames, rotation_vector_batch, quat_from_matrix, matrix_from_quat, slerp
+)
+from ik_solver import ROT_WEIGHT, solve_pose, solve_position_bounded
+from servo_frames import angles_to_pulses, default_encoder
+from trajectory import MIN_FRAME_MS, time_parameterize
+
+
+# ---------------- paths: s in [0,1] -> poses ----------------
+class LinePath:
+    def __init__(self, T_start, T_end):
+        self.T0 = np.asarray(T_start, dtype=float)
+        self.T1 = np.asarray(T_end, dtype=float)
+        self.q0 = quat_from_matrix(self.T0[:3, :3])
+        self.q1 = quat_from_matrix(self.T1[:3, :3])
+        self.length = float(np.linalg.norm(self.T1[:3, 3] - self.T0[:3, 3]))
+
+    def poses(self, s):
+        s = np.asarray(s, dtype=float)
+        T = np.zeros((s.size, 4, 4))
+        T[:, :3, :3] = matrix_from_quat(slerp(self.q0, self.q1, s))
+        T[:, :3, 3] = self.T0[:3, 3] + s[:, None] * (self.T1[:3, 3] - self.T0[:3, 3])
+        T[:, 3, 3] = 1.0
+        return T
+
+
+class ArcPath:
+    """Circular arc from T_start through the point `via` to T_end."""
+
+    def __init__(self, T_start, via, T_end):
+        self.T0 = np.asarray(T_start, dtype=float)
+        self.T1 = np.asarray(T_end, dtype=float)
+        self.q0 = quat_from_matrix(self.T0[:3, :3])
+        self.q1 = quat_from_matrix(self.T1[:3, :3])
+        p0, p1, p2 = self.T0[:3, 3], np.asarray(via, dtype=float), self.T1[:3, 3]
+        a, b = p1 - p0, p2 - p0
+        n = np.cross(a, b)
+        nn = float(np.dot(n, n))
+        if nn < 1e-16:
+            raise ValueError("arc points are collinear")
+        # circumcentre of the three points
+        self.center = p0 + (np.dot(b, b) * np.cross(n, a) + np.dot(a, a) * np.cross(b, n)) / (2 * nn)
+        self.radius = float(np.linalg.norm(p0 - self.center))
+        self.u = (p0 - self.center) / self.radius
+        self.v = np.cross(n / math.sqrt(nn), self.u)
+        ang = math.atan2(np.dot(p2 - self.center, self.v), np.dot(p2 - self.center, self.u))
+        self.sweep = ang if ang > 0 else ang + 2 * math.pi
+        self.length = self.radius * self.sweep
+
+    def poses(self, s):
+        s = np.asarray(s, dtype=float)
+        th = s * self.sweep
+        T = np.zeros((s.size, 4, 4))
+        T[:, :3, :3] = matrix_from_quat(slerp(self.q0, self.q1, s))
+        T[:, :3, 3] = (self.center + self.radius * (np.cos(th)[:, None] * self.u
+                                                    + np.sin(th)[:, None] * self.v))
+        T[:, 3, 3] = 1.0
+        return T
+
+
+# ---------------- batched IK ----------------
+def solve_batch(seeds, poses, orientation=True, max_iter=20, tol=1e-4, rot_tol=1e-3,
+                lam=0.003, max_step=10.0):
+    """Vectorized DLS over N waypoints at once. Returns (angles (N,6), converged (N,))."""
+    Q = np.array(seeds, dtype=float)
+    rows = 6 if orientation else 3
+    W = np.array([1.0, 1.0, 1.0, ROT_WEIGHT, ROT_WEIGHT, ROT_WEIGHT])[:rows]
+    done = np.zeros(len(Q), dtype=bool)
+    for _ in range(max_iter + 1):
+        frames = joint_frames_batch(Q)
+        T = frames[-1]
+        e = np.empty((len(Q), rows))
+        e[:, :3] = poses[:, :3, 3] - T[:, :3, 3]
+        if orientation:
+            e[:, 3:] = rotation_vector_batch(poses[:, :3, :3] @ T[:, :3, :3].transpose(0, 2, 1))
+        done = np.linalg.norm(e[:, :3], axis=1) < tol
+        if orientation:
+            done &= np.linalg.norm(e[:, 3:], axis=1) < rot_tol
+        if done.all():
+            break
+        act = ~done
+        J = jacobian_from_frames(frames[:, act])[:, :rows] * W[:, None]
+        A = J @ J.transpose(0, 2, 1) + (lam ** 2) * np.eye(rows)
+        x = np.linalg.solve(A, (W * e[act])[..., None])
+        dq = np.degrees((J.transpose(0, 2, 1) @ x)[..., 0])
+        peak = np.max(np.abs(dq), axis=1, keepdims=True)
+        dq *= np.minimum(1.0, max_step / np.maximum(peak, 1e-12))
+        Q[act] = np.clip(Q[act] + dq, JOINT_MIN, JOINT_MAX)
+    return Q, done
+
+
+def _solve_one(seed, pose, orientation, **kwargs):
+    if orientation:
+        return solve_pose(seed, pose, **kwargs)
+    return solve_position_bounded(seed, pose[:3, 3], **kwargs)
+
+
+# ---------------- plan ----------------
+@dataclass
+class PathPlan:
+    s: np.ndarray               # (N,) path parameter of each waypoint
+    angles: np.ndarray          # (N,6) deg
+    durations_ms: np.ndarray    # (N,) travel time to reach each waypoint (0 for the first)
+    ok: bool
+    reason: str = ""
+
+    def frames(self):
+        """(time_ms, group frame) for every waypoint after the start, encoded in
+        one batch."""
+        ms = self.durations_ms[1:].astype(int)
+        return list(zip(ms.tolist(), default_encoder().batch_frames(angles_to_pulses(self.angles[1:]), ms)))
+
+
+def validate(angles, max_jump=15.0):
+    """Vectorized checks before anything moves. Returns (ok, reason)."""
+    angles = np.asarray(angles)
+    if not np.all(np.isfinite(angles)):
+        return False, "non-finite joint angle"
+    bad = np.flatnonzero(np.any((angles < JOINT_MIN) | (angles > JOINT_MAX), axis=1))
+    if bad.size:
+        return False, f"joint limit violated at waypoint {bad[0]}"
+    jumps = np.max(np.abs(np.diff(angles, axis=0)), axis=1) if len(angles) > 1 else np.zeros(0)
+    bad = np.flatnonzero(jumps > max_jump)
+    if bad.size:
+        return False, f"joint jump {jumps[bad[0]]:.1f} deg between waypoints {bad[0]} and {bad[0]+1}"
+    return True, ""
+
+
+def plan_path(q_current, path, speed=0.05, tol=0.5e-3, max_step=0.01, orientation=True,
+              max_depth=5, max_jump=15.0, workspace=None, singularity=None):
+    """Discretize `path`, solve IK for every waypoint (batched) and time the segments
+    at constant Cartesian `speed` (m/s), or time-optimally under the servo limits
+    (trajectory.time_parameterize) when speed is None. `workspace`: optional
+    WorkspaceMap used to reject the path before solving. `singularity`: optional
+    SingularityMap; constant-speed segments near a singularity are slowed by
+    its speed_scale() (the slower end of each segment counts)."""
+    q_current = np.clip(np.asarray(q_current, dtype=float), JOINT_MIN, JOINT_MAX)
+    n = max(1, int(math.ceil(path.length / max_step)))
+    s = np.linspace(0.0, 1.0, n + 1)
+    poses = path.poses(s)
+    if workspace is not None:
+        inside = workspace.reachable_many(poses[:, :3, 3])
+        if not inside.all():
+            i = int(np.flatnonzero(~inside)[0])
+            return PathPlan(s, np.empty((0, N_JOINTS)), np.zeros(0), False,
+                            f"waypoint {i} outside the reachable workspace")
+
+    # warm start: joint-space line from q_current to the IK of the end pose
+    end = _solve_one(q_current, poses[-1], orientation, max_iter=50)
+    if not end.ok:
+        return PathPlan(s, np.empty((0, N_JOINTS)), np.zeros(0), False,
+                        f"end pose: {end.status} {end.reason}")
+    seeds = q_current + s[:, None] * (end.angles - q_current)
+    seeds[0] = q_current
+    Q, done = solve_batch(seeds, poses, orientation)
+    # stragglers: sequential warm start from the previous waypoint
+    for i in np.flatnonzero(~done):
+        r = _solve_one(Q[i - 1] if i else q_current, poses[i], orientation, max_iter=30)
+        if not r.ok:
+            return PathPlan(s, Q, np.zeros(len(s)), False, f"waypoint {i}: {r.status} {r.reason}")
+        Q[i] = r.angles
+
+    # split segments whose joint-space midpoint strays from the Cartesian path
+    for _ in range(max_depth):
+        s_mid = 0.5 * (s[:-1] + s[1:])
+        q_mid = 0.5 * (Q[:-1] + Q[1:])
+        p_mid = joint_frames_batch(q_mid)[-1][:, :3, 3]
+        dev = np.linalg.norm(p_mid - path.poses(s_mid)[:, :3, 3], axis=1)
+        split = np.flatnonzero(dev > tol)
+        if split.size == 0:
+            break
+        Q_new, done = solve_batch(q_mid[split], path.poses(s_mid[split]), orientation)
+        if not done.all():
+            i = int(split[np.flatnonzero(~done)[0]])
+            return PathPlan(s, Q, np.zeros(len(s)), False, f"refinement failed near s={s_mid[i]:.3f}")
+        s = np.insert(s, split + 1, s_mid[split])
+        Q = np.insert(Q, split + 1, Q_new, axis=0)
+    else:
+        # out of splits: check the last refinement held
+        s_mid = 0.5 * (s[:-1] + s[1:])
+        p_mid = joint_frames_batch(0.5 * (Q[:-1] + Q[1:]))[-1][:, :3, 3]
+        dev = np.linalg.norm(p_mid - path.poses(s_mid)[:, :3, 3], axis=1)
+        if dev.max() > tol:
+            return PathPlan(s, Q, np.zeros(len(s)), False,
+                            f"deviation {dev.max() * 1000:.1f} mm > tol after {max_depth} splits")
+
+    ok, reason = validate(Q, max_jump)
+    if speed is None:
+        return PathPlan(s, Q, time_parameterize(Q), ok, reason)
+    seg = np.diff(s) * path.length
+    if singularity is not None:
+        scale = singularity.speed_scale(Q)
+        seg = seg / np.minimum(scale[:-1], scale[1:])
+    durations = np.concatenate([[0.0], np.maximum(MIN_FRAME_MS, seg / speed * 1000.0)])
+    return PathPlan(s, Q, np.rint(durations), ok, reason)
+
+
+def line_to(q_current, delta, **kwargs):
+    """Straight line from the current pose, moved by `delta` (m), orientation kept."""
+    T0, _ = forward_kinematics(q_current)
+    T1 = T0.copy()
+    T1[:3, 3] += np.asarray(delta, dtype=float)
+    return plan_path(q_current, LinePath(T0, T1), **kwargs)
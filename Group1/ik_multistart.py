@@ -0,0 +1,136 @@
+"""Multi-start IK on a process pool, for absolute go-to-pose and offline planning.
+
+Seeds (current angles + random or lattice configurations) are split into one
+chunk per worker; every seed is solved locally (bounded position IK, or pose
+LM when the target is a 4x4 matrix) and the lowest cost wins:
+
+    cost = residual [m] + ROT_WEIGHT * rot_residual [rad] + travel_weight * |dq| [rad]
+
+    python ik_multistart.py X Y Z [--seeds 64] [--lattice]
+
+The workers get the active robot model (kinematics.model_signature, including a
+calibration installed with load_model) through the pool initializer, so they
+solve the same model under fork and spawn (Windows). main.py does not use this
+module: jogs are small steps from a known pose, which the local solver handles.
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from kinematics import (
+    N_JOINTS, JOINT_MIN, JOINT_MAX, HOME_ANGLES, clamp_angles, load_model, model_signature, set_model
+)
+from ik_solver import ROT_WEIGHT, solve_pose, solve_position_bounded
+
+LATTICE_LEVELS = (30.0, 90.0, 150.0)   # deg, for J1..J3 (wrist keeps its current angles)
+
+
+def random_seeds(n, rng=None):
+    rng = np.random.default_rng(rng)
+    return rng.uniform(JOINT_MIN, JOINT_MAX, size=(n, N_JOINTS))
+
+
+def lattice_seeds(q_current, levels=LATTICE_LEVELS):
+    q_current = clamp_angles(q_current)
+    seeds = []
+    for combo in itertools.product(levels, repeat=3):
+        q = q_current.copy()
+        q[:3] = combo
+        seeds.append(q)
+    return np.array(seeds)
+
+
+def solution_cost(result, q_current, travel_weight):
+    travel = np.linalg.norm(np.radians(result.angles - q_current))
+    return result.residual + ROT_WEIGHT * result.rot_residual + travel_weight * travel
+
+
+def _init_worker(model):
+    """Pool initializer: install the parent's robot model in the worker."""
+    set_model(model["dh"], model["offsets"], model["base"])
+
+
+def _solve_chunk(args):
+    """Worker: solve every seed of one chunk, return (cost, IKResult) of the best."""
+    seeds, target, q_current, travel_weight, kwargs = args
+    best = None
+    for seed in seeds:
+        if np.ndim(target) == 2:
+            r = solve_pose(seed, target, **kwargs)
+        else:
+            r = solve_position_bounded(seed, target, **kwargs)
+        c = solution_cost(r, q_current, travel_weight)
+        if best is None or c < best[0]:
+            best = (c, r)
+    return best
+
+
+class MultiStartIK:
+    """Keeps the pool alive between calls; use as a context manager or call close().
+
+    workers=1 solves in-process (no pool), handy on single-core boards.
+    """
+
+    def __init__(self, workers=None, travel_weight=0.01):
+        self.workers = workers or os.cpu_count() or 1
+        self.travel_weight = travel_weight
+        self.pool = None
+        self.model = None
+        self._start_pool()
+
+    def _start_pool(self):
+        """(Re)start the pool with the current model; workers keep the model
+        they were started with."""
+        self.close()
+        self.model = model_signature()
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=(self.model,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def solve(self, q_current, target, n_seeds=64, lattice=False, rng=None, **kwargs):
+        """target: (x,y,z) or a 4x4 pose. kwargs go to the local solver
+        (max_iter, tol, deadline, ...). Returns the lowest-cost IKResult."""
+        q_current = clamp_angles(q_current)
+        seeds = lattice_seeds(q_current) if lattice else random_seeds(n_seeds, rng)
+        seeds = np.vstack([q_current, seeds])
+        kwargs.setdefault("max_iter", 30)
+        chunks = np.array_split(seeds, min(self.workers, len(seeds)))
+        jobs = [(c, np.asarray(target, dtype=float), q_current, self.travel_weight, kwargs)
+                for c in chunks]
+        if self.pool is not None and self.model != model_signature():
+            self._start_pool()              # model changed (calibration loaded since)
+        if self.pool is None:
+            results = map(_solve_chunk, jobs)
+        else:
+            results = self.pool.map(_solve_chunk, jobs)
+        return min(results, key=lambda cr: cr[0])[1]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("xyz", type=float, nargs=3, help="target position (m)")
+    ap.add_argument("--seeds", type=int, default=64)
+    ap.add_argument("--lattice", action="store_true")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    load_model()
+    with MultiStartIK(args.workers) as ms:
+        t0 = time.perf_counter()
+        r = ms.solve(HOME_ANGLES, args.xyz, n_seeds=args.seeds, lattice=args.lattice)
+        dt = time.perf_counter() - t0
+    print(f"{r.status}: angles={np.round(r.angles, 2).tolist()} "
+          f"residual={r.residual*1000:.3f} mm ({dt*1000:.1f} ms, {ms.workers} workers)")
@@ -0,0 +1,290 @@
+"""IK for the Group1 arm.
+
+Position IK, two modes:
+- "clamped": the original DLS loop, angles clamped to 0..180 after every step.
+- "bounded": active-set DLS, the 0..180 limits are handled inside the step and the
+  spare DOF (3D position task, 6 joints) push joints away from their limits.
+
+Pose IK (solve_pose): position + orientation, Levenberg-Marquardt damping.
+
+All solvers take an optional wall-clock `deadline` (s). When the next iteration
+would not fit, they return the best solution so far with status "timeout".
+"""
+from dataclasses import dataclass, field
+import math
+import time
+import numpy as np
+
+from kinematics import (
+    N_JOINTS, JOINT_MIN, JOINT_MAX, forward_kinematics, jacobian, clamp_angles,
+    pose_error, manipulability
+)
+
+IK_MODES = ("bounded", "clamped")
+
+_MID = 0.5 * (JOINT_MIN + JOINT_MAX)
+_HALF = 0.5 * (JOINT_MAX - JOINT_MIN)
+
+
+@dataclass
+class IKResult:
+    angles: np.ndarray            # deg, shape (6,)
+    residual: float               # m, |target - fk(angles)|
+    iterations: int
+    status: str                   # "converged", "blocked", "stalled", "max_iter", "timeout"
+    reason: str = ""
+    limited: list = field(default_factory=list)   # joint indexes pinned at a limit
+    rot_residual: float = 0.0     # rad, orientation error (pose IK only)
+    elapsed: float = 0.0          # s, wall time of the solve
+
+    @property
+    def ok(self):
+        return self.status == "converged"
+
+
+def damped_least_squares(J, delta_pos, lam=0.05):
+    """DLS solver returning delta_theta (rad)."""
+    JJt = J @ J.T
+    A = JJt + (lam**2) * np.eye(J.shape[0])
+    try:
+        Ainv = np.linalg.inv(A)
+    except np.linalg.LinAlgError:
+        Ainv = np.linalg.pinv(A)
+    return J.T @ (Ainv @ delta_pos)
+
+
+class _Budget:
+    """Wall-clock budget. expired() is true when one more iteration (as long as
+    the slowest so far, `first_step` before any) would overrun the deadline."""
+
+    def __init__(self, deadline, first_step=3e-4):
+        self.start = self.last = time.perf_counter()
+        self.end = None if deadline is None else self.start + deadline
+        self.step = first_step
+
+    def tick(self):
+        now = time.perf_counter()
+        self.step = max(self.step, now - self.last)
+        self.last = now
+
+    def expired(self):
+        return self.end is not None and time.perf_counter() + self.step > self.end
+
+    def finish(self, result):
+        result.elapsed = time.perf_counter() - self.start
+        return result
+
+
+def _limit_names(indexes):
+    return ", ".join(f"J{i+1}" for i in indexes)
+
+
+# ---------------- clamped (original) ----------------
+def solve_position_clamped(q0, target, max_iter=5, tol=1e-4, lam=0.05, deadline=None):
+    """Original loop from move_cartesian: DLS step then clamp every joint.
+    Clamping can make the residual grow, so the best iterate is returned."""
+    budget = _Budget(deadline)
+    q = clamp_angles(q0)
+    _, p = forward_kinematics(q)
+    best = (float(np.linalg.norm(target - p)), q)
+    it = 0
+    for it in range(1, max_iter + 1):
+        if budget.expired():
+            residual, bq = best
+            return budget.finish(IKResult(bq, residual, it - 1, "timeout", "deadline reached"))
+        J = jacobian(q)[:3]
+        dq = np.degrees(damped_least_squares(J, target - p, lam=lam))
+        q = clamp_angles(q + dq)
+        _, p = forward_kinematics(q)
+        budget.tick()
+        residual = float(np.linalg.norm(target - p))
+        if residual < best[0]:
+            best = (residual, q)
+        if residual < tol:
+            break
+    residual, q = best
+    status = "converged" if residual < tol else "max_iter"
+    return budget.finish(IKResult(q, residual, it, status))
+
+
+# ---------------- bounded (active set) ----------------
+def _bounded_step(J, err, q, lam, k_null, max_step):
+    """One active-set DLS step (deg) that never leaves [JOINT_MIN, JOINT_MAX].
+
+    The step is capped at `max_step` deg per joint. Joints whose step would
+    cross a limit are pinned on it and the remaining error is re-solved with
+    the free joints. Returns (dq_deg, pinned indexes).
+    """
+    free = np.ones(N_JOINTS, dtype=bool)
+    dq = np.zeros(N_JOINTS)
+    e = err.copy()
+    # limit avoidance gradient: ~0 mid-range, grows towards the limits
+    u = (q - _MID) / _HALF
+    dq0 = -k_null * np.radians(q - _MID) * u * u
+    for _ in range(N_JOINTS):
+        idx = np.flatnonzero(free)
+        if idx.size == 0:
+            break
+        Jf = J[:, idx]
+        A = Jf @ Jf.T + (lam**2) * np.eye(J.shape[0])
+        Jpinv = Jf.T @ np.linalg.pinv(A)
+        N = np.eye(idx.size) - Jpinv @ Jf
+        step = np.degrees(Jpinv @ e + N @ dq0[idx])
+        peak = np.max(np.abs(step))
+        if peak > max_step:
+            step *= max_step / peak
+        q_try = q[idx] + step
+        over = (q_try > JOINT_MAX) | (q_try < JOINT_MIN)
+        if not over.any():
+            dq[idx] = step
+            break
+        # pin the violating joints on their limit and take them out of the solve
+        for n in np.flatnonzero(over):
+            k = idx[n]
+            bound = JOINT_MAX if q_try[n] > JOINT_MAX else JOINT_MIN
+            dq[k] = bound - q[k]
+            e = e - J[:, k] * math.radians(dq[k])
+            free[k] = False
+    return dq, [int(i) for i in np.flatnonzero(~free)]
+
+
+def solve_position_bounded(q0, target, max_iter=5, tol=1e-4, lam=0.003, k_null=0.05,
+                           max_step=20.0, min_gain=0.1, deadline=None):
+    """Limit-aware position IK.
+
+    Each step is halved (up to 3 times) until the true residual drops. Fails fast
+    with status "blocked" (a limit stops progress) or "stalled" (singular /
+    out of reach) when an iteration gains less than `min_gain` of the residual.
+    A step still not lowering the residual after the halvings is discarded (that
+    iteration gains 0), so the residual never increases and the returned iterate
+    is always the best.
+    """
+    budget = _Budget(deadline)
+    q = clamp_angles(q0)
+    target = np.asarray(target, dtype=float)
+    _, p = forward_kinematics(q)
+    residual = float(np.linalg.norm(target - p))
+    pinned = []
+    for it in range(max_iter):
+        if residual < tol:
+            return budget.finish(IKResult(q, residual, it, "converged", limited=pinned))
+        if budget.expired():
+            return budget.finish(IKResult(q, residual, it, "timeout", "deadline reached", pinned))
+        J = jacobian(q)[:3]
+        dq, pinned = _bounded_step(J, target - p, q, lam, k_null, max_step)
+        for _ in range(3):
+            q_new = np.clip(q + dq, JOINT_MIN, JOINT_MAX)
+            _, p_new = forward_kinematics(q_new)
+            r_new = float(np.linalg.norm(target - p_new))
+            if r_new < residual:
+                break
+            dq = 0.5 * dq
+        budget.tick()
+        r_old = residual
+        if r_new < residual:
+            q, p, residual = q_new, p_new, r_new
+        gain = (r_old - residual) / r_old        # of the iterate kept
+        if residual >= tol and gain < min_gain:
+            if pinned:
+                reason = f"{_limit_names(pinned)} at joint limit, target not reachable"
+                return budget.finish(IKResult(q, residual, it + 1, "blocked", reason, pinned))
+            reason = f"no progress at residual {residual*1000:.2f} mm (singular or out of reach)"
+            return budget.finish(IKResult(q, residual, it + 1, "stalled", reason))
+    if residual < tol:
+        return budget.finish(IKResult(q, residual, max_iter, "converged", limited=pinned))
+    return budget.finish(IKResult(q, residual, max_iter, "max_iter",
+                                  f"residual {residual*1000:.2f} mm after {max_iter} iterations",
+                                  pinned))
+
+
+# ---------------- full pose (Levenberg-Marquardt) ----------------
+ROT_WEIGHT = 0.1          # m per rad: 1 deg of orientation error ~ 1.7 mm
+MANIP_REF = 1e-8          # weighted manipulability below which the step cap shrinks
+
+
+def solve_pose(q0, T_target, max_iter=30, tol=1e-4, rot_tol=1e-3, rot_weight=ROT_WEIGHT,
+               lam0=1e-4, adaptive=True, max_step=20.0, min_step=2.0, deadline=None,
+               histogram=None):
+    """6-D pose IK minimizing position and rotation-vector error.
+
+    adaptive=True: LM, damping shrinks after a step that lowers the cost and grows
+    (step retried) after one that does not. adaptive=False keeps `lam0` fixed and
+    takes every step (plain DLS, for comparison).
+    The per-step joint cap goes from `max_step` down to `min_step` deg as the
+    manipulability falls below MANIP_REF, i.e. small steps near singularities.
+    Joints on a limit whose step points outwards are frozen for that step.
+    Non-converged results return the lowest-cost iterate seen.
+    """
+    budget = _Budget(deadline)
+    Wd = np.array([1.0, 1.0, 1.0, rot_weight, rot_weight, rot_weight])
+    q = clamp_angles(q0)
+    T, _ = forward_kinematics(q)
+    e = pose_error(T_target, T)
+    cost = float(np.sum((Wd * e) ** 2))
+    best = (cost, q, e)
+
+    def finish(status, iterations, reason=""):
+        _, bq, be = best
+        result = budget.finish(IKResult(bq, float(np.linalg.norm(be[:3])), iterations, status,
+                                        reason, rot_residual=float(np.linalg.norm(be[3:]))))
+        if histogram is not None:
+            histogram.record(result.elapsed)
+        return result
+
+    lam = lam0
+    for it in range(max_iter):
+        if np.linalg.norm(e[:3]) < tol and np.linalg.norm(e[3:]) < rot_tol:
+            return finish("converged", it)
+        if budget.expired():
+            return finish("timeout", it, "deadline reached")
+        J = jacobian(q) * Wd[:, None]
+        ew = Wd * e
+        g = J.T @ ew
+        frozen = ((q <= JOINT_MIN) & (g < 0)) | ((q >= JOINT_MAX) & (g > 0))
+        Jf = J[:, ~frozen]
+        cap = max(min_step, max_step * min(1.0, manipulability(J) / MANIP_REF))
+        H = Jf.T @ Jf
+        gf = Jf.T @ ew
+        while True:
+            dq = np.zeros(N_JOINTS)
+            dq[~frozen] = np.degrees(np.linalg.solve(H + lam * np.eye(H.shape[0]), gf))
+            peak = np.max(np.abs(dq))
+            if peak > cap:
+                dq *= cap / peak
+            q_new = np.clip(q + dq, JOINT_MIN, JOINT_MAX)
+            T_new, _ = forward_kinematics(q_new)
+            e_new = pose_error(T_target, T_new)
+            cost_new = float(np.sum((Wd * e_new) ** 2))
+            if not adaptive or cost_new < cost:
+                if adaptive:
+                    lam = max(lam / 3.0, 1e-9)
+                break
+            lam *= 5.0
+            if lam > 1e2:
+                return finish("stalled", it + 1,
+                              f"no descent, cost {cost:.2e} (singular or out of reach)")
+            if budget.expired():
+                return finish("timeout", it + 1, "deadline reached")
+        budget.tick()
+        q, e, cost = q_new, e_new, cost_new
+        if cost < best[0]:
+            best = (cost, q, e)
+    _, _, be = best
+    if np.linalg.norm(be[:3]) < tol and np.linalg.norm(be[3:]) < rot_tol:
+        return finish("converged", max_iter)
+    return finish("max_iter", max_iter,
+                  f"residual {np.linalg.norm(be[:3])*1000:.2f} mm / "
+                  f"{math.degrees(np.linalg.norm(be[3:])):.2f} deg")
+
+
+def solve_position(q0, target, mode="bounded", histogram=None, **kwargs):
+    """Dispatch on IK mode; the solve time goes into `histogram` (LatencyHistogram)."""
+    if mode == "bounded":
+        result = solve_position_bounded(q0, target, **kwargs)
+    elif mode == "clamped":
+        result = solve_position_clamped(q0, target, **kwargs)
+    else:
+        raise ValueError(f"unknown IK mode: {mode}")
+    if histogram is not None:
+        histogram.record(result.elapsed)
+    return result
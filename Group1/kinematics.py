@@ -0,0 +1,245 @@
+"""DH chain of the Group1 arm (pure NumPy, no Qt) shared by the GUI and the IK code.
+
+The nominal table below can be replaced by a calibrated model (robot_model.json,
+written by calibrate.py): fitted d / a per joint, a zero offset per servo and the
+base origin in the measuring frame. load_model() updates DH_TABLE, JOINT_OFFSETS
+and BASE_OFFSET in place, so modules that imported them see the new values.
+"""
+import json
+import math
+import os
+import numpy as np
+
+# per joint: d (m), a (m), alpha (deg); theta is the servo angle
+DH_TABLE = [
+    (0.100, 0.0,   90),
+    (0.0,   0.100, 0),
+    (0.0,   0.074, 0),
+    (0.013, 0.0,   90),
+    (0.0,   0.005, -90),
+    (0.0,   0.0,    0),
+]
+N_JOINTS = len(DH_TABLE)
+
+# servo range (deg)
+JOINT_MIN = 0.0
+JOINT_MAX = 180.0
+HOME_ANGLES = [90.0] * N_JOINTS
+
+# calibrated model; zeros = nominal DH
+NOMINAL_DH = [tuple(row) for row in DH_TABLE]
+JOINT_OFFSETS = [0.0] * N_JOINTS       # deg, DH theta = servo angle + offset
+BASE_OFFSET = [0.0, 0.0, 0.0]          # m, DH base origin in the measuring frame
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "robot_model.json")
+_BASE = np.eye(4)
+
+
+def set_model(dh=None, offsets=None, base=None):
+    """Install model parameters (None keeps the current value)."""
+    if dh is not None:
+        if len(dh) != N_JOINTS:
+            raise ValueError(f"DH table must have {N_JOINTS} rows")
+        DH_TABLE[:] = [tuple(float(v) for v in row) for row in dh]
+    if offsets is not None:
+        JOINT_OFFSETS[:] = [float(v) for v in offsets]
+    if base is not None:
+        BASE_OFFSET[:] = [float(v) for v in base]
+    _BASE[:3, 3] = BASE_OFFSET
+
+
+def model_signature():
+    """JSON-comparable description of the active model (used by the map caches)."""
+    return {"dh": [list(row) for row in DH_TABLE], "offsets": list(JOINT_OFFSETS),
+            "base": list(BASE_OFFSET)}
+
+
+def save_model(path=MODEL_PATH, **info):
+    with open(path, "w") as f:
+        json.dump(dict(model_signature(), **info), f, indent=1)
+
+
+def load_model(path=MODEL_PATH):
+    """Install a calibrated model file; False (nominal model kept) if there is none."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except OSError:
+        return False
+    set_model(data["dh"], data.get("offsets"), data.get("base"))
+    return True
+
+
+def dh_transform(theta_deg, d, a, alpha_deg):
+    theta = math.radians(theta_deg)
+    alpha = math.radians(alpha_deg)
+    ct = math.cos(theta); st = math.sin(theta)
+    ca = math.cos(alpha); sa = math.sin(alpha)
+    return np.array([
+        [ct, -st*ca,  st*sa, a*ct],
+        [st,  ct*ca, -ct*sa, a*st],
+        [0.0,    sa,     ca,    d],
+        [0.0,    0.0,    0.0,  1.0]
+    ], dtype=float)
+
+
+def joint_frames(angles):
+    """Return the 7 base->frame transforms T0..T6 (T0 = identity)."""
+    frames = [_BASE.copy()]
+    for theta, off, (d, a, alpha) in zip(angles, JOINT_OFFSETS, DH_TABLE):
+        frames.append(frames[-1] @ dh_transform(theta + off, d, a, alpha))
+    return frames
+
+
+def forward_kinematics(angles):
+    """Return 4x4 T and position vector (x,y,z) of the raw DH chain."""
+    T = joint_frames(angles)[-1]
+    return T, T[:3, 3].copy()
+
+
+def jacobian(angles):
+    """Geometric Jacobian 6x6 (rows vx,vy,vz,wx,wy,wz; columns per rad)."""
+    frames = joint_frames(angles)
+    p_end = frames[-1][:3, 3]
+    J = np.zeros((6, N_JOINTS), dtype=float)
+    for j in range(N_JOINTS):
+        z = frames[j][:3, 2]
+        p = frames[j][:3, 3]
+        J[:3, j] = np.cross(z, p_end - p)
+        J[3:, j] = z
+    return J
+
+
+def clamp_angles(angles):
+    return np.clip(np.asarray(angles, dtype=float), JOINT_MIN, JOINT_MAX)
+
+
+def rotation_vector(R):
+    """Axis-angle (rotation vector, rad) of a 3x3 rotation matrix."""
+    cos_a = max(-1.0, min(1.0, 0.5 * (np.trace(R) - 1.0)))
+    angle = math.acos(cos_a)
+    w = 0.5 * np.array([R[2, 1] - R[1, 2], R[0, 2] - R[2, 0], R[1, 0] - R[0, 1]])
+    if angle < 1e-6:
+        return w
+    if math.pi - angle < 1e-4:
+        # near 180 deg: axis from the largest diagonal term of (R + I) / 2
+        B = 0.5 * (R + np.eye(3))
+        k = int(np.argmax(np.diag(B)))
+        axis = B[:, k] / math.sqrt(max(B[k, k], 1e-12))
+        return angle * axis / np.linalg.norm(axis)
+    return w * (angle / math.sin(angle))
+
+
+def pose_error(T_target, T):
+    """6-vector error (dx,dy,dz [m], rotation vector [rad]) from T to T_target."""
+    e = np.empty(6)
+    e[:3] = T_target[:3, 3] - T[:3, 3]
+    e[3:] = rotation_vector(T_target[:3, :3] @ T[:3, :3].T)
+    return e
+
+
+def manipulability(J):
+    """Yoshikawa manipulability sqrt(det(J J^T))."""
+    return math.sqrt(max(np.linalg.det(J @ J.T), 0.0))
+
+
+# ---------------- batched (N configurations at once) ----------------
+def joint_frames_batch(angles):
+    """(N,6) deg -> (7,N,4,4) base->frame transforms T0..T6."""
+    q = np.radians(np.asarray(angles, dtype=float).reshape(-1, N_JOINTS) + JOINT_OFFSETS)
+    n = q.shape[0]
+    frames = [np.broadcast_to(_BASE, (n, 4, 4))]
+    for j, (d, a, alpha) in enumerate(DH_TABLE):
+        ct = np.cos(q[:, j]); st = np.sin(q[:, j])
+        ca = math.cos(math.radians(alpha)); sa = math.sin(math.radians(alpha))
+        A = np.zeros((n, 4, 4))
+        A[:, 0, 0] = ct; A[:, 0, 1] = -st*ca; A[:, 0, 2] = st*sa; A[:, 0, 3] = a*ct
+        A[:, 1, 0] = st; A[:, 1, 1] = ct*ca;  A[:, 1, 2] = -ct*sa; A[:, 1, 3] = a*st
+        A[:, 2, 1] = sa; A[:, 2, 2] = ca; A[:, 2, 3] = d
+        A[:, 3, 3] = 1.0
+        frames.append(frames[-1] @ A)
+    return np.stack(frames)
+
+
+def forward_kinematics_batch(angles):
+    """(N,6) deg -> (N,4,4) end-effector transforms."""
+    return joint_frames_batch(angles)[-1]
+
+
+def jacobian_batch(angles):
+    """(N,6) deg -> (N,6,6) geometric Jacobians (same layout as jacobian())."""
+    return jacobian_from_frames(joint_frames_batch(angles))
+
+
+def jacobian_from_frames(frames):
+    """(7,N,4,4) frames from joint_frames_batch -> (N,6,6) Jacobians."""
+    p_end = frames[-1][:, :3, 3]
+    z = frames[:-1, :, :3, 2]                     # (6,N,3)
+    p = frames[:-1, :, :3, 3]
+    J = np.empty((p_end.shape[0], 6, N_JOINTS))
+    J[:, :3, :] = np.cross(z, p_end[None] - p).transpose(1, 2, 0)
+    J[:, 3:, :] = z.transpose(1, 2, 0)
+    return J
+
+
+def manipulability_batch(J):
+    """(N,m,6) -> (N,) Yoshikawa manipulability."""
+    return np.sqrt(np.clip(np.linalg.det(J @ J.transpose(0, 2, 1)), 0.0, None))
+
+
+def rotation_vector_batch(R):
+    """(N,3,3) -> (N,3) rotation vectors (rad), vectorized rotation_vector()."""
+    cos_a = np.clip(0.5 * (np.trace(R, axis1=1, axis2=2) - 1.0), -1.0, 1.0)
+    angle = np.arccos(cos_a)
+    w = 0.5 * np.stack([R[:, 2, 1] - R[:, 1, 2], R[:, 0, 2] - R[:, 2, 0],
+                        R[:, 1, 0] - R[:, 0, 1]], axis=1)
+    sin_a = np.sin(angle)
+    scale = np.where(angle < 1e-6, 1.0, angle / np.where(sin_a == 0, 1.0, sin_a))
+    out = w * scale[:, None]
+    for i in np.flatnonzero(math.pi - angle < 1e-4):
+        out[i] = rotation_vector(R[i])
+    return out
+
+
+# ---------------- quaternions (w, x, y, z) ----------------
+def quat_from_matrix(R):
+    """3x3 rotation -> unit quaternion (w,x,y,z)."""
+    t = np.trace(R)
+    if t > 0:
+        s = 2.0 * math.sqrt(t + 1.0)
+        q = [0.25 * s, (R[2, 1] - R[1, 2]) / s, (R[0, 2] - R[2, 0]) / s, (R[1, 0] - R[0, 1]) / s]
+    else:
+        i = int(np.argmax(np.diag(R)))
+        j, k = (i + 1) % 3, (i + 2) % 3
+        s = 2.0 * math.sqrt(max(1.0 + R[i, i] - R[j, j] - R[k, k], 1e-12))
+        q = [0.0] * 4
+        q[0] = (R[k, j] - R[j, k]) / s
+        q[1 + i] = 0.25 * s
+        q[1 + j] = (R[j, i] + R[i, j]) / s
+        q[1 + k] = (R[k, i] + R[i, k]) / s
+    q = np.array(q)
+    return q / np.linalg.norm(q)
+
+
+def matrix_from_quat(q):
+    """(...,4) quaternions (w,x,y,z) -> (...,3,3) rotations."""
+    q = np.asarray(q, dtype=float)
+    w, x, y, z = np.moveaxis(q / np.linalg.norm(q, axis=-1, keepdims=True), -1, 0)
+    return np.stack([
+        np.stack([1 - 2*(y*y + z*z), 2*(x*y - z*w),     2*(x*z + y*w)], axis=-1),
+        np.stack([2*(x*y + z*w),     1 - 2*(x*x + z*z), 2*(y*z - x*w)], axis=-1),
+        np.stack([2*(x*z - y*w),     2*(y*z + x*w),     1 - 2*(x*x + y*y)], axis=-1),
+    ], axis=-2)
+
+
+def slerp(q0, q1, s):
+    """Spherical interpolation between two quaternions at fractions s (N,) -> (N,4)."""
+    q0 = np.asarray(q0, dtype=float); q1 = np.asarray(q1, dtype=float)
+    s = np.asarray(s, dtype=float)[:, None]
+    dot = float(np.dot(q0, q1))
+    if dot < 0.0:                      # take the short way round
+        q1 = -q1; dot = -dot
+    if dot > 0.9995:
+        q = q0 + s * (q1 - q0)
+        return q / np.linalg.norm(q, axis=1, keepdims=True)
+    theta = math.acos(dot)
+    return (np.sin((1 - s) * theta) * q0 + np.sin(s * theta) * q1) / math.sin(theta)
@@ -0,0 +1,145 @@
+"""Last commanded joint state, persisted so a restart resumes instead of homing.
+
+    state = StateFile()                       # cache/last_state.bin, memory-mapped
+    state.record(angles, pulses)              # after every frame sent (~ a few us)
+    last, reason = state.restore(angles_to_pulses)
+    if last is None: home (reason says why) else: carry on from last.angles
+
+    python last_state.py show                 # what a restart would do
+
+The file holds two fixed 80-byte slots (struct RECORD: sequence number, wall
+time, angles, pulses, CRC32). record() overwrites the older slot through the
+memory map, so a crash halfway through a write leaves the other slot intact;
+load() takes the valid slot with the higher sequence number. Nothing is synced
+per write: the OS writes the page back even if the process dies, and the checks
+in restore() catch what a power cut or an old file may leave behind.
+
+restore() rejects the state (-> home) when it is missing or corrupt, older than
+MAX_AGE_S (long enough for the servos to have been moved by hand), outside the
+joint limits, or when the stored pulses no longer match the angles under the
+current calibration. matches_controller() adds a check against the pulses the
+controller reports where the protocol can read them back (serial_link.py).
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from kinematics import N_JOINTS, JOINT_MIN, JOINT_MAX
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "last_state.bin")
+MAX_AGE_S = 3600.0                 # older than this: the arm may have been moved, home
+PULSE_TOL = 2                      # us, rounding between calibration versions
+READBACK_TOL = 30                  # us, controller-reported pulse vs saved (servo deadband)
+
+RECORD = struct.Struct(f"<Qd{N_JOINTS}d{N_JOINTS}H")
+SLOT = RECORD.size + 4             # + CRC32 of the record
+
+
+@dataclass
+class LastState:
+    seq: int
+    t: float                       # time.time() of the frame
+    angles: list
+    pulses: list
+
+    @property
+    def age(self):
+        return time.time() - self.t
+
+
+class StateFile:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != 2 * SLOT:
+                os.ftruncate(fd, 2 * SLOT)
+            self._map = mmap.mmap(fd, 2 * SLOT)
+        finally:
+            os.close(fd)
+        last = self.load()
+        self.seq = last.seq if last else 0
+
+    def _slot(self, i):
+        raw = self._map[i * SLOT:(i + 1) * SLOT]
+        body, (crc,) = raw[:RECORD.size], struct.unpack("<I", raw[RECORD.size:])
+        if crc != zlib.crc32(body):
+            return None
+        values = RECORD.unpack(body)
+        if values[0] == 0:
+            return None
+        return LastState(values[0], values[1], list(values[2:2 + N_JOINTS]),
+                         list(values[2 + N_JOINTS:]))
+
+    def load(self):
+        """Newest valid record, None if there is none."""
+        states = [s for s in (self._slot(0), self._slot(1)) if s is not None]
+        return max(states, key=lambda s: s.seq) if states else None
+
+    def record(self, angles, pulses, t=None):
+        """Store the last commanded angles (deg) and the pulses (us) sent for them."""
+        self.seq += 1
+        body = RECORD.pack(self.seq, time.time() if t is None else t,
+                           *map(float, angles), *map(int, pulses))
+        i = self.seq % 2
+        self._map[i * SLOT:(i + 1) * SLOT] = body + struct.pack("<I", zlib.crc32(body))
+
+    def restore(self, to_pulses, max_age_s=MAX_AGE_S):
+        """(LastState, None) if it is safe to resume from, else (None, reason).
+        to_pulses: angles -> pulses under the current calibration."""
+        last = self.load()
+        if last is None:
+            return None, "no saved state"
+        if last.age > max_age_s or last.age < -60.0:
+            return None, f"saved state is stale ({last.age / 60:.0f} min old)"
+        a = np.asarray(last.angles)
+        if not np.all(np.isfinite(a)) or np.any(a < JOINT_MIN) or np.any(a > JOINT_MAX):
+            return None, "saved angles outside the joint limits"
+        if np.any(np.abs(np.asarray(to_pulses(a), dtype=int) - last.pulses) > PULSE_TOL):
+            return None, "calibration changed since the state was saved"
+        return last, None
+
+    @staticmethod
+    def matches_controller(last, reported):
+        """False if the controller's reported pulses (None: no read-back) show the
+        arm is not where the saved state says, e.g. after a controller power cycle."""
+        if reported is None:
+            return True
+        return all(abs(int(p) - q) <= READBACK_TOL for p, q in zip(reported, last.pulses))
+
+    def close(self):
+        self._map.flush()
+        self._map.close()
+
+
+if __name__ == "__main__":
+    from servo_frames import angles_to_pulses, set_calibration
+    from calibration import ServoCalibration
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["show", "bench"])
+    ap.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args()
+
+    set_calibration(ServoCalibration.load())
+    state = StateFile(args.path)
+    if args.cmd == "bench":
+        n = 100000
+        t0 = time.perf_counter()
+        for i in range(n):
+            state.record([90.0 + i % 10] * N_JOINTS, [1500 + i % 10] * N_JOINTS)
+        print(f"record: {(time.perf_counter() - t0) / n * 1e6:.2f} us")
+    last, reason = state.restore(angles_to_pulses)
+    if last is None:
+        print(f"restart would home: {reason}")
+    else:
+        print(f"restart resumes at {[round(a, 1) for a in last.angles]} "
+              f"(saved {last.age:.0f} s ago, #{last.seq})")
+    state.close()
@@ -0,0 +1,74 @@
+"""Fixed-bucket latency histogram (log-spaced, 10 us .. 10 s) with percentiles."""
+import bisect
+import math
+import threading
+
+_MIN_S = 1e-5
+_MAX_S = 10.0
+_PER_DECADE = 20
+
+
+def _make_edges():
+    n = int(round(math.log10(_MAX_S / _MIN_S) * _PER_DECADE))
+    return [_MIN_S * 10 ** (i / _PER_DECADE) for i in range(n + 1)]
+
+
+class LatencyHistogram:
+    """Thread-safe; record() is O(log buckets), no per-sample storage."""
+
+    EDGES = _make_edges()      # upper edge (s) of each bucket, last bucket = overflow
+
+    def __init__(self, name=""):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.EDGES) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def record(self, seconds):
+        i = bisect.bisect_left(self.EDGES, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, p):
+        """Upper bucket edge (s) below which `p` percent of samples fall."""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            need = p / 100.0 * self.count
+            acc = 0
+            for i, c in enumerate(self.counts):
+                acc += c
+                if acc >= need and c:
+                    return min(self.EDGES[i], self.max) if i < len(self.EDGES) else self.max
+            return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        """dict in milliseconds: count, mean, p50, p95, p99, max."""
+        return {
+            "count": self.count,
+            "mean": self.mean * 1000,
+            "p50": self.percentile(50) * 1000,
+            "p95": self.percentile(95) * 1000,
+            "p99": self.percentile(99) * 1000,
+            "max": self.max * 1000,
+        }
+
+    def __str__(self):
+        s = self.summary()
+        return (f"{self.name or 'latency'}: n={s['count']} mean={s['mean']:.3f}ms "
+                f"p50={s['p50']:.3f}ms p95={s['p95']:.3f}ms p99={s['p99']:.3f}ms "
+                f"max={s['max']:.3f}ms")
@@ -1,17 +1,48 @@
+import os
+import queue
 import sys
-import serial
 import time
 import math
 import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QTableWidgetItem, QDialog, QVBoxLayout,
-    QLabel, QSlider, QPushButton, QHBoxLayout, QSpinBox
+    QLabel, QSlider, QPushButton, QHBoxLayout, QSpinBox, QFileDialog, QLineEdit
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QKeySequence, QShortcut
 from robotui import Ui_MainWindow
+import kinematics
+from ik_solver import IK_MODES, solve_position
+from latency import LatencyHistogram
+from workspace import WorkspaceMap
+from singularity_map import SingularityMap
+from cartesian_path import line_to
+from servo_frames import (
+    angle_to_pulse, angles_to_pulses, servo_frame, group_frame, set_calibration, set_protocol
+)
+from protocols import open_port, describe
+from serial_link import ServoLink
+from tx_scheduler import TxScheduler, CONTROL, MOTION
+from calibration import ServoCalibration
+from trajectory import plan_joint_move, MIN_FRAME_MS, SERVO_VMAX
+from last_state import StateFile
+from state_store import StateStore, Follower
+from motion_queue import MotionQueue
+from program import Program, compile_program, DEFAULT_DIR as PROGRAM_DIR
+from program_loader import open_program
 
 SERIAL_PORT = 'COM4'
 BAUD_RATE = 115200
+PROTOCOL = "lsc"            # controller protocol (protocols.py): "lsc", "binary" or "loopback"
+COALESCE_MS = 1.0           # merge writes within this window into one (0 = off)
+
+# Cartesian jog buttons -> unit direction (world coords)
+JOG_BUTTONS = {
+    "btn_pos_z_plus":  (0.0, 0.0,  1.0),
+    "btn_pos_z_minus": (0.0, 0.0, -1.0),
+    "btn_pos_x_plus":  ( 1.0, 0.0, 0.0),
+    "btn_pos_x_minus": (-1.0, 0.0, 0.0),
+}
 
 class RobotArmController(QMainWindow):
     def __init__(self):
@@ -20,10 +51,39 @@ class RobotArmController(QMainWindow):
         self.ui.setupUi(self)
 
         # state
-        self.servo_angles = [90] * 6          # degrees
+        # joint angles (deg) as versioned read-only snapshots (state_store.py):
+        # read self.state.angles, change with self.state.publish() / update()
+        self.state = StateStore([90.0] * 6)
         self.step_rotation = 2                # deg (STEP-ROT default like webpage)
         self.step_cart = 0.01                 # meters (STEP-DIS default 1 cm)
         self.speed_level = 1                  # speed-level (1..n) used as gain/iterations
+        self.ik_mode = IK_MODES[0]            # "bounded" (limit-aware) or "clamped" (old loop)
+        self.ik_deadline = 0.005              # s, wall-clock budget per IK solve
+        self.ik_latency = LatencyHistogram("IK")
+        # fitted DH model (python calibrate.py model ...), nominal table if missing;
+        # loaded before the maps below, which are only valid for the model they were built with
+        kinematics.load_model()
+        # reachable envelope (build once: python workspace.py build), None if missing
+        self.workspace = WorkspaceMap.load()
+        # jog damping and line speed near singularities (build once: python singularity_map.py build)
+        self.singularity = SingularityMap.load()
+        # per-servo pulse tables (python calibration.py / calibrate.py servos ...), linear formula if missing
+        set_calibration(ServoCalibration.load())
+        # Cartesian jogs as straight lines (streamed group frames) instead of one IK step
+        self.jog_linear = False
+        self.linear_speed = None              # m/s along the line, None = time-optimal
+        self._stream_id = 0                   # bumped to cancel a running stream
+        self.joint_profile = "trapezoid"      # or "quintic", for planned joint moves
+        self.joint_frame_s = 0.05             # s between streamed setpoints
+        # queued joint targets, corners blended (motion_queue.py)
+        self.motion_queue = MotionQueue(self.state.angles, blend_tol=2.0)
+        self.frame_lead_ms = 5                # send the next frame this early
+        self._queue_stream = None             # stream id of the running queue pump
+        # teach-and-playback program (program.py)
+        self.program = Program()
+        self.program_file = os.path.join(PROGRAM_DIR, "program.npy")
+        self.cycle_times = []                 # s, measured per playback
+        self.file_streamer = None             # program_loader.FrameStreamer of a running file
 
         # wire up joint buttons (use current step_rotation when pressed)
         self.ui.inc1.clicked.connect(lambda: self.move_servo(0, self.step_rotation))
@@ -42,9 +102,9 @@ class RobotArmController(QMainWindow):
         # HOME and SETTING
         # try both names (btn_home or btn_pos_home depending on your UI)
         if hasattr(self.ui, "btn_home"):
-            self.ui.btn_home.clicked.connect(self.reset_all_servos)
+            self.ui.btn_home.clicked.connect(self.move_home)
         if hasattr(self.ui, "btn_pos_home"):
-            self.ui.btn_pos_home.clicked.connect(self.reset_all_servos)
+            self.ui.btn_pos_home.clicked.connect(self.move_home)
         # setting
         self.ui.btn_setting.clicked.connect(self.open_settings_dialog)
 
@@ -69,39 +129,157 @@ class RobotArmController(QMainWindow):
                 self.ui.table_tmatrix.setItem(r, c, QTableWidgetItem(""))
 
         # serial
+        self.protocol = set_protocol(PROTOCOL)
         try:
-            self.ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-            print("✅ Serial connected")
+            self.ser = open_port(self.protocol, SERIAL_PORT, BAUD_RATE)
+            print(f"✅ Serial connected ({self.protocol.name})")
+            # reader thread: query replies / acks, RTT and loss counters
+            self.link = ServoLink(self.ser, self.protocol).start()
         except Exception as e:
             print("❌ Serial error:", e)
             self.ser = None
+            self.link = None
+        # every frame goes out through one writer thread; STOP jumps the queue (tx_scheduler.py)
+        # frames within COALESCE_MS go out as one write; not with per-frame acks
+        coalesce_ms = 0.0 if self.link and self.link.acks else COALESCE_MS
+        self.tx = TxScheduler(self.link.write if self.link else lambda data: None,
+                              baud=BAUD_RATE, coalesce_s=coalesce_ms / 1000.0).start()
+        QShortcut(QKeySequence(Qt.Key.Key_Escape), self, activated=self.emergency_stop)
+        # link load in the status bar (tx.metrics()), after any current notice
+        self._notice = ("", 0.0)              # (text, shown until perf_counter)
+        self.link_timer = QTimer(self)
+        self.link_timer.timeout.connect(self.show_link_status)
+        self.link_timer.start(500)
 
-        # reset and show
-        self.reset_all_servos()
-        self.show_matrix()
+        # last commanded pose (last_state.py): resume from it, home only if it cannot be trusted
+        self.state_file = StateFile()
+        self.restore_state()
+        # consumers of the state: the display redraws the newest version at most
+        # ~30 times a second, the state file records it on its own thread
+        self.display_watch = self.state.watch()
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.refresh_display)
+        self.display_timer.start(33)
+        self.state_recorder = Follower(self.state, self.save_state, "state-file").start()
+        self.refresh_display()
 
     # ---------------- servo / UI ----------------
     def move_servo(self, index, delta_deg):
         """Change one servo by delta_deg (deg)."""
-        self.servo_angles[index] = max(0, min(180, self.servo_angles[index] + delta_deg))
+        self.state.update(index, max(0, min(180, self.state.angles[index] + delta_deg)), "jog")
         self.send_servo_command(index)
-        self.update_joint_display(index)
-        self.show_matrix()
 
     def send_servo_command(self, index):
-        angle = self.servo_angles[index]
-        pulse = int(500 + (2000 * angle / 180))
-        servo_id = index + 1
-        cmd = f"#{servo_id}P{pulse}T200\r\n"
-        print("TX:", cmd.strip())
-        if self.ser:
-            try:
-                self.ser.write(cmd.encode())
-            except Exception as e:
-                print("Serial write error:", e)
-
-    def update_joint_display(self, index):
-        vs = str(self.servo_angles[index])
+        pulse = angle_to_pulse(self.state.angles[index], index)
+        self.write_frame(servo_frame(index + 1, pulse, 200), CONTROL)
+
+    def write_frame(self, data, lane=MOTION):
+        print("TX:", describe(data, self.protocol))
+        self.tx.send(data, lane)
+
+    def save_state(self, snap):
+        """State consumer: persist the newest commanded pose for the next start."""
+        self.state_file.record(snap.angles, angles_to_pulses(snap.angles))
+
+    def emergency_stop(self):
+        """Cancel every stream, drop queued motion and hold at the last commanded
+           pose; the hold frame is written before anything still waiting for the link."""
+        t_press = time.perf_counter()
+        q = self.state.angles
+        self._stream_id += 1
+        self._queue_stream = None
+        self.motion_queue.reset(q)
+        if self.file_streamer is not None:
+            self.file_streamer.stop()
+        self.tx.stop(group_frame(q, MIN_FRAME_MS), t_press)
+        print(f"STOP: hold at {[round(a, 1) for a in q]}")
+
+    def show_notice(self, text, seconds=5.0):
+        """Print `text` and keep it in the status bar for `seconds`."""
+        print(text)
+        self._notice = (text, time.perf_counter() + seconds)
+        self.show_link_status()
+
+    def show_link_status(self):
+        m = self.tx.metrics()
+        text, until = self._notice
+        self.statusBar().showMessage(
+            (f"{text}  |  " if time.perf_counter() < until else "") +
+            f"link {m['utilization'] * 100:3.0f} %  {m['bytes_per_s']:5.0f} B/s  "
+            f"queue {m['queue_frames']} ({m['backlog_ms']:.0f} ms)  buffer {m['buffer_pct']:3.0f} %")
+
+    def move_joints(self, target):
+        """Synchronized joint move (trajectory.py): every joint arrives together,
+           within its servo velocity / acceleration limits."""
+        traj = plan_joint_move(self.state.angles, target, self.joint_profile, dt=self.joint_frame_s)
+        print(f"Joint move: {traj.duration:.2f} s, {len(traj.t) - 1} setpoints")
+        self._stream_id += 1
+        self.stream_waypoints(self._stream_id, traj.q[1:], traj.durations_ms()[1:])
+
+    def move_home(self):
+        self.move_joints(kinematics.HOME_ANGLES)
+
+    def queue_joints(self, target):
+        """Append a joint target to the motion queue; consecutive targets are
+           blended and streamed without stopping at each one."""
+        if self._queue_stream != self._stream_id:
+            # nothing running: start a fresh plan from where the arm is now
+            self.motion_queue.reset(self.state.angles)
+            self.motion_queue.push(target)
+            self.start_queue()
+        else:
+            self.motion_queue.push(target)
+
+    def queue_typed_target(self, text):
+        """GO button: "a1, a2, ..., a6" (deg) -> queue_joints; pressing GO again
+           while the arm moves blends into the new target."""
+        try:
+            target = [float(a) for a in text.replace(";", ",").split(",")]
+        except ValueError:
+            target = []
+        if len(target) != 6:
+            print("GO: enter 6 joint angles (deg), e.g. 90, 90, 90, 90, 90, 90")
+            return
+        self.queue_joints(kinematics.clamp_angles(target))
+
+    def start_queue(self):
+        self._stream_id += 1                  # cancels whatever is streaming
+        self._queue_stream = self._stream_id
+        self.pump_queue(self._stream_id, time.perf_counter())
+
+    def pump_queue(self, stream_id, t_due):
+        """Send the next queued frame, then schedule the one after it frame_lead_ms
+           before this frame's T expires (absolute schedule, no drift)."""
+        if stream_id != self._stream_id:
+            return
+        if self.tx.saturated:                 # backpressure: link behind, keep the schedule
+            QTimer.singleShot(1, lambda: self.pump_queue(stream_id, t_due))
+            return
+        item = self.motion_queue.next_frame()
+        if item is None:
+            self._queue_stream = None
+            return
+        time_ms, q = item
+        self.state.publish(q, "queue")
+        self.write_frame(group_frame(q, time_ms))
+        t_due = max(t_due, time.perf_counter()) + time_ms / 1000.0
+        delay_ms = (t_due - time.perf_counter()) * 1000.0 - self.frame_lead_ms
+        QTimer.singleShot(max(0, int(delay_ms)), lambda: self.pump_queue(stream_id, t_due))
+
+    def refresh_display(self):
+        """Display consumer: joint fields and matrix for the newest state version;
+           versions published in between are skipped."""
+        snap = self.display_watch.changed()
+        if snap is None:
+            return
+        for i in range(6):
+            self.update_joint_display(i, snap.angles)
+        self.show_matrix(snap.angles)
+
+    def update_joint_display(self, index, angles=None):
+        if angles is None:
+            angles = self.state.angles
+        vs = str(float(angles[index]))
         try:
             if index == 0: self.ui.line_j1_val.setText(vs)
             elif index == 1: self.ui.line_j2_val.setText(vs)
@@ -113,117 +291,224 @@ class RobotArmController(QMainWindow):
             pass
 
     def reset_all_servos(self):
+        """One synchronized frame to 90°; the position is unknown, so T covers the
+           worst case (a joint at 0 or 180°) at the slowest servo's speed."""
         print("Reset to home (90°)")
-        for i in range(6):
-            self.servo_angles[i] = 90
-            self.send_servo_command(i)
-            self.update_joint_display(i)
-            time.sleep(0.05)
-        self.show_matrix()
+        q = self.state.publish([90.0] * 6, "home").angles
+        time_ms = int(math.ceil(float(np.max(90.0 / SERVO_VMAX)) * 1000.0))
+        self.write_frame(group_frame(q, time_ms), CONTROL)
+
+    def restore_state(self):
+        """Take over the pose saved by the last run instead of homing; home when
+           it is missing, stale, invalid or the controller reports otherwise."""
+        last, reason = self.state_file.restore(angles_to_pulses)
+        if last is not None and self.link:
+            reported = self.link.positions(list(range(1, 7)), timeout=0.2)
+            if not StateFile.matches_controller(last, reported):
+                last, reason = None, f"controller reports {reported}, saved {last.pulses}"
+        if last is None:
+            print(f"No pose to resume ({reason})")
+            self.reset_all_servos()
+            return
+        self.state.publish(last.angles, "restore")
+        print(f"Resumed at {[round(a, 1) for a in last.angles]} (saved {last.age:.0f} s ago)")
 
     # ---------------- kinematics ----------------
     def dh_transform(self, theta_deg, d, a, alpha_deg):
-        theta = math.radians(theta_deg)
-        alpha = math.radians(alpha_deg)
-        ct = math.cos(theta); st = math.sin(theta)
-        ca = math.cos(alpha); sa = math.sin(alpha)
-        return np.array([
-            [ct, -st*ca,  st*sa, a*ct],
-            [st,  ct*ca, -ct*sa, a*st],
-            [0.0,    sa,     ca,    d],
-            [0.0,    0.0,    0.0,  1.0]
-        ], dtype=float)
+        return kinematics.dh_transform(theta_deg, d, a, alpha_deg)
 
     def forward_kinematics(self, angles=None):
         """Return 4x4 T and position vector (x,y,z)."""
         if angles is None:
-            angles = self.servo_angles
-        dh_params = [
-            [angles[0], 0.100, 0.0,   90],
-            [angles[1], 0.0,   0.100, 0],
-            [angles[2], 0.0,   0.074, 0],
-            [angles[3], 0.013, 0.0,   90],
-            [angles[4], 0.0,   0.005, -90],
-            [angles[5], 0.0,   0.0,    0]
-        ]
-        T = np.eye(4)
-        for p in dh_params:
-            T = T @ self.dh_transform(*p)
-        # enforce home target if exact home
-        if all(int(a)==90 for a in angles):
-            T[0,3] = 0.274
-            T[1,3] = 0.0
-            T[2,3] = 0.187
+            angles = self.state.angles
+        T, _ = kinematics.forward_kinematics(angles)
         pos = np.array([T[0,3], T[1,3], T[2,3]], dtype=float)
         return T, pos
 
-    def numeric_jacobian(self, eps_deg=0.01):
-        """Numerical position Jacobian 3x6 (dp / dtheta_rad)."""
-        base_T, p0 = self.forward_kinematics(self.servo_angles)
-        J = np.zeros((3,6), dtype=float)
-        eps = eps_deg
-        for j in range(6):
-            pert = list(self.servo_angles)
-            pert[j] += eps
-            _, pj = self.forward_kinematics(pert)
-            dp = pj - p0
-            J[:, j] = dp / math.radians(eps)  # dp / rad
-        return J
-
-    def damped_least_squares(self, J, delta_pos, lam=0.05):
-        """DLS solver returning delta_theta (rad)."""
-        JJt = J @ J.T
-        A = JJt + (lam**2) * np.eye(3)
-        try:
-            Ainv = np.linalg.inv(A)
-        except np.linalg.LinAlgError:
-            Ainv = np.linalg.pinv(A)
-        delta_theta = J.T @ (Ainv @ delta_pos)
-        return delta_theta
-
     # ---------------- position control (IK) ----------------
     def move_cartesian(self, dx, dy, dz, max_iter=5):
-        """Try to move end-effector by (dx,dy,dz) (meters) using DLS IK.
-           This keeps orientation fixed and only changes joint angles to achieve position.
+        """Try to move end-effector by (dx,dy,dz) (meters) using position IK (ik_solver).
+           The solve runs offline on the raw DH chain within self.ik_deadline; joints
+           are sent once, with the best solution found unless the solver gave up
+           (blocked by a limit / stalled).
         """
+        if self.jog_linear:
+            return self.move_linear(dx, dy, dz)
+        if self.tx.saturated:                 # not sent, not unreachable: try again
+            self.show_notice(f"Jog dropped: serial link busy "
+                             f"({self.tx.metrics()['backlog_ms']:.0f} ms queued)", 2.0)
+            return
         # small target per call (dx,dy,dz should be small)
-        target = np.array([dx, dy, dz], dtype=float)
+        delta = np.array([dx, dy, dz], dtype=float)
         # scaling by speed_level (higher => bigger step applied in fewer iterations)
-        gain = 1.0 * self.speed_level
-        target = target * gain
-
-        for it in range(max_iter):
-            T, pos = self.forward_kinematics(self.servo_angles)
-            J = self.numeric_jacobian()
-            # compute delta_theta (rad)
-            delta_theta_rad = self.damped_least_squares(J, target, lam=0.05)
-            delta_deg = np.degrees(delta_theta_rad)
-            # apply a fraction to avoid overshoot
-            apply_frac = 1.0
-            for i in range(6):
-                self.servo_angles[i] = max(0, min(180, self.servo_angles[i] + apply_frac * delta_deg[i]))
-            # send commands
-            for i in range(6):
-                self.send_servo_command(i)
-                self.update_joint_display(i)
-            # recompute residual
-            _, newpos = self.forward_kinematics(self.servo_angles)
-            achieved = newpos - pos
-            # if achieved is close to target, stop
-            if np.linalg.norm(achieved - target) < 1e-4:
-                break
-            # otherwise try to correct remaining (set target to remaining)
-            target = target - achieved
-        # refresh matrix
-        self.show_matrix()
+        delta = delta * self.speed_level
+
+        snap = self.state.get()               # solve against one consistent pose
+        _, pos = kinematics.forward_kinematics(snap.angles)
+        if self.workspace is not None and not self.workspace.reachable(pos + delta):
+            self.show_notice("Jog refused: target outside the reachable workspace", 2.0)
+            return
+        extra = {}
+        if self.singularity is not None and self.ik_mode == "bounded":
+            extra["lam"] = float(self.singularity.damping(snap.angles))
+        result = solve_position(snap.angles, pos + delta, mode=self.ik_mode, max_iter=max_iter,
+                                deadline=self.ik_deadline, histogram=self.ik_latency, **extra)
+        if result.status in ("blocked", "stalled"):
+            self.show_notice(f"Jog refused: IK {result.status} after {result.iterations} it: "
+                             f"{result.reason}", 2.0)
+            return
+        if self.state.publish(result.angles, "ik", expect=snap.version) is None:
+            print("IK result dropped: the pose changed while solving")
+            return
+        # send commands
+        for i in range(6):
+            self.send_servo_command(i)
+
+    def move_linear(self, dx, dy, dz):
+        """Straight-line jog: plan + validate the whole path (cartesian_path), then
+           stream one group frame per waypoint."""
+        delta = np.array([dx, dy, dz], dtype=float) * self.speed_level
+        plan = line_to(self.state.angles, delta, speed=self.linear_speed, orientation=False,
+                       workspace=self.workspace, singularity=self.singularity)
+        if not plan.ok:
+            print("Path rejected:", plan.reason)
+            return
+        self._stream_id += 1
+        self.stream_waypoints(self._stream_id, plan.angles[1:], plan.durations_ms[1:])
+
+    def stream_waypoints(self, stream_id, angles, durations_ms):
+        """Send the next waypoint now and schedule the rest when its T has elapsed."""
+        if stream_id != self._stream_id or len(angles) == 0:
+            return
+        if self.tx.saturated:
+            QTimer.singleShot(1, lambda: self.stream_waypoints(stream_id, angles, durations_ms))
+            return
+        q = self.state.publish(angles[0], "line").angles
+        self.write_frame(group_frame(q, durations_ms[0]))
+        QTimer.singleShot(int(durations_ms[0]),
+                          lambda: self.stream_waypoints(stream_id, angles[1:], durations_ms[1:]))
+
+    # ---------------- teach / playback ----------------
+    def teach_point(self, dwell_ms=0):
+        q = self.state.angles
+        self.program.add_move(q, dwell_ms)
+        print(f"Taught step {len(self.program)}: {[round(a, 1) for a in q]}")
+
+    def play_program(self):
+        """Pre-encode the whole program, then stream it (frames go out frame_lead_ms
+           before the previous T expires)."""
+        if len(self.program) == 0:
+            print("Program is empty")
+            return
+        t0 = time.perf_counter()
+        compiled = compile_program(self.program, self.state.angles)
+        print(f"Program: {len(compiled)} frames, {compiled.nbytes} bytes, "
+              f"{compiled.duration_ms / 1000:.2f} s planned "
+              f"(compiled in {(time.perf_counter() - t0) * 1000:.1f} ms)")
+        self._stream_id += 1
+        now = time.perf_counter()
+        self.play_frames(self._stream_id, compiled.frames, 0, now, now)
+
+    def play_frames(self, stream_id, frames, index, t_due, t_start):
+        if stream_id != self._stream_id:
+            return
+        if self.tx.saturated:
+            QTimer.singleShot(1, lambda: self.play_frames(stream_id, frames, index, t_due, t_start))
+            return
+        if index == len(frames):
+            cycle = max(t_due, time.perf_counter()) - t_start
+            self.cycle_times.append(cycle)
+            print(f"Cycle time: {cycle:.3f} s (run {len(self.cycle_times)})")
+            return
+        time_ms, frame, q = frames[index]
+        self.state.publish(q, "program")
+        if frame:
+            self.write_frame(frame)
+        t_due = max(t_due, time.perf_counter()) + time_ms / 1000.0
+        delay_ms = (t_due - time.perf_counter()) * 1000.0 - self.frame_lead_ms
+        if index + 1 == len(frames):
+            delay_ms += self.frame_lead_ms    # wait for the last move to finish
+        QTimer.singleShot(max(0, int(delay_ms)),
+                          lambda: self.play_frames(stream_id, frames, index + 1, t_due, t_start))
+
+    def run_program_file(self, path=None):
+        """Stream a CSV / G-code program file (program_loader.py): parsing and IK
+           run on a worker thread at most a few frames ahead of the serial link."""
+        if path is None:
+            path, _ = QFileDialog.getOpenFileName(self, "Run program file", PROGRAM_DIR,
+                                                  "Programs (*.csv *.gcode *.nc *.txt *.trj)")
+            if not path:
+                return
+        if self.file_streamer is not None:
+            self.file_streamer.stop()
+        try:
+            self.file_streamer = open_program(path, self.state.angles)
+        except (OSError, ValueError) as e:
+            print("Program file error:", e)
+            return
+        self._stream_id += 1
+        now = time.perf_counter()
+        self.pump_file(self._stream_id, self.file_streamer, now, now)
+
+    def pump_file(self, stream_id, streamer, t_due, t_start):
+        if stream_id != self._stream_id:
+            streamer.stop()
+            return
+        if self.tx.saturated:
+            QTimer.singleShot(1, lambda: self.pump_file(stream_id, streamer, t_due, t_start))
+            return
+        try:
+            item = streamer.get(timeout=0)
+        except queue.Empty:                   # producer behind (IK batch): poll again soon
+            QTimer.singleShot(1, lambda: self.pump_file(stream_id, streamer, t_due, t_start))
+            return
+        if item is None:
+            if streamer.error:
+                e = streamer.error
+                self.show_notice(f"Program stopped: {type(e).__name__}: {e}", 10.0)
+            else:
+                print(f"File done: {streamer.produced} frames, {time.perf_counter() - t_start:.2f} s")
+            return
+        time_ms, frame, q = item
+        self.state.publish(q, "file")
+        if frame:
+            self.write_frame(frame)
+        t_due = max(t_due, time.perf_counter()) + time_ms / 1000.0
+        delay_ms = (t_due - time.perf_counter()) * 1000.0 - self.frame_lead_ms
+        QTimer.singleShot(max(0, int(delay_ms)),
+                          lambda: self.pump_file(stream_id, streamer, t_due, t_start))
+
+    def save_program(self):
+        self.program.save(self.program_file)
+        print(f"Program saved: {len(self.program)} steps -> {self.program_file}")
+
+    def load_program(self):
+        try:
+            self.program = Program.load(self.program_file)
+            print(f"Program loaded: {len(self.program)} steps")
+        except (OSError, ValueError) as e:
+            print("Program load error:", e)
 
     # ---------------- display ----------------
-    def show_matrix(self):
-        T, pos = self.forward_kinematics(self.servo_angles)
+    def show_matrix(self, angles=None):
+        if angles is None:
+            angles = self.state.angles
+        T, pos = self.forward_kinematics(angles)
         # display with 3 decimals (like web)
         for r in range(4):
             for c in range(4):
                 self.ui.table_tmatrix.setItem(r, c, QTableWidgetItem(f"{T[r,c]:.3f}"))
+        self.update_jog_buttons(pos)
+
+    def update_jog_buttons(self, pos):
+        """Disable the Cartesian jog buttons whose next step leaves the workspace."""
+        if self.workspace is None:
+            return
+        step = self.step_cart * self.speed_level
+        for name, direction in JOG_BUTTONS.items():
+            btn = getattr(self.ui, name, None)
+            if btn is not None:
+                btn.setEnabled(self.workspace.reachable(pos + step * np.array(direction)))
 
     # ---------------- settings dialog (like web) ----------------
     def open_settings_dialog(self):
@@ -274,6 +559,27 @@ class RobotArmController(QMainWindow):
         h3.addWidget(slider_spd)
         v.addLayout(h3)
 
+        # PROGRAM: teach / play / save / load / clear
+        h4 = QHBoxLayout()
+        for text, slot in (("TEACH", self.teach_point), ("PLAY", self.play_program),
+                           ("SAVE", self.save_program), ("LOAD", self.load_program),
+                           ("CLEAR", lambda: self.program.clear()),
+                           ("RUN FILE", self.run_program_file), ("STOP", self.emergency_stop)):
+            btn = QPushButton(text)
+            btn.clicked.connect(lambda checked=False, f=slot: f())
+            h4.addWidget(btn)
+        v.addLayout(h4)
+
+        # GO: queue a joint target (blended with any queued motion)
+        h5 = QHBoxLayout()
+        edit_go = QLineEdit(", ".join(f"{a:.0f}" for a in self.state.angles))
+        btn_go = QPushButton("GO")
+        btn_go.clicked.connect(lambda: self.queue_typed_target(edit_go.text()))
+        h5.addWidget(QLabel("JOINTS (deg):"))
+        h5.addWidget(edit_go)
+        h5.addWidget(btn_go)
+        v.addLayout(h5)
+
         # Set / Close buttons
         btn_set = QPushButton("SET")
         btn_set.clicked.connect(lambda: (self.show_matrix(), dialog.close()))
@@ -290,4 +596,14 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = RobotArmController()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    code = app.exec()
+    print(window.ik_latency)
+    window.tx.close()
+    print(window.tx.stop_latency, window.tx.stats())
+    print("link:", {k: round(v, 3) for k, v in window.tx.metrics().items()})
+    window.state_recorder.stop()             # records the last version first
+    window.state_file.close()
+    if window.link:
+        window.link.close()
+        print(window.link.rtt, window.link.stats())
+    sys.exit(code)
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""Look-ahead motion queue: consecutive joint targets blended into one continuous stream.
+
+    mq = MotionQueue(q_current, blend_tol=2.0)
+    mq.push(q_a); mq.push(q_b); mq.push(q_c)
+    while (item := mq.next_frame()) is not None:
+        time_ms, angles = item          # send group_frame(angles, time_ms)
+
+Every corner between two straight joint-space segments is replaced by a parabolic
+(quadratic Bezier) blend that stays within `blend_tol` deg of the corner, so the
+arm passes near each intermediate target without stopping. The path is timed with
+trajectory.time_parameterize over a window of `lookahead` targets (the window
+always ends at rest, so the arm can stop if nothing else is queued); only the part
+up to the next corner is committed, the rest is re-planned as new targets arrive.
+"""
+import math
+from collections import deque
+import numpy as np
+
+from kinematics import N_JOINTS, JOINT_MIN, JOINT_MAX
+from trajectory import SERVO_VMAX, SERVO_AMAX, MIN_FRAME_MS, EPS_DEG, time_parameterize
+
+# a target closer than this (deg, every joint) to the pose before it adds no motion
+SAME_POSE_DEG = 1e-3
+
+
+def _sample_line(p0, p1, step):
+    n = max(1, int(math.ceil(np.max(np.abs(p1 - p0)) / step)))
+    s = np.linspace(0.0, 1.0, n + 1)[1:]
+    return p0 + s[:, None] * (p1 - p0)
+
+
+def _sample_blend(a, w, c, step):
+    """Quadratic Bezier a -> c with control point w (the corner)."""
+    n = max(2, int(math.ceil((np.max(np.abs(w - a)) + np.max(np.abs(c - w))) / step)))
+    s = np.linspace(0.0, 1.0, n + 1)[1:, None]
+    return (1 - s) ** 2 * a + 2 * s * (1 - s) * w + s * s * c
+
+
+def blend_path(waypoints, tol=2.0, step=2.0, free_start=False):
+    """Dense joint path through `waypoints` (K,6) with parabolic corner blends.
+
+    Each corner is cut at distance l = min(4*tol/|u_out-u_in|, half of each
+    neighbouring segment) along both segments; the Bezier midpoint then lies
+    exactly l*|u_out-u_in|/4 <= tol from the corner. free_start: the first
+    segment may be used up to its full length (it continues an earlier plan).
+    Returns (path (N,6), entry (K,)) where entry[k] is the path index at which the
+    motion leaves the straight line towards waypoint k (the blend start).
+    """
+    P = np.asarray(waypoints, dtype=float)
+    seg = np.diff(P, axis=0)
+    length = np.linalg.norm(seg, axis=1)
+    u = seg / np.maximum(length, 1e-12)[:, None]
+    K = len(P)
+    cut = np.zeros(K)
+    for k in range(1, K - 1):
+        du = np.linalg.norm(u[k] - u[k - 1])
+        if length[k - 1] < 1e-9 or length[k] < 1e-9 or du < 1e-9:
+            continue
+        before = length[k - 1] if (k == 1 and free_start) else 0.5 * length[k - 1]
+        cut[k] = min(4.0 * tol / du, before, 0.5 * length[k])
+    out = [P[:1]]
+    entry = np.zeros(K, dtype=np.intp)
+    pos = P[0]
+    for k in range(1, K):
+        a = P[k] - cut[k] * u[k - 1]
+        if np.max(np.abs(a - pos)) > EPS_DEG:
+            out.append(_sample_line(pos, a, step))
+        entry[k] = sum(len(o) for o in out) - 1
+        if cut[k] > 0.0:
+            c = P[k] + cut[k] * u[k]
+            out.append(_sample_blend(a, P[k], c, step))
+            pos = c
+        else:
+            pos = P[k]
+    if not np.allclose(out[-1][-1], P[-1], rtol=0.0, atol=EPS_DEG):
+        out.append(P[-1:])
+    elif len(out) > 1:
+        out[-1] = np.vstack([out[-1][:-1], P[-1:]])    # land exactly on the target
+    return np.concatenate(out), entry
+
+
+class MotionQueue:
+    def __init__(self, q_current, blend_tol=2.0, lookahead=8, step=2.0,
+                 vmax=SERVO_VMAX, amax=SERVO_AMAX, min_frame_ms=MIN_FRAME_MS):
+        self.blend_tol = blend_tol
+        self.lookahead = max(3, lookahead)
+        self.step = step                       # deg, max joint change per frame
+        self.vmax, self.amax, self.min_frame_ms = vmax, amax, min_frame_ms
+        self.targets = deque()
+        self.frames = deque()                  # committed (time_ms, angles)
+        self.reset(q_current)
+
+    def reset(self, q_current):
+        """Drop everything queued; the next plan starts at rest from q_current."""
+        self.targets.clear()
+        self.frames.clear()
+        self._q = np.clip(np.asarray(q_current, dtype=float), JOINT_MIN, JOINT_MAX)
+        self._v = 0.0                          # peak joint speed (deg/s) at self._q
+        self._continuing = False               # self._q lies on a segment already planned
+
+    def push(self, target):
+        """Queue a joint target; one equal to the previous target (or to the pose
+        the queue ends at) is dropped, it would be a zero-length move."""
+        q = np.clip(np.asarray(target, dtype=float), JOINT_MIN, JOINT_MAX)
+        if q.shape != (N_JOINTS,):
+            raise ValueError(f"target must have {N_JOINTS} joint angles")
+        last = self.targets[-1] if self.targets else self._q
+        if np.max(np.abs(q - last)) < SAME_POSE_DEG:
+            return
+        self.targets.append(q)
+
+    def extend(self, targets):
+        for q in targets:
+            self.push(q)
+
+    def __len__(self):
+        return len(self.frames) + len(self.targets)
+
+    @property
+    def idle(self):
+        return not self.frames and not self.targets
+
+    def _plan(self):
+        window = list(self.targets)[:self.lookahead]
+        final = len(self.targets) <= self.lookahead
+        P = np.vstack([self._q] + window)
+        path, entry = blend_path(P, self.blend_tol, self.step, free_start=self._continuing)
+        if len(path) < 2:                      # nothing to move (targets at self._q)
+            for _ in range(len(window)):
+                self.targets.popleft()
+            return
+        ms = time_parameterize(path, self.vmax, self.amax, self.min_frame_ms, v_start=self._v)
+        if final or len(window) < 2:
+            end, used = len(path) - 1, len(window)
+        else:
+            end, used = int(entry[2]), 1       # up to the blend into the second target
+        end = max(end, 1)
+        for i in range(1, end + 1):
+            self.frames.append((int(ms[i]), path[i]))
+        for _ in range(used):
+            self.targets.popleft()
+        self._q = path[end]
+        if end < len(path) - 1:
+            self._v = float(np.max(np.abs(path[end] - path[end - 1]))) / (ms[end] / 1000.0)
+            self._continuing = True
+        else:
+            self._v = 0.0
+            self._continuing = False
+
+    def next_frame(self):
+        """(time_ms, angles) of the next setpoint, or None when the queue is empty."""
+        while not self.frames and self.targets:
+            self._plan()
+        return self.frames.popleft() if self.frames else None
+
+    def plan_all(self):
+        """Drain the queue: (angles (N,6), durations_ms (N,)) of the whole program."""
+        items = list(iter(self.next_frame, None))
+        if not items:
+            return np.empty((0, N_JOINTS)), np.zeros(0)
+        return np.array([q for _, q in items]), np.array([t for t, _ in items], dtype=float)
@@ -0,0 +1,163 @@
+"""Teach-and-playback programs: recorded joint waypoints, dwells and gripper actions.
+
+    prog = Program()
+    prog.add_move(servo_angles); prog.add_grip(GRIP_CLOSE); prog.add_dwell(500)
+    prog.save("programs/pick.npy")
+
+    compiled = compile_program(Program.load("programs/pick.npy"), q_current)
+    cycle_s = run_frames(ser.write, compiled.frames)
+
+File format: one .npy structured array (np.save header carries the dtype),
+27 bytes per step: kind (u1: 0 move, 1 dwell, 2 grip), q (6 x f4, deg; grip
+uses q[GRIPPER_JOINT]) and ms (u2: dwell time, or travel time of a grip).
+
+compile_program() turns the whole program into pre-encoded frames before
+anything moves: consecutive moves are blended through motion_queue, dwells and
+grips break the blend. run_frames() only writes bytes on schedule.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+import numpy as np
+
+from kinematics import N_JOINTS, JOINT_MIN, JOINT_MAX
+from motion_queue import MotionQueue, SAME_POSE_DEG
+from servo_frames import angle_to_pulse, group_frame, servo_frame
+
+MOVE, DWELL, GRIP = 0, 1, 2
+STEP_DTYPE = np.dtype([("kind", "u1"), ("q", "<f4", (N_JOINTS,)), ("ms", "<u2")])
+
+GRIPPER_JOINT = 5              # J6 drives the gripper
+GRIP_OPEN = 30.0               # deg
+GRIP_CLOSE = 150.0
+GRIP_MS = 300                  # travel time of a grip action
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+
+
+class Program:
+    def __init__(self, steps=None):
+        self.steps = np.zeros(0, dtype=STEP_DTYPE) if steps is None else steps
+        self._pending = []
+
+    # ---------------- recording ----------------
+    def _append(self, kind, q, ms):
+        self._pending.append((kind, np.clip(q, JOINT_MIN, JOINT_MAX), min(int(ms), 0xFFFF)))
+
+    def _flush(self):
+        if self._pending:
+            self.steps = np.concatenate([self.steps, np.array(self._pending, dtype=STEP_DTYPE)])
+            self._pending = []
+
+    def add_move(self, angles, dwell_ms=0):
+        """Record a joint waypoint (deg); dwell_ms > 0 also records a pause there."""
+        self._append(MOVE, np.asarray(angles, dtype=float), 0)
+        if dwell_ms > 0:
+            self.add_dwell(dwell_ms)
+
+    def add_dwell(self, ms):
+        self._append(DWELL, np.zeros(N_JOINTS), ms)
+
+    def add_grip(self, angle, ms=GRIP_MS):
+        q = np.zeros(N_JOINTS)
+        q[GRIPPER_JOINT] = angle
+        self._append(GRIP, q, ms)
+
+    def undo(self):
+        self._flush()
+        self.steps = self.steps[:-1]
+
+    def clear(self):
+        self._pending = []
+        self.steps = np.zeros(0, dtype=STEP_DTYPE)
+
+    def __len__(self):
+        return len(self.steps) + len(self._pending)
+
+    # ---------------- persist ----------------
+    def save(self, path):
+        self._flush()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.save(path, self.steps)
+
+    @classmethod
+    def load(cls, path):
+        steps = np.load(path)
+        if steps.dtype != STEP_DTYPE:
+            raise ValueError(f"{path}: not a program file (dtype {steps.dtype})")
+        return cls(steps)
+
+
+# ---------------- compile / execute ----------------
+@dataclass
+class CompiledProgram:
+    # (time_ms, frame bytes or b"" for a pause, joint angles after the frame)
+    frames: list = field(default_factory=list)
+    duration_ms: float = 0.0
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def nbytes(self):
+        return sum(len(f) for _, f, _ in self.frames)
+
+
+def compile_program(program, q_start, blend_tol=2.0, lookahead=8):
+    """Plan and encode every frame of `program` starting from q_start. A move to
+    the pose the arm is already at (recorded twice, or the start pose) is skipped."""
+    program._flush()
+    out = CompiledProgram()
+    q = np.clip(np.asarray(q_start, dtype=float), JOINT_MIN, JOINT_MAX)
+    mq = MotionQueue(q, blend_tol=blend_tol, lookahead=lookahead)
+
+    last = q                    # where the queued moves end
+
+    def drain():
+        nonlocal q, last
+        for time_ms, angles in iter(mq.next_frame, None):
+            out.frames.append((time_ms, group_frame(angles, time_ms), angles))
+            out.duration_ms += time_ms
+            q = angles
+        mq.reset(q)
+        last = q
+
+    for kind, target, ms in program.steps:
+        if kind == MOVE:
+            target = target.astype(float)
+            if np.max(np.abs(target - last)) >= SAME_POSE_DEG:
+                mq.push(target)
+                last = target
+            continue
+        drain()
+        ms = int(ms)
+        if kind == DWELL:
+            out.frames.append((ms, b"", q))
+        else:
+            q = q.copy()
+            q[GRIPPER_JOINT] = target[GRIPPER_JOINT]
+            pulse = angle_to_pulse(q[GRIPPER_JOINT], GRIPPER_JOINT)
+            out.frames.append((ms, servo_frame(GRIPPER_JOINT + 1, pulse, ms), q))
+            mq.reset(q)
+            last = q
+        out.duration_ms += ms
+    drain()
+    return out
+
+
+def run_frames(write, frames, lead_ms=5.0, sleep=time.sleep, clock=time.perf_counter):
+    """Blocking playback of (time_ms, frame, angles) items: each frame goes out
+    lead_ms before the previous one's T expires (absolute schedule). Returns the
+    measured cycle time (s)."""
+    t0 = t_due = clock()
+    for time_ms, frame, _ in frames:
+        delay = t_due - lead_ms / 1000.0 - clock()
+        if delay > 0:
+            sleep(delay)
+        if frame:
+            write(frame)
+        t_due = max(t_due, clock()) + time_ms / 1000.0
+    delay = t_due - clock()
+    if delay > 0:
+        sleep(delay)
+    return clock() - t0
@@ -0,0 +1,339 @@
+"""Streaming loader for long offline motion programs (CSV or a small G-code dialect).
+
+    python program_loader.py path/to/prog.gcode [--port COM4] [--queue 32]
+
+Everything is a generator chain, so memory stays flat whatever the file length
+and the first frames go out while the rest of the file is still unread:
+
+    lines -> parse() -> resolve_ik() -> iter_frames() -> FrameStreamer -> run_frames()
+
+CSV (one point per line, '#' comments, non-numeric header lines skipped):
+    j1,j2,j3,j4,j5,j6[,ms]    joint point (deg)
+    x,y,z[,ms]                Cartesian point (mm, base frame, position only)
+
+G-code dialect (';' or '(...)' comments, modal: missing words keep their value):
+    G0 A.. B.. C.. U.. V.. W..   joint point, J1..J6 (deg)
+    G1 X.. Y.. Z..               Cartesian point (mm)
+    ... P..                      on G0/G1: travel time (ms) instead of blending
+    G4 P..                       dwell (ms)
+    M3 [S..] / M5 [S..]          close / open the gripper (S: angle, deg)
+
+Points without an explicit time are blended through motion_queue; a timed point,
+dwell or grip finishes the blend first. Cartesian points are converted to joints
+in batches (one vectorized DLS solve per batch, see cartesian_path.solve_batch).
+"""
+import argparse
+import csv
+import queue
+import re
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+import numpy as np
+
+from kinematics import (
+    N_JOINTS, JOINT_MIN, JOINT_MAX, HOME_ANGLES, forward_kinematics, jacobian, load_model
+)
+from ik_solver import solve_position_bounded
+from cartesian_path import solve_batch
+from motion_queue import MotionQueue, SAME_POSE_DEG
+from program import MOVE, DWELL, GRIP, GRIPPER_JOINT, GRIP_OPEN, GRIP_CLOSE, GRIP_MS
+from servo_frames import angle_to_pulse, group_frame, servo_frame
+from trajectory_file import TrajectoryFile
+
+CART = 3
+JOINT_WORDS = "ABCUVW"
+_WORD = re.compile(r"([A-Z])\s*([-+]?\d*\.?\d+)")
+
+
+class ProgramError(ValueError):
+    def __init__(self, lineno, message):
+        super().__init__(f"line {lineno}: {message}")
+        self.lineno = lineno
+
+
+@dataclass
+class Step:
+    kind: int                  # MOVE, CART, DWELL or GRIP
+    values: np.ndarray         # joints (deg), xyz (m) or gripper angle
+    ms: int                    # explicit time (0 = blend / default)
+    lineno: int
+
+
+# ---------------- parse ----------------
+def _parse_csv(lines):
+    for lineno, row in enumerate(csv.reader(lines), 1):
+        if not row or row[0].lstrip().startswith("#"):
+            continue
+        try:
+            nums = [float(v) for v in row if v.strip()]
+        except ValueError:
+            if lineno == 1:
+                continue               # header
+            raise ProgramError(lineno, f"not a number: {row}")
+        if len(nums) in (N_JOINTS, N_JOINTS + 1):
+            yield Step(MOVE, np.array(nums[:N_JOINTS]), int(nums[N_JOINTS]) if len(nums) > N_JOINTS else 0,
+                       lineno)
+        elif len(nums) in (3, 4):
+            yield Step(CART, np.array(nums[:3]) / 1000.0, int(nums[3]) if len(nums) > 3 else 0, lineno)
+        else:
+            raise ProgramError(lineno, f"expected 3/4 or 6/7 values, got {len(nums)}")
+
+
+def _parse_gcode(lines):
+    joints = np.array(HOME_ANGLES, dtype=float)
+    xyz = None
+    for lineno, line in enumerate(lines, 1):
+        line = re.sub(r"\(.*?\)", "", line.split(";", 1)[0]).upper()
+        words = dict(_WORD.findall(line))
+        if not words:
+            continue
+        ms = int(float(words.get("P", 0)))
+        if "G" in words:
+            g = int(float(words["G"]))
+            if g == 0:
+                for i, w in enumerate(JOINT_WORDS):
+                    if w in words:
+                        joints[i] = float(words[w])
+                xyz = None
+                yield Step(MOVE, joints.copy(), ms, lineno)
+            elif g == 1:
+                if xyz is None:
+                    xyz = forward_kinematics(joints)[1] * 1000.0
+                for i, w in enumerate("XYZ"):
+                    if w in words:
+                        xyz[i] = float(words[w])
+                yield Step(CART, xyz / 1000.0, ms, lineno)
+            elif g == 4:
+                yield Step(DWELL, np.zeros(0), ms, lineno)
+            else:
+                raise ProgramError(lineno, f"unsupported G{g}")
+        elif "M" in words:
+            m = int(float(words["M"]))
+            if m not in (3, 5):
+                raise ProgramError(lineno, f"unsupported M{m}")
+            angle = float(words.get("S", GRIP_CLOSE if m == 3 else GRIP_OPEN))
+            yield Step(GRIP, np.array([angle]), ms or GRIP_MS, lineno)
+
+
+def parse(lines, fmt=None):
+    """Lazily parse an iterable of text lines. fmt: "csv", "gcode" or None (guess
+    from the first meaningful line)."""
+    lines = iter(lines)
+    if fmt is None:
+        head = []
+        for line in lines:
+            head.append(line)
+            s = line.strip()
+            if s and not s.startswith((";", "(", "#")):
+                fmt = "gcode" if s[0].upper() in "GM" else "csv"
+                break
+        lines = _chain(head, lines)
+    return _parse_gcode(lines) if fmt == "gcode" else _parse_csv(lines)
+
+
+def _chain(head, rest):
+    yield from head
+    yield from rest
+
+
+# ---------------- batched IK ----------------
+def _solve_cart(q_prev, points, lineno):
+    """Joint solutions for consecutive Cartesian points, one batch."""
+    P = np.asarray(points)
+    # seeds: one linearized DLS step from the previous solution to every point
+    _, p0 = forward_kinematics(q_prev)
+    J = jacobian(q_prev)[:3]
+    x = np.linalg.solve(J @ J.T + 1e-4 * np.eye(3), (P - p0).T)
+    seeds = q_prev + np.degrees(J.T @ x).T
+    poses = np.tile(np.eye(4), (len(P), 1, 1))
+    poses[:, :3, 3] = P
+    Q, done = solve_batch(seeds, poses, orientation=False, max_iter=30)
+    for i in np.flatnonzero(~done):    # stragglers: warm start from the previous point
+        r = solve_position_bounded(Q[i - 1] if i else q_prev, P[i], max_iter=50)
+        if not r.ok:
+            raise ProgramError(lineno[i], f"IK {r.status}: {r.reason}")
+        Q[i] = r.angles
+    return Q
+
+
+def resolve_ik(steps, q_start, batch=64):
+    """Turn CART steps into MOVE steps, solving runs of up to `batch` points at once."""
+    q = np.asarray(q_start, dtype=float)
+    pending = []
+
+    def flush():
+        nonlocal q
+        Q = _solve_cart(q, [s.values for s in pending], [s.lineno for s in pending])
+        for s, qi in zip(pending, Q):
+            yield Step(MOVE, qi, s.ms, s.lineno)
+        q = Q[-1]
+        pending.clear()
+
+    for step in steps:
+        if step.kind == CART:
+            pending.append(step)
+            if len(pending) >= batch:
+                yield from flush()
+            continue
+        if pending:
+            yield from flush()
+        if step.kind == MOVE:
+            q = step.values
+        yield step
+    if pending:
+        yield from flush()
+
+
+# ---------------- frames ----------------
+def iter_frames(steps, q_start, blend_tol=2.0, lookahead=8):
+    """Yield (time_ms, frame bytes, angles) for MOVE/DWELL/GRIP steps; the motion
+    queue never holds more than `lookahead` targets. A blended move to the pose
+    the arm is already headed for (e.g. a first point equal to q_start) is skipped."""
+    q = np.clip(np.asarray(q_start, dtype=float), JOINT_MIN, JOINT_MAX)
+    mq = MotionQueue(q, blend_tol=blend_tol, lookahead=lookahead)
+    last = q                    # where the queued moves end
+
+    def pull(keep):
+        nonlocal q
+        while mq.frames or len(mq.targets) > keep:
+            item = mq.next_frame()
+            if item is None:
+                break
+            time_ms, q = item
+            yield time_ms, group_frame(q, time_ms), q
+
+    for step in steps:
+        if step.kind == MOVE and step.ms == 0:
+            target = np.clip(step.values, JOINT_MIN, JOINT_MAX)
+            if np.max(np.abs(target - last)) >= SAME_POSE_DEG:
+                mq.push(target)
+                last = target
+                yield from pull(mq.lookahead)
+            continue
+        yield from pull(0)
+        if step.kind == MOVE:
+            q = np.clip(step.values, JOINT_MIN, JOINT_MAX)
+            yield step.ms, group_frame(q, step.ms), q
+        elif step.kind == DWELL:
+            yield step.ms, b"", q
+        elif step.kind == GRIP:
+            q = q.copy()
+            q[GRIPPER_JOINT] = step.values[0]
+            yield step.ms, servo_frame(GRIPPER_JOINT + 1, angle_to_pulse(q[GRIPPER_JOINT], GRIPPER_JOINT), step.ms), q
+        mq.reset(q)
+        last = q
+    yield from pull(0)
+
+
+class FrameStreamer:
+    """Runs a frame generator on a producer thread into a bounded queue. put()
+    blocks while the queue is full (backpressure), so parsing / IK only run as
+    far ahead of the serial link as `maxsize` frames."""
+
+    _END = object()
+
+    def __init__(self, frames, maxsize=32):
+        self.frames = frames
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self.produced = 0
+        self.peak_depth = 0
+        self.blocked_s = 0.0          # producer time spent waiting on a full queue
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _produce(self):
+        try:
+            for item in self.frames:
+                t0 = time.perf_counter()
+                while not self._stop.is_set():
+                    try:
+                        self.queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if self._stop.is_set():
+                    return
+                self.blocked_s += time.perf_counter() - t0
+                self.produced += 1
+                self.peak_depth = max(self.peak_depth, self.queue.qsize())
+        except (ProgramError, OSError) as e:
+            self.error = e
+        except Exception as e:            # a bug in parsing / IK: stop the program, not "done"
+            traceback.print_exc()
+            self.error = e
+        finally:
+            if not self._stop.is_set():
+                self.queue.put(self._END)
+
+    def get(self, timeout=None):
+        """Next (time_ms, frame, angles); None at the end; raises queue.Empty on timeout."""
+        item = self.queue.get(timeout=timeout)
+        if item is self._END:
+            self.queue.put(self._END)     # stay at the end for later callers
+            return None
+        return item
+
+    def __iter__(self):
+        return iter(self.get, None)
+
+
+def open_program(path, q_start, blend_tol=2.0, ik_batch=64, maxsize=32):
+    """Start streaming a program file; returns a started FrameStreamer. A .trj
+    (trajectory_file.py) is already planned and is streamed from its memmap."""
+    if path.lower().endswith(".trj"):
+        return FrameStreamer(TrajectoryFile(path).frames(), maxsize).start()
+    fmt = "gcode" if path.lower().endswith((".gcode", ".nc", ".ngc")) else None
+
+    def frames():
+        with open(path, newline="") as f:
+            yield from iter_frames(resolve_ik(parse(f, fmt), q_start, ik_batch), q_start, blend_tol)
+
+    return FrameStreamer(frames(), maxsize).start()
+
+
+if __name__ == "__main__":
+    from program import run_frames
+    from calibration import ServoCalibration
+    from servo_frames import set_calibration, set_protocol
+    from protocols import open_port
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path")
+    ap.add_argument("--port", help="serial port; without it the program is only planned")
+    ap.add_argument("--queue", type=int, default=32, help="frames buffered ahead of the link")
+    ap.add_argument("--protocol", default="lsc", help="controller protocol (protocols.py)")
+    args = ap.parse_args()
+
+    load_model()
+    set_calibration(ServoCalibration.load())
+    protocol = set_protocol(args.protocol)
+    t0 = time.perf_counter()
+    streamer = open_program(args.path, HOME_ANGLES, maxsize=args.queue)
+    if args.port:
+        ser = open_port(protocol, args.port, 115200)
+        try:
+            cycle = run_frames(ser.write, streamer)
+        finally:
+            ser.close()
+        print(f"cycle time {cycle:.2f} s")
+    else:
+        first = None
+        nbytes = planned = 0
+        for time_ms, frame, _ in streamer:
+            first = first or time.perf_counter() - t0
+            nbytes += len(frame)
+            planned += time_ms
+        print(f"first frame after {first * 1000 if first else 0:.1f} ms, {streamer.produced} frames, "
+              f"{nbytes} bytes, {planned / 1000:.1f} s planned, planned in {time.perf_counter() - t0:.2f} s")
+    if streamer.error:
+        raise SystemExit(str(streamer.error))
@@ -0,0 +1,376 @@
+"""Servo controller protocols: frame encoders / decoders selectable per arm.
+
+    set_protocol("binary")                 # servo_frames: every later frame
+    ser = open_port(get_protocol("binary"), "COM4", 115200)
+
+    python protocols.py list
+    python protocols.py bench [-n 100000]
+
+Registered protocols (PROTOCOLS, name -> class, see register()):
+
+    lsc       LSC ASCII  "#1P1500#2P1611...T200\r\n"  (servo_frames.FrameEncoder)
+    binary    compact packet with checksum, 26 bytes for 6 servos (vs ~47):
+                  0x55 0x55 | len | 0x03 | n | T (u16 LE) | n x (id u8, pulse u16 LE) | sum
+              len counts the bytes after itself (5 + 3n), sum = ~(len + ... last
+              payload byte) & 0xFF
+    loopback  LSC ASCII bytes, but open_port() returns an in-memory LoopbackPort
+              that decodes and records every command instead of a serial port
+
+Every protocol has the same encoding API: frame(pulses, time_ms),
+servo(servo_id, pulse, time_ms), batch(pulses, times) -> (block, offsets),
+batch_frames(...) -> memoryviews, and decode(data) -> (commands, consumed), a
+command being (ids, pulses, time_ms).
+
+Read-back (serial_link.py): request(kind, ids) encodes a query, None if the
+protocol has none; parse_responses(data, expected) -> ([(kind, value)],
+consumed); decode_requests(data) / response(kind, value) are the controller
+side, used by the emulator.
+
+    kind        lsc (SSC-32 style)          binary
+    POSITIONS   "QP1 QP2\r" -> 1 byte each   0x15 n ids -> 0x15 n (id, pulse u16)...
+                (pulse / 10)
+    STATUS      "Q\r" -> "." idle, "+" busy  -
+    BATTERY     -                           0x0F -> 0x0F mV (u16)
+    ACK         -                           0x03 with no payload, after each move
+                                            (controllers built with acks only)
+"""
+import argparse
+import re
+import struct
+import time
+import numpy as np
+
+from servo_frames import PULSE_MIN, PULSE_MAX, FrameEncoder
+
+PROTOCOLS = {}
+MOVE, POSITIONS, STATUS, BATTERY, ACK = "move", "positions", "status", "battery", "ack"
+_STRUCTS = {}                  # binary packet layout per servo count
+
+
+def register(cls):
+    """Class decorator: make a protocol selectable by its `name`."""
+    PROTOCOLS[cls.name] = cls
+    return cls
+
+
+def get_protocol(name, **kwargs):
+    try:
+        return PROTOCOLS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"unknown protocol {name!r} (have: {', '.join(PROTOCOLS)})") from None
+
+
+@register
+class LscAscii(FrameEncoder):
+    name = "lsc"
+    text = True                     # frames are printable (logs show them as text)
+    loopback = False
+    acks = False                    # LSC boards never answer a move
+    _CMD = re.compile(rb"((?:#\d+P\d+)+)T(\d+)\r\n")
+    _PAIR = re.compile(rb"#(\d+)P(\d+)")
+    _QUERY = re.compile(rb"(Q(?:P\s*\d+(?:\s+QP\s*\d+)*)?)\r")
+    _REQUEST = re.compile(_CMD.pattern + rb"|" + _QUERY.pattern)
+
+    def decode(self, data):
+        """Complete frames in `data` -> ([(ids, pulses, time_ms), ...], bytes consumed).
+        Garbage between frames is skipped; a trailing partial frame is left."""
+        data = bytes(data)
+        commands, end = [], 0
+        for m in self._CMD.finditer(data):
+            pairs = self._PAIR.findall(m.group(1))
+            commands.append((tuple(int(i) for i, _ in pairs), tuple(int(p) for _, p in pairs),
+                             int(m.group(2))))
+            end = m.end()
+        tail = data.rfind(b"\r\n")
+        return commands, max(end, tail + 2 if tail >= 0 else 0)
+
+    # ---------------- read-back ----------------
+    def request(self, kind, ids=()):
+        if kind == POSITIONS:
+            return b" ".join(b"QP%d" % i for i in ids) + b"\r"
+        if kind == STATUS:
+            return b"Q\r"
+        return None
+
+    def parse_responses(self, data, expected):
+        """Replies are bare bytes, so they are read in the order of `expected`
+        [(kind, n_ids), ...]: n bytes for POSITIONS, 1 for STATUS."""
+        out, pos = [], 0
+        for kind, n in expected:
+            size = n if kind == POSITIONS else 1
+            if pos + size > len(data):
+                break
+            chunk = data[pos:pos + size]
+            out.append((kind, [b * 10 for b in chunk] if kind == POSITIONS else chunk == b"+"))
+            pos += size
+        return out, pos
+
+    def decode_requests(self, data):
+        """Controller side: moves and queries in `data` -> ([(kind, value)], consumed)."""
+        data = bytes(data)
+        items, end = [], 0
+        for m in self._REQUEST.finditer(data):
+            if m.group(1):
+                pairs = self._PAIR.findall(m.group(1))
+                items.append((MOVE, (tuple(int(i) for i, _ in pairs), tuple(int(p) for _, p in pairs),
+                                     int(m.group(2)))))
+            elif m.group(3) == b"Q":
+                items.append((STATUS, None))
+            else:
+                items.append((POSITIONS, tuple(int(i) for i in re.findall(rb"\d+", m.group(3)))))
+            end = m.end()
+        return items, end
+
+    def response(self, kind, value):
+        if kind == POSITIONS:
+            ids, pulses = value
+            return bytes(min(max(int(p) // 10, 0), 255) for p in pulses)
+        if kind == STATUS:
+            return b"+" if value else b"."
+        return b""
+
+
+@register
+class LscBinary:
+    name = "binary"
+    text = False
+    loopback = False
+    HEADER = b"\x55\x55"
+    CMD_MOVE = 0x03
+    CMD_BATTERY = 0x0F
+    CMD_POSITIONS = 0x15
+    _CMDS = (CMD_MOVE, CMD_BATTERY, CMD_POSITIONS)
+    _MAX_LEN = 2 + 1 + 3 * 32 + 2                # longest packet body we accept
+
+    def __init__(self, n_servos=6, first_id=1, acks=False):
+        self.n_servos = n_servos
+        self.first_id = first_id
+        self.acks = acks                         # controller replies to every move
+        self.size = 8 + 3 * n_servos
+
+    def _packets(self, ids, pulses, times):
+        """(N, n) pulses -> (N, 8 + 3n) uint8 packets."""
+        P = np.clip(np.asarray(pulses), PULSE_MIN, PULSE_MAX).astype(np.uint16).reshape(len(times), -1)
+        T = np.clip(np.rint(np.asarray(times, dtype=float)), 0, 0xFFFF).astype(np.uint16)
+        n = P.shape[1]
+        out = np.empty((len(P), 8 + 3 * n), np.uint8)
+        out[:, 0:2] = 0x55
+        out[:, 2] = 5 + 3 * n
+        out[:, 3] = self.CMD_MOVE
+        out[:, 4] = n
+        out[:, 5] = T & 0xFF
+        out[:, 6] = T >> 8
+        body = out[:, 7:7 + 3 * n].reshape(len(P), n, 3)
+        body[:, :, 0] = ids
+        body[:, :, 1] = P & 0xFF
+        body[:, :, 2] = P >> 8
+        out[:, -1] = ~(out[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF) & 0xFF
+        return out
+
+    def _ids(self, n):
+        return np.arange(n) + self.first_id
+
+    def _pack(self, ids, pulses, time_ms):
+        n = len(pulses)
+        body = [v for i, p in zip(ids, pulses) for v in (i, min(max(int(p), PULSE_MIN), PULSE_MAX))]
+        layout = _STRUCTS.get(n) or _STRUCTS.setdefault(n, struct.Struct("<BBBBBH" + "BH" * n + "B"))
+        pkt = layout.pack(0x55, 0x55, 5 + 3 * n, self.CMD_MOVE, n,
+                                   min(max(int(time_ms), 0), 0xFFFF), *body, 0)
+        return pkt[:-1] + bytes([~sum(pkt[2:-1]) & 0xFF])
+
+    def frame(self, pulses, time_ms):
+        return self._pack(range(self.first_id, self.first_id + len(pulses)), pulses, time_ms)
+
+    def servo(self, servo_id, pulse, time_ms):
+        return self._pack((servo_id,), (pulse,), time_ms)
+
+    def batch(self, pulses, times_ms):
+        packets = self._packets(self._ids(np.shape(pulses)[1]), pulses, np.atleast_1d(times_ms))
+        return packets.tobytes(), np.arange(len(packets) + 1) * packets.shape[1]
+
+    def batch_frames(self, pulses, times_ms):
+        block, offsets = self.batch(pulses, times_ms)
+        view = memoryview(block)
+        step = int(offsets[1]) if len(offsets) > 1 else 0
+        return [view[i:i + step] for i in range(0, len(block), step)] if step else []
+
+    # ---------------- packets ----------------
+    def packet(self, cmd, payload=b""):
+        body = bytes([len(payload) + 2, cmd]) + bytes(payload)
+        return self.HEADER + body + bytes([~sum(body) & 0xFF])
+
+    def packets(self, data):
+        """Checksummed packets in `data` -> ([(cmd, payload)], consumed). Bytes that
+        do not start a valid packet are skipped; a trailing partial one is left."""
+        data = bytes(data)
+        out, i = [], 0
+        while True:
+            i = data.find(self.HEADER, i)
+            if i < 0:                                    # keep a trailing 0x55 (header start)
+                return out, len(data) - (data[-1:] == self.HEADER[:1])
+            if i + 4 > len(data):
+                return out, i
+            length, cmd = data[i + 2], data[i + 3]
+            if not 2 <= length <= self._MAX_LEN or cmd not in self._CMDS:
+                i += 1                                   # resync
+                continue
+            end = i + 3 + length
+            if end > len(data):
+                return out, i
+            if (~sum(data[i + 2:end - 1]) & 0xFF) != data[end - 1]:
+                i += 1
+                continue
+            out.append((cmd, data[i + 4:end - 1]))
+            i = end
+
+    @staticmethod
+    def _move(payload):
+        n = payload[0]
+        ids = tuple(payload[3 + 3 * k] for k in range(n))
+        pulses = tuple(payload[4 + 3 * k] | payload[5 + 3 * k] << 8 for k in range(n))
+        return ids, pulses, payload[1] | payload[2] << 8
+
+    def decode(self, data):
+        """Move packets in `data` -> ([(ids, pulses, time_ms), ...], bytes consumed)."""
+        packets, used = self.packets(data)
+        return [self._move(p) for c, p in packets
+                if c == self.CMD_MOVE and p and len(p) == 3 + 3 * p[0]], used
+
+    # ---------------- read-back ----------------
+    def request(self, kind, ids=()):
+        if kind == POSITIONS:
+            return self.packet(self.CMD_POSITIONS, bytes([len(ids), *ids]))
+        if kind == BATTERY:
+            return self.packet(self.CMD_BATTERY)
+        return None
+
+    def parse_responses(self, data, expected=()):
+        """Replies are framed, so `expected` is not needed to split them."""
+        packets, used = self.packets(data)
+        out = []
+        for cmd, p in packets:
+            if cmd == self.CMD_MOVE and not p:
+                out.append((ACK, None))
+            elif cmd == self.CMD_BATTERY and len(p) == 2:
+                out.append((BATTERY, p[0] | p[1] << 8))
+            elif cmd == self.CMD_POSITIONS and p and len(p) == 1 + 3 * p[0]:
+                out.append((POSITIONS, [p[2 + 3 * k] | p[3 + 3 * k] << 8 for k in range(p[0])]))
+        return out, used
+
+    def decode_requests(self, data):
+        packets, used = self.packets(data)
+        items = []
+        for cmd, p in packets:
+            if cmd == self.CMD_MOVE and p and len(p) == 3 + 3 * p[0]:
+                items.append((MOVE, self._move(p)))
+            elif cmd == self.CMD_POSITIONS and p and len(p) == 1 + p[0]:
+                items.append((POSITIONS, tuple(p[1:])))
+            elif cmd == self.CMD_BATTERY and not p:
+                items.append((BATTERY, None))
+        return items, used
+
+    def response(self, kind, value):
+        if kind == ACK:
+            return self.packet(self.CMD_MOVE)
+        if kind == BATTERY:
+            return self.packet(self.CMD_BATTERY, int(value).to_bytes(2, "little"))
+        if kind == POSITIONS:
+            ids, pulses = value
+            return self.packet(self.CMD_POSITIONS, bytes([len(ids)]) + b"".join(
+                bytes([i]) + int(p).to_bytes(2, "little") for i, p in zip(ids, pulses)))
+        return b""
+
+
+@register
+class Loopback(LscAscii):
+    name = "loopback"
+    loopback = True
+
+
+class LoopbackPort:
+    """Stands in for serial.Serial: write() decodes with the protocol and records
+    (time, command); reads time out empty."""
+
+    def __init__(self, protocol, clock=time.perf_counter, timeout=0.05):
+        self.protocol = protocol
+        self.clock = clock
+        self.timeout = timeout
+        self.commands = []
+        self.bytes_written = 0
+        self.writes = 0
+        self._pending = b""
+        self.is_open = True
+
+    def write(self, data):
+        data = bytes(data)
+        self.writes += 1
+        self.bytes_written += len(data)
+        buf = self._pending + data
+        commands, used = self.protocol.decode(buf)
+        self._pending = buf[used:]
+        now = self.clock()
+        self.commands.extend((now, c) for c in commands)
+        return len(data)
+
+    def read(self, size=1):
+        time.sleep(self.timeout)                 # like a serial port that never answers
+        return b""
+
+    @property
+    def in_waiting(self):
+        return 0
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def open_port(protocol, port, baud=115200, timeout=0.05):
+    """serial.Serial for a real protocol, a LoopbackPort for the loopback one."""
+    if protocol.loopback:
+        return LoopbackPort(protocol)
+    import serial
+    return serial.Serial(port, baud, timeout=timeout)
+
+
+def describe(data, protocol):
+    """Short printable form of a frame for logs."""
+    data = bytes(data)
+    if protocol.text:
+        return data.decode("ascii", "replace").strip()
+    return data.hex(" ")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["list", "bench"])
+    ap.add_argument("-n", type=int, default=100000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    P = rng.integers(PULSE_MIN, PULSE_MAX + 1, size=(args.n, 6))
+    T = rng.integers(20, 300, size=args.n)
+    for name in PROTOCOLS:
+        proto = get_protocol(name)
+        one = proto.frame(P[0].tolist(), int(T[0]))
+        cmds, _ = proto.decode(one)
+        assert cmds == [(tuple(range(1, 7)), tuple(P[0].tolist()), int(T[0]))], name
+        if args.cmd == "list":
+            print(f"{name:9s} {len(one):3d} bytes/frame  {describe(one, proto)}")
+            continue
+        rows, times = P.tolist(), T.tolist()
+        t0 = time.perf_counter()
+        for p, t in zip(rows, times):
+            proto.frame(p, t)
+        single = args.n / (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        block, offsets = proto.batch(P, T)
+        batch = args.n / (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        cmds, _ = proto.decode(block)
+        dec = args.n / (time.perf_counter() - t0)
+        assert len(cmds) == args.n
+        print(f"{name:9s} {len(block) / args.n:5.1f} B/frame  frame {single / 1e6:5.2f} M/s  "
+              f"batch {batch / 1e6:5.2f} M/s  decode {dec / 1e6:5.2f} M/s")
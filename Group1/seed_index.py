@@ -0,0 +1,151 @@
+"""Nearest-neighbour IK seed index (voxel hash over precomputed FK samples).
+
+Build once offline, then memory-map at startup:
+
+    python seed_index.py build [--samples 200000] [--voxel 0.01]
+    python seed_index.py query X Y Z
+
+Files in cache/ik_seeds/: angles.npy (N,6 float32), positions.npy (N,3 float32)
+and keys.npy (N int64), all sorted by voxel key, plus meta.json. A query hashes
+the target into its voxel and scans the surrounding voxels only.
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+from kinematics import (
+    N_JOINTS, JOINT_MIN, JOINT_MAX, forward_kinematics_batch, load_model, model_signature
+)
+from ik_solver import solve_position_bounded
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "ik_seeds")
+
+
+class SeedIndex:
+    def __init__(self, angles, positions, keys, meta):
+        self.angles = angles
+        self.positions = positions
+        self.keys = keys
+        self.meta = meta
+        self.voxel = meta["voxel"]
+        self.origin = np.array(meta["origin"])
+        self.dims = np.array(meta["dims"])
+
+    # ---------------- build / persist ----------------
+    @classmethod
+    def build(cls, samples=200000, voxel=0.01, rng=None, chunk=50000):
+        rng = np.random.default_rng(rng)
+        angles = rng.uniform(JOINT_MIN, JOINT_MAX, size=(samples, N_JOINTS))
+        positions = np.concatenate([
+            forward_kinematics_batch(angles[i:i + chunk])[:, :3, 3]
+            for i in range(0, samples, chunk)
+        ])
+        origin = positions.min(axis=0) - voxel
+        dims = np.ceil((positions.max(axis=0) + voxel - origin) / voxel).astype(int) + 1
+        meta = {"voxel": voxel, "origin": origin.tolist(), "dims": dims.tolist(),
+                "samples": samples, "model": model_signature()}
+        index = cls(None, None, None, meta)
+        keys = index._keys(index._cells(positions))
+        order = np.argsort(keys, kind="stable")
+        index.angles = angles[order].astype(np.float32)
+        index.positions = positions[order].astype(np.float32)
+        index.keys = keys[order]
+        return index
+
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "angles.npy"), self.angles)
+        np.save(os.path.join(path, "positions.npy"), self.positions)
+        np.save(os.path.join(path, "keys.npy"), self.keys)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """Memory-map a saved index. Returns None if missing or built for another DH table."""
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except OSError:
+            return None
+        if meta.get("model") != model_signature():
+            print("seed index is stale (robot model changed), rebuild it")
+            return None
+        arrays = [np.load(os.path.join(path, n), mmap_mode="r")
+                  for n in ("angles.npy", "positions.npy", "keys.npy")]
+        return cls(*arrays, meta)
+
+    # ---------------- query ----------------
+    def _cells(self, positions):
+        return np.floor((np.asarray(positions) - self.origin) / self.voxel).astype(np.int64)
+
+    def _keys(self, cells):
+        cells = np.clip(cells, 0, self.dims - 1)
+        return (cells[..., 0] * self.dims[1] + cells[..., 1]) * self.dims[2] + cells[..., 2]
+
+    def candidates(self, target, ring=1):
+        """Indexes of all samples in the (2*ring+1)^3 voxels around target."""
+        c = self._cells(target)
+        r = np.arange(-ring, ring + 1)
+        offs = np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1).reshape(-1, 3)
+        cells = c + offs
+        inside = np.all((cells >= 0) & (cells < self.dims), axis=1)
+        keys = np.unique(self._keys(cells[inside]))
+        lo = np.searchsorted(self.keys, keys, "left")
+        hi = np.searchsorted(self.keys, keys, "right")
+        if not np.any(hi > lo):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(lo, hi) if b > a])
+
+    def nearest(self, target, max_ring=3):
+        """(angles, distance) of the stored sample closest to target, or (None, inf)."""
+        target = np.asarray(target, dtype=float)
+        for ring in range(1, max_ring + 1):
+            idx = self.candidates(target, ring)
+            if idx.size:
+                d = np.linalg.norm(self.positions[idx] - target, axis=1)
+                k = int(np.argmin(d))
+                # a closer sample can only sit outside the scanned cube if d > ring*voxel
+                if d[k] <= ring * self.voxel or ring == max_ring:
+                    return np.array(self.angles[idx[k]], dtype=float), float(d[k])
+        return None, float("inf")
+
+    def solve(self, target, q_current=None, **kwargs):
+        """Bounded position IK seeded from the nearest stored configuration
+        (falls back to q_current when nothing is stored near the target)."""
+        seed, _ = self.nearest(target)
+        if seed is None:
+            if q_current is None:
+                raise ValueError("no stored sample near target and no q_current")
+            seed = q_current
+        return solve_position_bounded(seed, target, **kwargs)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--samples", type=int, default=200000)
+    b.add_argument("--voxel", type=float, default=0.01)
+    b.add_argument("--path", default=DEFAULT_PATH)
+    q = sub.add_parser("query")
+    q.add_argument("xyz", type=float, nargs=3)
+    q.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args()
+    load_model()
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        SeedIndex.build(args.samples, args.voxel).save(args.path)
+        print(f"built {args.samples} samples in {time.perf_counter() - t0:.1f} s -> {args.path}")
+    else:
+        index = SeedIndex.load(args.path)
+        if index is None:
+            raise SystemExit("no seed index, run: python seed_index.py build")
+        t0 = time.perf_counter()
+        r = index.solve(args.xyz, max_iter=30)
+        dt = time.perf_counter() - t0
+        print(f"{r.status} in {r.iterations} it ({dt*1000:.2f} ms): "
+              f"angles={np.round(r.angles, 2).tolist()} residual={r.residual*1000:.3f} mm")
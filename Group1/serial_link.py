@@ -0,0 +1,303 @@
+"""Serial link with a receive path: replies matched to requests, RTT and loss stats.
+
+    link = ServoLink(open_port(protocol, "COM4"), protocol).start()
+    link.write(group_frame(q, 200))
+    link.positions([1, 2, 3], timeout=0.2)     # -> [1500, 1622, 980] or None
+    print(link.rtt, link.stats())
+
+    python serial_link.py [--protocol binary] [--acks] [--port COM4] [-n 500]
+                                    # without --port: against ControllerEmulator
+
+A reader thread pulls whatever the port has, lets the protocol split it into
+replies (protocols.py: parse_responses) and matches each reply to the oldest
+outstanding request of the same kind (controllers answer in order). The time from
+write to match goes into a LatencyHistogram; requests unanswered after `timeout`
+are counted lost. LSC replies are bare bytes that only make sense in request
+order, so after a loss the receive buffer is dropped to resynchronise.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import deque
+
+from latency import LatencyHistogram
+from protocols import (
+    MOVE, POSITIONS, STATUS, BATTERY, ACK, PROTOCOLS, LoopbackPort, get_protocol, open_port
+)
+
+
+class Reply:
+    """One outstanding request; wait() returns its value, None if it was lost."""
+
+    def __init__(self, kind, n, t_sent):
+        self.kind, self.n, self.t_sent = kind, n, t_sent
+        self.value = None
+        self.rtt = None
+        self._done = threading.Event()
+
+    def _resolve(self, value, rtt):
+        self.value, self.rtt = value, rtt
+        self._done.set()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.value
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+
+class ServoLink:
+    def __init__(self, port, protocol, timeout=0.5, acks=None, clock=time.perf_counter):
+        self.port = port
+        self.protocol = protocol
+        self.timeout = timeout
+        self.acks = protocol.acks if acks is None else acks
+        self.clock = clock
+        self.rtt = LatencyHistogram("RTT")
+        self.sent = self.answered = self.lost = self.unmatched = 0
+        self.bytes_out = self.bytes_in = 0
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._rx = b""
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the reader thread, then close the port."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(1.0)
+        self.port.close()
+
+    # ---------------- transmit ----------------
+    def _send(self, data, kind=None, n=0):
+        reply = None
+        with self._write_lock:
+            if kind is not None:
+                reply = Reply(kind, n, self.clock())
+                with self._lock:
+                    self._pending.append(reply)
+            self.port.write(data)
+        with self._lock:
+            self.sent += 1
+            self.bytes_out += len(data)
+        return reply
+
+    def write(self, frame):
+        """Send a motion frame; returns its ack Reply when acks are expected."""
+        return self._send(frame, ACK if self.acks else None)
+
+    def request(self, kind, ids=()):
+        """Send a query (POSITIONS / STATUS / BATTERY); Reply, or None if the
+        protocol cannot ask for it."""
+        data = self.protocol.request(kind, ids)
+        if data is None:
+            return None
+        return self._send(data, kind, len(ids))
+
+    def positions(self, ids, timeout=None):
+        """Pulses (us) of servos `ids` as the controller reports them, or None."""
+        r = self.request(POSITIONS, ids)
+        return r.wait(self.timeout if timeout is None else timeout) if r else None
+
+    def status(self, timeout=None):
+        """True while the controller is still moving, None if unknown."""
+        r = self.request(STATUS)
+        return r.wait(self.timeout if timeout is None else timeout) if r else None
+
+    def battery(self, timeout=None):
+        """Battery voltage (mV), or None."""
+        r = self.request(BATTERY)
+        return r.wait(self.timeout if timeout is None else timeout) if r else None
+
+    # ---------------- receive ----------------
+    def _read_loop(self):
+        while not self._stop.is_set():
+            try:
+                data = self.port.read(self.port.in_waiting or 1)
+            except (OSError, ValueError):            # port closed under us
+                break
+            self._expire()                           # before matching: no late pairing
+            if data:
+                self._receive(data)
+
+    def _receive(self, data):
+        with self._lock:
+            self.bytes_in += len(data)
+            self._rx += data
+            expected = [(r.kind, r.n) for r in self._pending if r.kind != ACK]
+            replies, used = self.protocol.parse_responses(self._rx, expected)
+            self._rx = self._rx[used:]
+            now = self.clock()
+            for kind, value in replies:
+                match = next((r for r in self._pending if r.kind == kind), None)
+                if match is None:
+                    self.unmatched += 1
+                    continue
+                self._pending.remove(match)
+                self.answered += 1
+                self.rtt.record(now - match.t_sent)
+                match._resolve(value, now - match.t_sent)
+
+    def _expire(self):
+        now = self.clock()
+        with self._lock:
+            while self._pending and now - self._pending[0].t_sent > self.timeout:
+                self._pending.popleft()._resolve(None, None)
+                self.lost += 1
+                if self.protocol.text:
+                    self._rx = b""
+
+    # ---------------- stats ----------------
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            asked = self.answered + self.lost
+            st = {"sent": self.sent, "answered": self.answered, "lost": self.lost,
+                  "loss_pct": 100.0 * self.lost / asked if asked else 0.0,
+                  "unmatched": self.unmatched, "in_flight": len(self._pending),
+                  "bytes_out": self.bytes_out, "bytes_in": self.bytes_in}
+        st["rtt_ms"] = self.rtt.summary()
+        return st
+
+
+class ControllerEmulator(LoopbackPort):
+    """A controller behind a simulated serial line, for the link without hardware.
+
+    Replies leave `latency` s after the request has crossed the wire (10 bits per
+    byte at `baud`); each reply is dropped with probability `drop`. Servo pulses
+    move linearly to their target over the frame's T, so position and status
+    queries answer the in-between state."""
+
+    def __init__(self, protocol, latency=0.002, baud=115200, drop=0.0, n_servos=6,
+                 battery_mv=7400, seed=None, clock=time.perf_counter):
+        super().__init__(protocol, clock)
+        self.latency, self.baud, self.drop = latency, baud, drop
+        self.battery_mv = battery_mv
+        self._rng = random.Random(seed)
+        now = clock()
+        # per servo id: (start pulse, target pulse, t_start, t_end)
+        self.servos = {i: (1500, 1500, now, now) for i in range(1, n_servos + 1)}
+        self._out = deque()                      # (t_due, bytes)
+        self._rx = b""
+        self._line_free = now                    # when the wire is idle again
+        self._cond = threading.Condition()
+
+    def _pulse(self, sid, now):
+        p0, p1, t0, t1 = self.servos[sid]
+        if now >= t1:
+            return p1
+        return round(p0 + (p1 - p0) * (now - t0) / (t1 - t0))
+
+    def _reply(self, data, t_arrive):
+        if not data or self._rng.random() < self.drop:
+            return
+        with self._cond:
+            self._out.append((t_arrive + self.latency, data))
+            self._cond.notify_all()
+
+    def write(self, data):
+        data = bytes(data)
+        now = self.clock()
+        self.writes += 1
+        self.bytes_written += len(data)
+        self._line_free = max(self._line_free, now) + len(data) * 10.0 / self.baud
+        items, used = self.protocol.decode_requests(self._rx + data)
+        self._rx = (self._rx + data)[used:]
+        t = self._line_free
+        for kind, value in items:
+            if kind == MOVE:
+                ids, pulses, ms = value
+                for sid, p in zip(ids, pulses):
+                    if sid in self.servos:
+                        self.servos[sid] = (self._pulse(sid, t), p, t, t + ms / 1000.0)
+                self.commands.append((t, value))
+                if self.protocol.acks:
+                    self._reply(self.protocol.response(ACK, None), t)
+            elif kind == POSITIONS:
+                pulses = [self._pulse(i, t) if i in self.servos else 0 for i in value]
+                self._reply(self.protocol.response(POSITIONS, (value, pulses)), t)
+            elif kind == STATUS:
+                self._reply(self.protocol.response(STATUS, any(s[3] > t for s in self.servos.values())), t)
+            elif kind == BATTERY:
+                self._reply(self.protocol.response(BATTERY, self.battery_mv), t)
+        return len(data)
+
+    def _ready(self):
+        now = self.clock()
+        return sum(len(d) for t, d in self._out if t <= now)
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            return self._ready()
+
+    def read(self, size=1):
+        """Like serial.Serial.read with a timeout: due reply bytes, b"" if none."""
+        end = self.clock() + self.timeout
+        with self._cond:
+            while True:
+                now = self.clock()
+                if self._out and self._out[0][0] <= now:
+                    break
+                wait = min(end, self._out[0][0] if self._out else end) - now
+                if wait <= 0:
+                    return b""
+                self._cond.wait(wait)
+            out = b""
+            while self._out and self._out[0][0] <= self.clock() and len(out) < size:
+                t, d = self._out.popleft()
+                take = size - len(out)
+                out += d[:take]
+                if len(d) > take:
+                    self._out.appendleft((t, d[take:]))
+            return out
+
+
+if __name__ == "__main__":
+    from servo_frames import set_protocol, group_frame
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--protocol", default="lsc", choices=list(PROTOCOLS))
+    ap.add_argument("--port", help="serial port; without it a ControllerEmulator answers")
+    ap.add_argument("--acks", action="store_true", help="controller acknowledges moves (binary)")
+    ap.add_argument("--drop", type=float, default=0.0, help="emulator: reply drop probability")
+    ap.add_argument("-n", type=int, default=500, help="query / frame pairs")
+    args = ap.parse_args()
+
+    protocol = get_protocol(args.protocol, acks=args.acks) if args.protocol == "binary" \
+        else get_protocol(args.protocol)
+    set_protocol(protocol)
+    port = (open_port(protocol, args.port) if args.port
+            else ControllerEmulator(protocol, drop=args.drop, seed=1))
+    link = ServoLink(port, protocol, timeout=0.2).start()
+    query = POSITIONS
+    t0 = time.perf_counter()
+    for i in range(args.n):
+        link.write(group_frame([90 + 30 * ((i // 50) % 2)] * 6, 20))
+        r = link.request(query, [1, 2, 3, 4, 5, 6])
+        if r is not None:
+            r.wait(0.2)
+        time.sleep(0.002)
+    for kind in (STATUS, BATTERY):
+        r = link.request(kind)
+        if r is not None:
+            print(f"{kind}: {r.wait(0.2)}")
+    time.sleep(0.3)
+    link.close()
+    st = link.stats()
+    print(f"{args.protocol}: {st['sent']} writes in {time.perf_counter() - t0:.2f} s, "
+          f"{st['answered']} answered, {st['lost']} lost ({st['loss_pct']:.1f} %), "
+          f"{st['unmatched']} unmatched, {st['bytes_out']} B out / {st['bytes_in']} B in")
+    print(link.rtt)
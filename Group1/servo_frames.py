@@ -0,0 +1,222 @@
+"""LSC servo controller frames: "#<id>P<pulse>T<time_ms>\r\n".
+
+A group frame moves several servos with one shared travel time:
+"#1P1500#2P1611...T200\r\n".
+
+Angles become pulses through the per-servo lookup tables of calibration.py once
+set_calibration() has been called, otherwise through the GUI formula
+500 + 2000*a/180.
+
+Frames are assembled from pre-encoded ASCII tokens (FrameEncoder): b"#<id>P<pulse>"
+for every servo id and pulse 500..2500 and b"T<ms>\r\n" for every travel time
+up to MAX_TIME_MS, so building a frame is a few table lookups and one join
+instead of formatting numbers each tick; batch() encodes a whole planned
+trajectory in a few array operations.
+Values outside the tables fall back to the f-string formatting, same bytes.
+
+set_protocol() swaps the encoder behind every frame function for another
+controller protocol (protocols.py: "lsc", "binary", "loopback"), so planners and
+the GUI never build bytes themselves.
+
+    python servo_frames.py bench        # frames/s: f-string vs tables vs batch
+"""
+import time
+from operator import getitem
+import numpy as np
+
+PULSE_MIN = 500
+PULSE_MAX = 2500
+MAX_TIME_MS = 9999
+
+_calibration = None          # calibration.ServoCalibration, None = linear formula
+_encoder = None              # active protocol encoder, LSC ASCII FrameEncoder by default
+_shifted = {}                # (encoder class, first_id) -> encoder, for other servo ids
+
+
+def set_calibration(cal):
+    """Use `cal` (calibration.ServoCalibration or None) for every later frame."""
+    global _calibration
+    _calibration = cal
+
+
+def calibration_signature():
+    """JSON-comparable description of the active angle -> pulse mapping."""
+    return _calibration.to_dict() if _calibration is not None else {"method": "formula"}
+
+
+def angle_to_pulse(angle_deg, servo=None):
+    """Angle (deg) -> pulse (us). servo: index from 0, needed for the calibrated
+    mapping; without calibration 0..180 deg -> 500..2500 us (GUI formula)."""
+    if _calibration is not None and servo is not None:
+        return _calibration.pulse(servo, angle_deg)
+    return int(500 + (2000 * angle_deg / 180))
+
+
+def angles_to_pulses(angles):
+    """Vectorized angle_to_pulse for (..., n_servos) angles (deg) -> int16 pulses."""
+    if _calibration is not None:
+        return _calibration.to_pulses(angles)
+    a = np.asarray(angles, dtype=float)
+    return (500 + (2000 * a / 180)).astype(np.int16)
+
+
+def pulses_to_angles(pulses):
+    """Inverse of angles_to_pulses (deg, float)."""
+    if _calibration is not None:
+        return _calibration.to_angles(pulses)
+    return (np.asarray(pulses, dtype=float) - 500.0) * 180.0 / 2000.0
+
+
+def _format_servo(servo_id, pulse, time_ms):
+    return f"#{servo_id}P{pulse}T{int(time_ms)}\r\n".encode("ascii")
+
+
+def _format_group(pulses, time_ms, first_id=1):
+    body = "".join(f"#{i + first_id}P{int(p)}" for i, p in enumerate(pulses))
+    return f"{body}T{int(time_ms)}\r\n".encode("ascii")
+
+
+class FrameEncoder:
+    """Group / single-servo frames from pre-encoded byte tokens.
+
+    The token tables are dicts keyed by int, so an out-of-range pulse or time (or
+    a negative one) is a KeyError and takes the f-string path instead of
+    indexing the wrong entry."""
+
+    def __init__(self, n_servos=6, first_id=1, max_time_ms=MAX_TIME_MS):
+        self.n_servos = n_servos
+        self.first_id = first_id
+        self._pulse = [{p: b"#%dP%d" % (i + first_id, p) for p in range(PULSE_MIN, PULSE_MAX + 1)}
+                       for i in range(n_servos)]
+        self._time = {t: b"T%d\r\n" % t for t in range(max_time_ms + 1)}
+        # batch tables: tokens as fixed-width uint8 rows + their lengths
+        width = max(len(b) for b in self._pulse[-1].values())
+        self._width = max(width, len(b"T65535\r\n"))
+        self._ptab = np.zeros((n_servos, PULSE_MAX - PULSE_MIN + 1, self._width), np.uint8)
+        self._plen = np.zeros((n_servos, PULSE_MAX - PULSE_MIN + 1), np.intp)
+        for i, tokens in enumerate(self._pulse):
+            for p, tok in tokens.items():
+                self._ptab[i, p - PULSE_MIN, :len(tok)] = np.frombuffer(tok, np.uint8)
+                self._plen[i, p - PULSE_MIN] = len(tok)
+        self._ttab = np.zeros((max_time_ms + 1, self._width), np.uint8)
+        self._tlen = np.zeros(max_time_ms + 1, np.intp)
+        for t, tok in self._time.items():
+            self._ttab[t, :len(tok)] = np.frombuffer(tok, np.uint8)
+            self._tlen[t] = len(tok)
+
+    def frame(self, pulses, time_ms):
+        """bytes of one group frame (pulses: ints, one per servo from first_id)."""
+        if len(pulses) > self.n_servos:
+            return _format_group(pulses, time_ms, self.first_id)
+        try:
+            return b"".join([*map(getitem, self._pulse, pulses), self._time[time_ms]])
+        except KeyError:
+            return _format_group(pulses, time_ms, self.first_id)
+
+    def servo(self, servo_id, pulse, time_ms):
+        """One-servo frame "#<id>P<pulse>T<ms>\r\n"."""
+        i = servo_id - self.first_id
+        if 0 <= i < self.n_servos:
+            try:
+                return self._pulse[i][pulse] + self._time[time_ms]
+            except KeyError:
+                pass
+        return _format_servo(servo_id, pulse, time_ms)
+
+    def batch(self, pulses, times_ms):
+        """Encode N group frames at once: (N, n_servos) pulses, (N,) times ->
+        (one bytes block, (N+1,) frame offsets). Pulses are clipped to
+        PULSE_MIN..PULSE_MAX, times to 0..65535 ms."""
+        P = np.clip(np.asarray(pulses), PULSE_MIN, PULSE_MAX).astype(np.intp) - PULSE_MIN
+        T = np.clip(np.rint(np.asarray(times_ms, dtype=float)), 0, 0xFFFF).astype(np.intp)
+        short = np.minimum(T, len(self._tlen) - 1)
+        tcells, tlen = self._ttab[short], self._tlen[short]
+        for t in np.unique(T[T != short]).tolist():      # beyond the table: dwells
+            tok = np.frombuffer(b"T%d\r\n" % t, np.uint8)
+            sel = T == t
+            tcells[sel, :len(tok)] = tok
+            tlen[sel] = len(tok)
+        servo = np.arange(P.shape[1])
+        cells = np.concatenate([self._ptab[servo, P], tcells[:, None]], axis=1)
+        lens = np.concatenate([self._plen[servo, P], tlen[:, None]], axis=1)
+        block = cells[np.arange(self._width) < lens[..., None]].tobytes()
+        offsets = np.zeros(len(P) + 1, np.intp)
+        np.cumsum(lens.sum(axis=1), out=offsets[1:])
+        return block, offsets
+
+    def batch_frames(self, pulses, times_ms):
+        """batch() as a list of memoryview slices of the one block, one per frame."""
+        block, offsets = self.batch(pulses, times_ms)
+        view = memoryview(block)
+        bounds = offsets.tolist()
+        return [view[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def default_encoder():
+    """The active protocol encoder (ids 1..6) used by the frame functions below."""
+    global _encoder
+    if _encoder is None:
+        _encoder = FrameEncoder()
+    return _encoder
+
+
+def set_protocol(protocol):
+    """Encode every later frame with `protocol` (a name registered in protocols.py
+    or an encoder object); returns the encoder."""
+    global _encoder
+    if isinstance(protocol, str):
+        from protocols import get_protocol
+        protocol = get_protocol(protocol)
+    _encoder = protocol
+    return protocol
+
+
+def servo_frame(servo_id, pulse, time_ms):
+    return default_encoder().servo(servo_id, pulse, time_ms)
+
+
+def group_frame(angles, time_ms, first_id=1):
+    """All joints in one line, servo ids first_id, first_id+1, ..."""
+    return pulse_group_frame(angles_to_pulses(angles).tolist(), time_ms, first_id)
+
+
+def pulse_group_frame(pulses, time_ms, first_id=1):
+    """group_frame() from already computed pulses."""
+    enc = default_encoder()
+    if first_id != enc.first_id:
+        key = (type(enc), first_id)
+        enc = _shifted.get(key) or _shifted.setdefault(key, type(enc)(first_id=first_id))
+    return enc.frame(pulses, time_ms)
+
+
+if __name__ == "__main__":
+    import argparse
+    import timeit
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["bench"])
+    ap.add_argument("-n", type=int, default=200000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    P = rng.integers(PULSE_MIN, PULSE_MAX + 1, size=(args.n, 6))
+    T = rng.integers(20, 300, size=args.n)
+    rows, times = P.tolist(), T.tolist()
+    enc = default_encoder()
+
+    def run(encode):
+        t0 = time.perf_counter()
+        for p, t in zip(rows, times):
+            encode(p, t)
+        return args.n / (time.perf_counter() - t0)
+
+    assert enc.frame(rows[0], times[0]) == _format_group(rows[0], times[0])
+    build = timeit.timeit(FrameEncoder, number=3) / 3
+    print(f"tables built in {build * 1000:.1f} ms")
+    print(f"f-string       {run(_format_group) / 1e6:6.2f} M frames/s")
+    print(f"table join     {run(enc.frame) / 1e6:6.2f} M frames/s")
+    t0 = time.perf_counter()
+    block, offsets = enc.batch(P, T)
+    print(f"batch          {args.n / (time.perf_counter() - t0) / 1e6:6.2f} M frames/s "
+          f"({len(block)} bytes)")
+    assert block[offsets[7]:offsets[8]] == _format_group(rows[7], times[7])
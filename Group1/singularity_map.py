@@ -0,0 +1,169 @@
+"""Manipulability / singularity map over a dense joint grid (offline, batched).
+
+The singular values of the base-frame Jacobian do not depend on J1 (rotation
+about the base axis) or J6 (last axis, the tool point lies on it), so the map is
+a 4-D grid over J2..J5. build() and load() check that on random configurations
+and refuse a model where it does not hold (e.g. a tool offset off the J6 axis):
+
+    python singularity_map.py build [--step 5]
+    python singularity_map.py query J1 J2 J3 J4 J5 J6
+
+Files in cache/singularity/ (memory-mapped on load, float32, shape (n,n,n,n)):
+- inv_cond.npy: sigma_min / sigma_max of the 3x6 position Jacobian (0 = singular)
+- manip.npy:    Yoshikawa manipulability of the 6x6 Jacobian, rotation rows
+                weighted by ik_solver.ROT_WEIGHT
+main.py takes the Cartesian jog IK damping from damping(); cartesian_path.plan_path
+slows constant-speed segments by speed_scale(). Neither takes SVDs online.
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+from kinematics import JOINT_MIN, JOINT_MAX, jacobian_batch, load_model, manipulability_batch, model_signature
+from ik_solver import ROT_WEIGHT
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "singularity")
+GRID_JOINTS = (1, 2, 3, 4)          # J2..J5
+
+# inverse condition number below which the arm counts as near-singular
+SINGULAR_THRESHOLD = 0.05
+
+
+def _grid_values(q):
+    """(inv_cond, manip) of (N,6) configurations, computed from the Jacobian."""
+    w = np.array([1.0, 1.0, 1.0, ROT_WEIGHT, ROT_WEIGHT, ROT_WEIGHT])
+    J = jacobian_batch(q)
+    s = np.linalg.svd(J[:, :3], compute_uv=False)
+    return s[:, -1] / np.maximum(s[:, 0], 1e-12), manipulability_batch(J * w[:, None])
+
+
+def check_free_joints(samples=64, rtol=1e-6, seed=0):
+    """None if inv_cond / manip do not depend on the joints left out of the grid
+    (J1, J6) under the active model, else a message saying which one matters."""
+    rng = np.random.default_rng(seed)
+    q = rng.uniform(JOINT_MIN, JOINT_MAX, (samples, 6))
+    c0, m0 = _grid_values(q)
+    for j in sorted(set(range(6)) - set(GRID_JOINTS)):
+        q2 = q.copy()
+        q2[:, j] = rng.uniform(JOINT_MIN, JOINT_MAX, samples)
+        c, m = _grid_values(q2)
+        if not (np.allclose(c, c0, rtol=rtol, atol=1e-9) and np.allclose(m, m0, rtol=rtol, atol=1e-12)):
+            return f"J{j + 1} changes the Jacobian conditioning; a J2..J5 grid does not fit this model"
+    return None
+
+
+class SingularityMap:
+    def __init__(self, inv_cond, manip, meta):
+        self.inv_cond = inv_cond
+        self.manip = manip
+        self.meta = meta
+        self.step = meta["step"]
+        self.n = meta["n"]
+
+    # ---------------- build / persist ----------------
+    @classmethod
+    def build(cls, step=5.0, chunk=100000):
+        problem = check_free_joints()
+        if problem:
+            raise ValueError(problem)
+        axis = np.arange(JOINT_MIN, JOINT_MAX + 1e-9, step)
+        n = axis.size
+        total = n ** len(GRID_JOINTS)
+        inv_cond = np.empty(total, dtype=np.float32)
+        manip = np.empty(total, dtype=np.float32)
+        for start in range(0, total, chunk):
+            flat = np.arange(start, min(start + chunk, total))
+            idx = np.stack(np.unravel_index(flat, (n,) * len(GRID_JOINTS)), axis=1)
+            q = np.full((flat.size, 6), 90.0)
+            q[:, GRID_JOINTS] = axis[idx]
+            inv_cond[flat], manip[flat] = _grid_values(q)
+        shape = (n,) * len(GRID_JOINTS)
+        meta = {"step": step, "n": n, "joints": list(GRID_JOINTS), "model": model_signature(),
+                "rot_weight": ROT_WEIGHT}
+        return cls(inv_cond.reshape(shape), manip.reshape(shape), meta)
+
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "inv_cond.npy"), self.inv_cond)
+        np.save(os.path.join(path, "manip.npy"), self.manip)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """Memory-map a saved map. Returns None if missing, built for another model,
+        or if the active model breaks the J1/J6 assumption."""
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except OSError:
+            return None
+        if meta.get("model") != model_signature():
+            print("singularity map is stale (robot model changed), rebuild it")
+            return None
+        problem = check_free_joints()
+        if problem:
+            print("singularity map not used:", problem)
+            return None
+        inv_cond = np.load(os.path.join(path, "inv_cond.npy"), mmap_mode="r")
+        manip = np.load(os.path.join(path, "manip.npy"), mmap_mode="r")
+        return cls(inv_cond, manip, meta)
+
+    # ---------------- lookup (nearest grid point) ----------------
+    def _index(self, angles):
+        a = np.asarray(angles, dtype=float)[..., GRID_JOINTS]
+        i = np.rint((np.clip(a, JOINT_MIN, JOINT_MAX) - JOINT_MIN) / self.step).astype(np.intp)
+        return tuple(np.moveaxis(np.minimum(i, self.n - 1), -1, 0))
+
+    def lookup(self, angles):
+        """(inv_cond, manip) at the grid point nearest to one 6-joint configuration."""
+        i = self._index(angles)
+        return float(self.inv_cond[i]), float(self.manip[i])
+
+    def lookup_many(self, angles):
+        """Vectorized lookup for (N,6) configurations -> two (N,) arrays."""
+        i = self._index(angles)
+        return np.asarray(self.inv_cond[i]), np.asarray(self.manip[i])
+
+    def damping(self, angles, lam_min=0.003, lam_max=0.05, threshold=SINGULAR_THRESHOLD):
+        """DLS damping: lam_min away from singularities, rising quadratically to
+        lam_max as inv_cond drops to 0 inside the threshold band."""
+        c = self.inv_cond[self._index(angles)]
+        u = np.clip(1.0 - c / threshold, 0.0, 1.0)
+        return lam_min + (lam_max - lam_min) * u * u
+
+    def speed_scale(self, angles, floor=0.2, threshold=SINGULAR_THRESHOLD):
+        """Velocity scale factor in [floor, 1] (works on one or (N,6) configurations)."""
+        c = self.inv_cond[self._index(angles)]
+        return np.clip(c / threshold, floor, 1.0)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--step", type=float, default=5.0, help="grid step (deg)")
+    b.add_argument("--path", default=DEFAULT_PATH)
+    q = sub.add_parser("query")
+    q.add_argument("angles", type=float, nargs=6)
+    q.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args()
+    load_model()
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        try:
+            m = SingularityMap.build(args.step)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        m.save(args.path)
+        print(f"{m.inv_cond.size} grid points in {time.perf_counter() - t0:.1f} s -> {args.path}")
+    else:
+        m = SingularityMap.load(args.path)
+        if m is None:
+            raise SystemExit("no singularity map, run: python singularity_map.py build")
+        c, w = m.lookup(args.angles)
+        print(f"inv_cond={c:.4f} manip={w:.3e} damping={float(m.damping(args.angles)):.4f} "
+              f"speed_scale={float(m.speed_scale(args.angles)):.2f}")
@@ -0,0 +1,200 @@
+"""Versioned joint state shared by the GUI, planners and background threads.
+
+    store = StateStore([90.0] * 6)
+    snap = store.get()                        # Snapshot(version, t, angles, source), no lock
+    store.publish(q, "jog")                   # new version, readers see all of it or none
+    store.publish(q, "ik", expect=snap.version)   # None if someone published meanwhile
+
+    watch = store.watch()                     # display: poll from a timer
+    snap = watch.changed()                    # newest snapshot or None; versions in
+                                              # between are skipped (watch.skipped)
+    store.wait(after=snap.version, timeout)   # threads: block for the next version
+    Follower(store, record).start()           # call record(snap) on a thread per change
+
+    python state_store.py bench               # get / publish / wait costs
+
+A Snapshot is immutable: its angles are a fresh read-only NumPy array, never
+changed after publish (copy on write). publish() builds the next snapshot and
+swaps one reference, so readers just load that reference - no lock, no torn
+read - and keep a consistent pose for as long as they hold it. Writers serialize
+on a lock; version only ever increases.
+"""
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+Snapshot = namedtuple("Snapshot", "version t angles source")
+
+
+class StateStore:
+    def __init__(self, angles, clock=time.perf_counter):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._snap = Snapshot(0, clock(), self._freeze(angles), "init")
+
+    @staticmethod
+    def _freeze(angles):
+        a = np.array(angles, dtype=float)     # always a copy
+        a.setflags(write=False)
+        return a
+
+    # ---------------- readers (lock-free) ----------------
+    def get(self):
+        return self._snap
+
+    @property
+    def version(self):
+        return self._snap.version
+
+    @property
+    def angles(self):
+        """Read-only angles (deg) of the current snapshot."""
+        return self._snap.angles
+
+    # ---------------- writers ----------------
+    def publish(self, angles, source="", expect=None):
+        """Make `angles` the current state. expect: the version the caller based
+        its change on; if another publish happened since, nothing is published
+        and None is returned (re-read and retry)."""
+        frozen = self._freeze(angles)
+        with self._lock:
+            if expect is not None and expect != self._snap.version:
+                return None
+            snap = Snapshot(self._snap.version + 1, self.clock(), frozen, source)
+            self._snap = snap
+            self._changed.notify_all()
+        return snap
+
+    def update(self, index, value, source=""):
+        """Copy-on-write change of one joint."""
+        with self._lock:
+            a = self._snap.angles.copy()
+            a[index] = value
+            a.setflags(write=False)
+            snap = Snapshot(self._snap.version + 1, self.clock(), a, source)
+            self._snap = snap
+            self._changed.notify_all()
+        return snap
+
+    # ---------------- consumers ----------------
+    def wait(self, after, timeout=None):
+        """Newest snapshot with version > after, or None on timeout."""
+        snap = self._snap
+        if snap.version > after:
+            return snap
+        with self._changed:
+            self._changed.wait_for(lambda: self._snap.version > after, timeout)
+            snap = self._snap
+        return snap if snap.version > after else None
+
+    def watch(self):
+        return Watch(self)
+
+
+class Watch:
+    """One consumer's cursor: the last version it handled."""
+
+    def __init__(self, store):
+        self.store = store
+        self.seen = -1
+        self.handled = 0
+        self.skipped = 0                      # versions never looked at
+
+    def _take(self, snap):
+        if snap is None or snap.version <= self.seen:
+            return None
+        if self.seen >= 0:
+            self.skipped += snap.version - self.seen - 1
+        self.seen = snap.version
+        self.handled += 1
+        return snap
+
+    def changed(self):
+        """Newest snapshot if it is newer than the last one handled, else None."""
+        return self._take(self.store.get())
+
+    def wait(self, timeout=None):
+        return self._take(self.store.wait(self.seen, timeout))
+
+
+class Follower:
+    """Thread calling fn(snapshot) for the newest version after each change; a
+    slow fn skips versions instead of falling behind."""
+
+    def __init__(self, store, fn, name="follower"):
+        self.fn = fn
+        self.watch = store.watch()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            snap = self.watch.wait(0.1)
+            if snap is not None:
+                try:
+                    self.fn(snap)
+                except Exception as e:        # keep following
+                    print(f"{self._thread.name}: {e}")
+
+    def stop(self):
+        """Handle the last version, then end the thread."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(1.0)
+        snap = self.watch.changed()
+        if snap is not None:
+            self.fn(snap)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["bench"])
+    ap.add_argument("-n", type=int, default=200000)
+    args = ap.parse_args()
+
+    store = StateStore([90.0] * 6)
+    q = [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]
+    t0 = time.perf_counter()
+    for _ in range(args.n):
+        store.get().angles
+    t_get = (time.perf_counter() - t0) / args.n
+    t0 = time.perf_counter()
+    for _ in range(args.n):
+        store.publish(q, "bench")
+    t_pub = (time.perf_counter() - t0) / args.n
+
+    # a slow consumer (1 ms per snapshot) behind a 5 kHz writer
+    handled = []
+    f = Follower(store, lambda s: (handled.append(s.version), time.sleep(0.001))).start()
+    for i in range(5000):
+        store.publish(q, "bench")
+        time.sleep(0.0002)
+    f.stop()
+    caught_up = handled[-1] == store.version
+    store.publish([0.0] * 6)
+    torn = 0
+    stop = threading.Event()
+
+    def reader():
+        global torn
+        while not stop.is_set():
+            a = store.get().angles
+            torn += not (a == a[0]).all()
+
+    r = threading.Thread(target=reader)
+    r.start()
+    for i in range(20000):
+        store.publish([float(i)] * 6)
+    stop.set()
+    r.join()
+    print(f"get {t_get * 1e9:.0f} ns, publish {t_pub * 1e6:.2f} us; slow follower handled "
+          f"{f.watch.handled} of 5000 versions ({f.watch.skipped} skipped), "
+          f"ended on the latest: {caught_up}; torn reads: {torn}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the Group1 modules import each other by plain name (run from Group1/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
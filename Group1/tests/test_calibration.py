@@ -0,0 +1,21 @@
+import json
+
+from calibration import ServoCalibration
+
+
+def test_missing_file_gives_none(tmp_path):
+    assert ServoCalibration.load(str(tmp_path / "none.json")) is None
+
+
+def test_corrupt_file_falls_back_to_the_formula(tmp_path):
+    path = tmp_path / "servo_calibration.json"
+    path.write_text('{"method": "linear", "servos": [{"angles": [0, 1')
+    assert ServoCalibration.load(str(path)) is None
+    path.write_text(json.dumps({"method": "linear", "servos": [{"angle": [0, 180]}]}))
+    assert ServoCalibration.load(str(path)) is None
+
+
+def test_saved_file_round_trips(tmp_path):
+    path = str(tmp_path / "servo_calibration.json")
+    ServoCalibration.linear().save(path)
+    assert ServoCalibration.load(path).pulse(0, 90.0) == 1500
@@ -0,0 +1,15 @@
+from cartesian_path import line_to
+
+Q = [90.0, 60.0, 120.0, 90.0, 60.0, 90.0]
+
+
+def test_line_within_tol_is_ok():
+    plan = line_to(Q, [0.05, 0.0, 0.03], speed=0.05, orientation=False, max_step=0.05)
+    assert plan.ok, plan.reason
+
+
+def test_line_still_off_after_max_depth_is_rejected():
+    plan = line_to(Q, [0.05, 0.0, 0.03], speed=0.05, orientation=False, max_step=0.05,
+                   max_depth=1)
+    assert not plan.ok
+    assert plan.reason.startswith("deviation")
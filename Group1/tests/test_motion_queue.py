@@ -0,0 +1,19 @@
+import numpy as np
+
+from motion_queue import MotionQueue
+
+
+def test_target_at_current_pose_queues_nothing():
+    mq = MotionQueue([90.0] * 6)
+    mq.push([90.0] * 6)
+    assert mq.next_frame() is None
+    assert mq.idle
+
+
+def test_repeated_targets_are_dropped():
+    mq = MotionQueue([90.0] * 6)
+    mq.extend([[90.0] * 6, [100.0] * 6, [100.0] * 6, [90.0] * 6])
+    angles, ms = mq.plan_all()
+    assert len(angles) > 0
+    assert np.all(ms > 0)
+    np.testing.assert_allclose(angles[-1], [90.0] * 6)
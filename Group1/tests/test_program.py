@@ -0,0 +1,24 @@
+import numpy as np
+
+from program import Program, compile_program
+
+START = [90.0] * 6
+
+
+def test_single_point_at_start_compiles_to_nothing():
+    prog = Program()
+    prog.add_move(START)
+    compiled = compile_program(prog, START)
+    assert len(compiled) == 0
+
+
+def test_point_recorded_twice_plays_like_once():
+    target = [100.0, 80.0, 95.0, 90.0, 70.0, 90.0]
+    once, twice = Program(), Program()
+    once.add_move(target)
+    for _ in range(2):
+        twice.add_move(target)
+    a, b = compile_program(once, START), compile_program(twice, START)
+    assert len(a) > 0
+    assert [f for _, f, _ in a.frames] == [f for _, f, _ in b.frames]
+    np.testing.assert_allclose(b.frames[-1][2], target, atol=1e-4)
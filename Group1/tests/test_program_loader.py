@@ -0,0 +1,18 @@
+import numpy as np
+
+from program_loader import open_program
+
+START = [90.0] * 6
+
+
+def test_csv_starting_at_the_start_pose_plays(tmp_path):
+    path = tmp_path / "prog.csv"
+    path.write_text("j1,j2,j3,j4,j5,j6\n"
+                    "90,90,90,90,90,90\n"
+                    "90,90,90,90,90,90\n"
+                    "100,80,95,90,70,90\n")
+    streamer = open_program(str(path), START)
+    frames = list(streamer)
+    assert streamer.error is None
+    assert frames
+    np.testing.assert_allclose(frames[-1][2], [100, 80, 95, 90, 70, 90], atol=1e-4)
@@ -0,0 +1,46 @@
+import warnings
+
+import numpy as np
+
+from motion_queue import MotionQueue, blend_path
+from trajectory import MAX_FRAME_MS, MIN_FRAME_MS, SERVO_AMAX, time_parameterize
+
+
+def random_programs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        q = [rng.uniform(20.0, 160.0, 6)]
+        for _ in range(rng.integers(1, 8)):
+            q.append(np.clip(q[-1] + rng.normal(0.0, 20.0, 6), 0.0, 180.0))
+        yield q
+
+
+def test_rounding_noise_segment_gets_a_sane_frame():
+    q = np.array([[90.0] * 6, [100.0] * 6, [100.0 + 1e-14] * 6, [110.0] * 6])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        ms = time_parameterize(q)
+    assert np.all(ms[1:] >= MIN_FRAME_MS)
+    assert np.all(ms <= MAX_FRAME_MS)
+
+
+def test_blended_programs_have_sane_frame_times():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for q in random_programs(300):
+            mq = MotionQueue(q[0])
+            mq.extend(q[1:])
+            angles, ms = mq.plan_all()
+            assert np.all((ms >= MIN_FRAME_MS) & (ms <= MAX_FRAME_MS))
+            np.testing.assert_array_equal(angles[-1], np.clip(q[-1], 0.0, 180.0))
+
+
+def test_rounded_frames_respect_amax():
+    for q in random_programs(300, seed=1):
+        path, _ = blend_path(np.array(q))
+        dt = time_parameterize(path)[1:] / 1000.0
+        v = np.diff(path, axis=0) / dt[:, None]
+        # between frames, and from rest / to rest at the ends
+        dv = np.abs(np.diff(np.vstack([np.zeros(6), v, np.zeros(6)]), axis=0))
+        t = 0.5 * (np.concatenate([[0.0], dt]) + np.concatenate([dt, [0.0]]))
+        assert np.all(dv / t[:, None] <= SERVO_AMAX * (1.0 + 1e-6))
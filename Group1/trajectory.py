@@ -0,0 +1,225 @@
+"""Joint-space point-to-point trajectories (trapezoidal or quintic), synchronized.
+
+All joints follow one normalized profile s(t) in [0,1]:
+
+    q(t) = q0 + (q1 - q0) * s(t)
+
+whose velocity / acceleration limits are the tightest of vmax_i/|d_i| and
+amax_i/|d_i|, so every joint arrives at the same time, moves along a straight
+line in joint space and never exceeds its own limit.
+
+    traj = plan_joint_move(q0, q1, profile="trapezoid", dt=0.02)
+    traj.t, traj.q, traj.qd      # (N,), (N,6), (N,6) setpoint arrays
+
+time_parameterize() times a whole waypoint path instead (TOPP-style forward /
+backward pass over the streamed frames): every frame gets the shortest time the
+servo limits allow.
+"""
+from dataclasses import dataclass
+import math
+import numpy as np
+
+# Pulse steps per 10 deg of joint motion, measured in Group3/test1/codedieukhien.py
+PULSE_STEP_PER_10DEG = [72.222, 50.0, 116.7, 105.55, 111.11, 105.55]
+# pulse-width slew (us/s) a loaded servo follows; joint speed = rate / (us per joint deg)
+SERVO_PULSE_RATE = 1000.0
+
+
+def velocity_limits(step_per_10deg=PULSE_STEP_PER_10DEG, pulse_rate=SERVO_PULSE_RATE):
+    """Per-joint velocity limits (deg/s) from the pulse-per-degree table."""
+    return pulse_rate / (np.asarray(step_per_10deg, dtype=float) / 10.0)
+
+
+# per-servo limits (deg/s, deg/s^2)
+SERVO_VMAX = velocity_limits()
+SERVO_AMAX = 4.0 * SERVO_VMAX          # full speed in 0.25 s
+MIN_FRAME_MS = 20                      # one servo frame period (50 Hz)
+MAX_FRAME_MS = 10000                   # longest T a planned frame gets
+EPS_DEG = 1e-9                         # joint steps below this count as no motion
+
+PROFILES = ("trapezoid", "quintic")
+
+# quintic 10t^3 - 15t^4 + 6t^5: peak ds/dtau and d2s/dtau2
+_QUINTIC_V = 1.875
+_QUINTIC_A = 10.0 / math.sqrt(3.0)
+
+
+@dataclass
+class JointTrajectory:
+    t: np.ndarray          # (N,) s
+    q: np.ndarray          # (N,6) deg
+    qd: np.ndarray         # (N,6) deg/s
+    duration: float        # s
+    profile: str
+
+    def durations_ms(self):
+        """Travel time of every setpoint from the previous one (first = 0)."""
+        return np.rint(np.diff(self.t, prepend=self.t[0]) * 1000.0)
+
+
+def normalized_limits(q0, q1, vmax=SERVO_VMAX, amax=SERVO_AMAX):
+    """Velocity / acceleration limits of s(t) from the per-joint limits."""
+    d = np.abs(np.asarray(q1, dtype=float) - np.asarray(q0, dtype=float))
+    moving = d > 1e-9
+    if not moving.any():
+        return math.inf, math.inf
+    vs = float(np.min(np.asarray(vmax, dtype=float)[moving] / d[moving]))
+    a_s = float(np.min(np.asarray(amax, dtype=float)[moving] / d[moving]))
+    return vs, a_s
+
+
+def profile_duration(vs, a_s, profile="trapezoid"):
+    """Minimum time for s: 0 -> 1 under the normalized limits."""
+    if math.isinf(vs):
+        return 0.0
+    if profile == "trapezoid":
+        if vs * vs / a_s >= 1.0:                 # never reaches cruise: triangle
+            return 2.0 * math.sqrt(1.0 / a_s)
+        return 1.0 / vs + vs / a_s
+    if profile == "quintic":
+        return max(_QUINTIC_V / vs, math.sqrt(_QUINTIC_A / a_s))
+    raise ValueError(f"unknown profile: {profile}")
+
+
+def sample_profile(t, duration, vs, a_s, profile="trapezoid"):
+    """Vectorized s(t), ds/dt for t in [0, duration]."""
+    t = np.clip(np.asarray(t, dtype=float), 0.0, duration)
+    if duration <= 0.0:
+        return np.ones_like(t), np.zeros_like(t)
+    if profile == "quintic":
+        tau = t / duration
+        s = tau**3 * (10 - 15*tau + 6*tau**2)
+        sd = 30 * tau**2 * (1 - tau)**2 / duration
+        return s, sd
+    # trapezoid, re-fitted to `duration` (cruise speed v, accel time ta)
+    disc = (a_s * duration) ** 2 - 4.0 * a_s
+    v = 0.5 * (a_s * duration - math.sqrt(max(disc, 0.0)))
+    ta = v / a_s
+    s = np.where(t < ta, 0.5 * a_s * t * t,
+        np.where(t <= duration - ta, 0.5 * a_s * ta * ta + v * (t - ta),
+                 1.0 - 0.5 * a_s * (duration - t) ** 2))
+    sd = np.where(t < ta, a_s * t, np.where(t <= duration - ta, v, a_s * (duration - t)))
+    return s, sd
+
+
+def move_duration(q0, q1, profile="trapezoid", vmax=SERVO_VMAX, amax=SERVO_AMAX):
+    """Shortest synchronized travel time (s) from q0 to q1."""
+    vs, a_s = normalized_limits(q0, q1, vmax, amax)
+    return profile_duration(vs, a_s, profile)
+
+
+def plan_joint_move(q0, q1, profile="trapezoid", dt=0.02, vmax=SERVO_VMAX, amax=SERVO_AMAX,
+                    duration=None):
+    """Sample a synchronized move at period dt (the last sample lands on q1).
+    duration: stretch the move to this time (s) if longer than the minimum."""
+    q0 = np.asarray(q0, dtype=float)
+    q1 = np.asarray(q1, dtype=float)
+    vs, a_s = normalized_limits(q0, q1, vmax, amax)
+    T = profile_duration(vs, a_s, profile)
+    if duration is not None and duration > T:
+        T = float(duration)          # sample_profile re-fits the cruise speed
+    n = max(1, int(math.ceil(T / dt)))
+    t = np.linspace(0.0, T, n + 1)
+    s, sd = sample_profile(t, T, vs, a_s, profile)
+    d = q1 - q0
+    q = q0 + s[:, None] * d
+    qd = sd[:, None] * d
+    return JointTrajectory(t, q, qd, T, profile)
+
+
+# ---------------- time-optimal parameterization of a waypoint path ----------------
+def _max_speed(p, q, r, s, cap):
+    """Largest x <= cap with x*p_i - q_i <= r_i + s_i/x (in the direction of p_i)
+    for every joint i.
+
+    This is the velocity-change constraint between two constant-speed frames:
+    x is the speed of the unknown frame (step p), q the joint velocity of the
+    known one, r + s/x the allowed change amax*(dt_known + dt_unknown)/2. Only
+    speeding up past the known frame is limited here; the opposite direction is
+    the other pass's job.
+    """
+    x = cap
+    for pi, qi, ri, si in zip(p, q, r, s):
+        if pi < 0.0:
+            pi, qi = -pi, -qi
+        if pi > 0.0:                 # x^2 p - x (q + r) - s <= 0
+            b = qi + ri
+            root = math.sqrt(b * b + 4.0 * pi * si)
+            # positive root; for b < 0 the form without cancellation
+            x = min(x, (b + root) / (2.0 * pi) if b >= 0.0 else 2.0 * si / (root - b))
+    return x
+
+
+def _enforce_accel(d, ms, amax, from_rest, slack=1e-9, max_rounds=2000):
+    """Lengthen frames (whole ms) until every velocity change between the
+    emitted frames, and the final stop (and the start, from rest), stays within
+    amax * (dt_k + dt_k+1)/2. Of a violating pair the frame that is faster on
+    the offending joint is slowed. ms is changed in place."""
+    for _ in range(max_rounds):
+        dt = ms / 1000.0
+        v = d / dt[:, None]
+        excess = np.abs(np.diff(v, axis=0)) - amax * (0.5 * (dt[:-1] + dt[1:]))[:, None]
+        pair = np.flatnonzero(np.max(excess / amax, axis=1) > slack)
+        j = np.argmax(excess[pair], axis=1)
+        slow = np.where(np.abs(v[pair, j]) >= np.abs(v[pair + 1, j]), pair, pair + 1)
+        ends = [len(ms) - 1] + ([0] if from_rest else [])
+        slow = set(slow.tolist())
+        slow.update(k for k in ends if np.any(np.abs(v[k]) > amax * dt[k] / 2.0 * (1.0 + slack)))
+        slow = [k for k in slow if ms[k] < MAX_FRAME_MS]
+        if not slow:
+            break
+        ms[slow] = np.minimum(ms[slow] + np.maximum(1.0, np.ceil(0.02 * ms[slow])), MAX_FRAME_MS)
+    return ms
+
+
+def time_parameterize(path_q, vmax=SERVO_VMAX, amax=SERVO_AMAX, min_frame_ms=MIN_FRAME_MS,
+                      v_start=0.0):
+    """Minimum-time segment durations (ms) for the piecewise-linear joint path
+    `path_q` (N,6), starting at rest (or at peak joint speed `v_start` deg/s along
+    the first segment) and ending at rest.
+
+    The servos run every frame at constant speed, so segment k moves at joint
+    velocity sig_k * d_k (sig_k = 1/dt_k). Each frame is capped by vmax and by
+    min_frame_ms; between two frames the joint velocity may change by at most
+    amax * (dt_k + dt_k+1)/2, which also covers the direction change at a corner.
+    A forward pass (acceleration) then a backward pass (deceleration) give every
+    frame the highest speed those constraints allow. The frame times are then
+    rounded up to whole ms and the velocity changes re-checked on those: frames
+    the rounding (or the backward pass) left over amax are slowed until none is.
+    Returns (N,) with 0 for the first.
+    """
+    q = np.asarray(path_q, dtype=float)
+    d = np.diff(q, axis=0)                                          # (N-1,6)
+    if len(d) == 0:
+        return np.zeros(len(q))
+    vmax = np.broadcast_to(np.asarray(vmax, dtype=float), d.shape[1:])
+    amax = np.broadcast_to(np.asarray(amax, dtype=float), d.shape[1:])
+    moving = np.abs(d) > EPS_DEG                                   # rounding noise: no motion
+    d = np.where(moving, d, 0.0)
+    absd = np.abs(d)
+    with np.errstate(divide="ignore"):
+        cap = np.min(np.where(moving, vmax / absd, np.inf), axis=1)
+        rest = np.min(np.where(moving, np.sqrt(amax / (2.0 * absd)), np.inf), axis=1)
+    cap = np.minimum(cap, 1000.0 / min_frame_ms)
+    sig = cap.copy()
+    half_a = (0.5 * amax).tolist()
+    rows = d.tolist()
+    m = len(sig)
+    # forward: from rest (or v_start) speed up as fast as the next frame allows
+    peak0 = float(absd[0].max())
+    sig[0] = min(sig[0], max(rest[0], v_start / peak0) if peak0 > 0.0 else sig[0])
+    for k in range(m - 1):
+        sk = sig[k]
+        qv = [sk * v for v in rows[k]]
+        r = [h / sk for h in half_a]
+        sig[k + 1] = _max_speed(rows[k + 1], qv, r, half_a, sig[k + 1])
+    # backward: slow down early enough for every later frame and the final stop
+    sig[-1] = min(sig[-1], rest[-1])
+    for k in range(m - 2, -1, -1):
+        sk = sig[k + 1]
+        qv = [sk * v for v in rows[k + 1]]
+        r = [h / sk for h in half_a]
+        sig[k] = min(sig[k], _max_speed(rows[k], qv, r, half_a, sig[k]))
+    ms = np.minimum(np.ceil(1000.0 / sig - 1e-9), MAX_FRAME_MS)
+    _enforce_accel(d, ms, amax, from_rest=v_start <= 0.0)
+    return np.concatenate([[0.0], ms])
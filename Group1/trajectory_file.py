@@ -0,0 +1,209 @@
+"""Binary trajectory files (.trj), memory-mapped for playback straight from disk.
+
+    python trajectory_file.py info path.trj
+    python trajectory_file.py convert programs/program.npy out.trj [--pulses]
+
+Layout (little-endian): a 64-byte header, then `count` packed records.
+
+    offset size  field
+    0      6     magic b"ARMTRJ"
+    6      2     version (u16, = 1)
+    8      16    robot model, ASCII, NUL padded ("Group1")
+    24     4     model_crc: crc32 of the kinematic model the file was planned with
+                 (kinematics.model_signature: DH, joint offsets, base), plus the
+                 servo calibration for pulse files
+    28     1     kind: 0 = joint angles (f4, deg), 1 = pulses (i2, us)
+    29     1     n_joints
+    30     2     sample_ms: fixed period (ms), 0 = every record carries its own ms
+    32     8     count (u64, 0 while a recording is still open)
+    40     24    reserved (zero)
+
+    record = [ms: u2 (only when sample_ms == 0)] + n_joints x (f4 | i2)
+
+A file with count 0 (recording interrupted) is read up to its last whole record.
+TrajectoryFile maps the records with numpy.memmap: opening is instant whatever
+the size, and slicing returns views, nothing is read until a frame is encoded.
+"""
+import argparse
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+from kinematics import N_JOINTS, model_signature
+from servo_frames import angles_to_pulses, pulses_to_angles, default_encoder, calibration_signature
+
+MAGIC = b"ARMTRJ"
+VERSION = 1
+MODEL = "Group1"
+HEADER = struct.Struct("<6sH16sIBBHQ24x")
+ANGLES, PULSES = 0, 1
+KINDS = {"angles": ANGLES, "pulses": PULSES}
+
+
+def model_crc(kind=ANGLES):
+    """crc32 of the active model; pulse files also depend on the calibration
+    that turned the planned angles into pulses."""
+    sig = model_signature()
+    if kind == PULSES:
+        sig["calibration"] = calibration_signature()
+    return zlib.crc32(json.dumps(sig, sort_keys=True).encode())
+
+
+def record_dtype(kind, n_joints=N_JOINTS, sample_ms=0):
+    value = ("q", "<f4", (n_joints,)) if kind == ANGLES else ("q", "<i2", (n_joints,))
+    fields = [value] if sample_ms else [("ms", "<u2"), value]
+    return np.dtype(fields)           # packed: numpy does not align structured fields
+
+
+class TrajectoryWriter:
+    """Append-only writer; usable as a context manager. The sample count goes into
+    the header on close()."""
+
+    def __init__(self, path, kind="angles", sample_ms=0, model=MODEL, n_joints=N_JOINTS):
+        self.path = path
+        self.kind = KINDS[kind] if isinstance(kind, str) else kind
+        self.sample_ms = int(sample_ms)
+        self.n_joints = n_joints
+        self.dtype = record_dtype(self.kind, n_joints, self.sample_ms)
+        self.count = 0
+        self._header = (MAGIC, VERSION, model.encode("ascii")[:16], model_crc(self.kind), self.kind,
+                        n_joints, self.sample_ms)
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._f = open(path, "wb")
+        self._f.write(HEADER.pack(*self._header, 0))
+
+    def write(self, angles, durations_ms=None):
+        """Append (N, n_joints) joint angles (deg), with per-sample ms unless the
+        file has a fixed sample period."""
+        q = np.atleast_2d(np.asarray(angles, dtype=float))
+        rec = np.zeros(len(q), dtype=self.dtype)
+        rec["q"] = q if self.kind == ANGLES else angles_to_pulses(q)
+        if not self.sample_ms:
+            if durations_ms is None:
+                raise ValueError("per-sample durations required (file has sample_ms = 0)")
+            rec["ms"] = np.minimum(np.rint(np.atleast_1d(durations_ms)), 0xFFFF)
+        self._f.write(rec.tobytes())
+        self.count += len(rec)
+
+    def close(self):
+        if self._f is None:
+            return
+        self._f.seek(0)
+        self._f.write(HEADER.pack(*self._header, self.count))
+        self._f.close()
+        self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_trajectory(path, angles, durations_ms=None, sample_ms=0, kind="angles"):
+    with TrajectoryWriter(path, kind, sample_ms) as w:
+        w.write(angles, durations_ms)
+    return path
+
+
+class TrajectoryFile:
+    def __init__(self, path, model=MODEL):
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            raise ValueError(f"{path}: truncated header")
+        (magic, version, name, crc, self.kind, self.n_joints, self.sample_ms,
+         count) = HEADER.unpack(raw)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a trajectory file (v{VERSION})")
+        self.model = name.rstrip(b"\0").decode("ascii")
+        if self.model != model or crc != model_crc(self.kind):
+            what = "model / calibration" if self.kind == PULSES else "kinematic model"
+            raise ValueError(f"{path}: planned for {self.model!r} with another {what}")
+        self.dtype = record_dtype(self.kind, self.n_joints, self.sample_ms)
+        if count == 0:
+            count = (os.path.getsize(path) - HEADER.size) // self.dtype.itemsize
+        self.records = (np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER.size,
+                                  shape=(count,)) if count else np.zeros(0, self.dtype))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        """Records (memmap view for slices)."""
+        return self.records[index]
+
+    @property
+    def q(self):
+        """(N, n_joints) memmap view: angles (deg) or pulses (us), see .kind."""
+        return self.records["q"]
+
+    @property
+    def durations_ms(self):
+        if self.sample_ms:
+            return np.full(len(self), self.sample_ms, dtype=np.uint16)
+        return self.records["ms"]
+
+    @property
+    def duration_s(self):
+        if self.sample_ms:
+            return len(self) * self.sample_ms / 1000.0
+        return float(np.sum(self.records["ms"], dtype=np.int64)) / 1000.0
+
+    def angles(self, index=slice(None)):
+        """Joint angles (deg) of the selected records (converted if stored as pulses)."""
+        q = np.asarray(self.q[index], dtype=float)
+        return q if self.kind == ANGLES else pulses_to_angles(q)
+
+    def frames(self, start=0, stop=None, chunk=256):
+        """Yield (time_ms, frame, angles) from disk, `chunk` records at a time. Each
+        chunk is encoded in one FrameEncoder.batch() call; the frames are
+        memoryview slices of that chunk's block."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        enc = default_encoder()
+        for i in range(start, stop, chunk):
+            rec = self.records[i:min(i + chunk, stop)]
+            ms = np.full(len(rec), self.sample_ms) if self.sample_ms else rec["ms"]
+            q = rec["q"]
+            if self.kind == ANGLES:
+                frames = enc.batch_frames(angles_to_pulses(q), ms)
+            else:
+                frames = enc.batch_frames(q, ms)
+                q = self.angles(slice(i, i + len(rec)))
+            yield from zip(ms.tolist(), frames, q)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    i = sub.add_parser("info")
+    i.add_argument("path")
+    c = sub.add_parser("convert", help="compile a taught program (.npy) into a .trj")
+    c.add_argument("program")
+    c.add_argument("out")
+    c.add_argument("--pulses", action="store_true", help="store pre-encoded pulses (i2)")
+    args = ap.parse_args()
+
+    from kinematics import load_model
+    from calibration import ServoCalibration
+    from servo_frames import set_calibration
+    load_model()
+    set_calibration(ServoCalibration.load())
+    if args.cmd == "info":
+        t = TrajectoryFile(args.path)
+        kind = "angles f4" if t.kind == ANGLES else "pulses i2"
+        rate = f"{t.sample_ms} ms fixed" if t.sample_ms else "per-record ms"
+        print(f"{t.model}: {len(t)} records ({kind}, {rate}), {t.duration_s:.2f} s, "
+              f"{os.path.getsize(args.path)} bytes")
+    else:
+        from kinematics import HOME_ANGLES
+        from program import Program, compile_program
+        compiled = compile_program(Program.load(args.program), HOME_ANGLES)
+        q = np.array([a for _, _, a in compiled.frames])
+        ms = np.array([t for t, _, _ in compiled.frames])
+        write_trajectory(args.out, q, ms, kind="pulses" if args.pulses else "angles")
+        print(f"{len(q)} records -> {args.out}")
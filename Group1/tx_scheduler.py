@@ -0,0 +1,402 @@
+"""Transmit scheduler: one writer thread, priority lanes, stop preempts motion.
+
+    tx = TxScheduler(link.write).start()
+    tx.send(frame)                          # MOTION lane (streams, programs)
+    tx.send(frame, CONTROL)                 # single jogs, gripper
+    tx.stop(hold_frame, t_request)          # drop queued jogs / motion, hold frame goes next
+
+    tx.send(frame, CONTROL, flush=True)     # latency-critical: skip the coalescing window
+    tx.saturated                            # producers: hold off while True
+    tx.metrics()                            # bytes/s, utilization, queue, buffer ...
+
+    python tx_scheduler.py bench            # stop latency: FIFO vs lanes
+    python tx_scheduler.py load             # jog bursts with / without pacing
+    python tx_scheduler.py coalesce         # write calls with a 0 / 1 / 2 ms window
+
+The writer always takes the highest lane with something queued and writes one
+frame at a time, so a stop waits at most for the frame already on its way out
+(one frame time: 47 bytes ~ 4 ms at 115200 baud). stop() clears the CONTROL and
+MOTION lanes, so no jog, IK result or homing frame queued before the stop goes
+out after the hold frame, and bumps `epoch`: frames sent with an older epoch are
+discarded, so producers that captured the epoch before the stop cannot slip
+motion in after it.
+flush_output (pyserial's reset_output_buffer) empties the OS transmit buffer
+before the hold frame; only worth it where frames pile up in the driver, since it
+can cut a frame in half (harmless for the binary protocol, which resyncs on its
+header, not for LSC text). stop_latency holds request -> write() returned.
+
+Link accounting: every write costs len*10/baud s of wire time. Bytes handed to
+the port but not yet across the wire sit in the OS / adapter / controller input
+buffers; that backlog is estimated from the wire clock and the writer paces
+MOTION and CONTROL frames so it never exceeds `controller_buffer` bytes (urgent
+frames are never held back). `saturated` turns True once queued plus in-buffer
+bytes need more than `high_water_s` of wire time; the GUI pumps poll it and
+wait instead of piling up frames the controller cannot take yet.
+
+Coalescing (coalesce_s > 0, Nagle style): a control / motion frame waits up to
+coalesce_s for more to arrive, then everything queued (up to the buffer size) is
+joined and written with one call, so the six single-servo lines of a jog click
+cost one syscall / USB transfer instead of six. Urgent frames and frames sent
+with flush=True end the window at once. Not for protocols that acknowledge every
+frame (ServoLink with acks expects one reply per write).
+"""
+import argparse
+import threading
+import time
+from collections import deque
+
+from latency import LatencyHistogram
+
+URGENT, CONTROL, MOTION = 0, 1, 2
+LANES = ("urgent", "control", "motion")
+BITS_PER_BYTE = 10                  # 8N1
+CONTROLLER_BUFFER = 64              # bytes the controller side may hold unsent (~1 group frame)
+RATE_WINDOW_S = 1.0                 # bytes/s and utilization averaged over this
+COALESCE_MAX = 256                  # bytes per coalesced write without a controller_buffer
+
+
+class TxScheduler:
+    def __init__(self, write, flush_output=None, baud=115200, controller_buffer=CONTROLLER_BUFFER,
+                 high_water_s=0.05, coalesce_s=0.0, clock=time.perf_counter):
+        self._write = write
+        self.flush_output = flush_output
+        self.baud = baud
+        self.controller_buffer = controller_buffer    # None: no pacing
+        self.high_water_s = high_water_s
+        self.coalesce_s = coalesce_s
+        self.clock = clock
+        self.epoch = 0
+        self.stop_latency = LatencyHistogram("stop")
+        self.queue_latency = LatencyHistogram("tx queue")     # send -> write returned
+        self.written = [0, 0, 0]                  # frames per lane
+        self.write_calls = 0                      # port writes (syscalls), < frames when coalescing
+        self.dropped = 0                          # control / motion frames discarded by stops
+        self.errors = 0
+        self.bytes_written = 0
+        self.wire_s = 0.0                         # total estimated wire time
+        self.paced_s = 0.0                        # time the writer held frames back
+        self.peak_buffer = 0                      # max estimated bytes downstream of write()
+        self.saturated_count = 0                  # producer polls answered "saturated"
+        self._queued_bytes = 0
+        self._flush = False                       # a flush=True frame is waiting
+        self._wire_free = clock()                 # when the wire drains
+        self._recent = deque()                    # (t, nbytes) within RATE_WINDOW_S
+        self._lanes = (deque(), deque(), deque())
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self, drain=True):
+        """Stop the writer; with drain, after everything queued has been written."""
+        with self._cond:
+            if not drain:
+                for lane in self._lanes:
+                    lane.clear()
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(2.0)
+
+    # ---------------- producers ----------------
+    def send(self, frame, lane=MOTION, epoch=None, flush=False):
+        """Queue a frame. epoch: the value of self.epoch when the producer started;
+        False (frame dropped) if a stop happened since. flush: write it (and
+        whatever is queued before it) without waiting for the coalescing window."""
+        with self._cond:
+            if epoch is not None and epoch != self.epoch:
+                self.dropped += 1
+                return False
+            self._lanes[lane].append((frame, None, self.clock()))
+            self._queued_bytes += len(frame)
+            self._flush = self._flush or flush
+            self._cond.notify()
+        return True
+
+    def stop(self, frame, t_request=None):
+        """Preempt: drop queued control and motion frames, invalidate the current
+        epoch and send `frame` (e.g. a hold at the current position) before anything else."""
+        t_request = self.clock() if t_request is None else t_request
+        with self._cond:
+            for lane in (CONTROL, MOTION):
+                self.dropped += len(self._lanes[lane])
+                self._queued_bytes -= sum(len(item[0]) for item in self._lanes[lane])
+                self._lanes[lane].clear()
+            self._flush = False
+            self.epoch += 1
+            self._lanes[URGENT].append((frame, t_request, self.clock()))
+            self._queued_bytes += len(frame)
+            self._cond.notify()
+        return self.epoch
+
+    # ---------------- writer ----------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while not any(self._lanes) and not self._closed:
+                    self._cond.wait()
+                lane = next((i for i, q in enumerate(self._lanes) if q), None)
+                if lane is None:
+                    return                        # closed and drained
+                if lane == URGENT:
+                    batch = [(URGENT, self._lanes[URGENT][0])]
+                else:
+                    if self.coalesce_s > 0 and not (self._flush or self._closed):
+                        wait = self._lanes[lane][0][2] + self.coalesce_s - self.clock()
+                        if wait > 0 and self._queued_bytes < self._coalesce_max():
+                            self._cond.wait(wait)     # more frames, a flush or a stop end it early
+                            continue
+                    batch = self._batch(lane)
+                nbytes = sum(len(item[0]) for _, item in batch)
+                wait = self._pace(nbytes) if lane != URGENT else 0.0
+                if wait > 0:                      # a stop wakes us and is taken first
+                    t0 = self.clock()
+                    self._cond.wait(wait)
+                    self.paced_s += self.clock() - t0
+                    continue
+                for l, _ in batch:
+                    self._lanes[l].popleft()
+                self._queued_bytes -= nbytes
+                if not self._lanes[CONTROL] and not self._lanes[MOTION]:
+                    self._flush = False
+                self._busy = True
+            frames = [item[0] for _, item in batch]
+            try:
+                if lane == URGENT and self.flush_output is not None:
+                    self.flush_output()
+                    self._wire_free = self.clock()
+                self._write(frames[0] if len(frames) == 1 else b"".join(frames))
+                self.write_calls += 1
+                for l, _ in batch:
+                    self.written[l] += 1
+                self._account(nbytes)
+            except Exception as e:                # keep the writer alive, like write_frame
+                self.errors += 1
+                print("TX error:", e)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+            now = self.clock()
+            for _, (frame, t_request, t_queued) in batch:
+                self.queue_latency.record(now - t_queued)
+                if t_request is not None:
+                    self.stop_latency.record(now - t_request)
+
+    def _coalesce_max(self):
+        return self.controller_buffer or COALESCE_MAX
+
+    def _batch(self, lane):
+        """Queued control / motion frames, in lane order, that fit one write
+        (the first always does). Peeks only; the caller pops."""
+        batch = [(lane, self._lanes[lane][0])]
+        if self.coalesce_s <= 0:
+            return batch
+        room = self._coalesce_max() - len(batch[0][1][0])
+        for l in (CONTROL, MOTION):
+            for item in list(self._lanes[l])[1 if l == lane else 0:]:
+                if len(item[0]) > room:
+                    return batch
+                batch.append((l, item))
+                room -= len(item[0])
+        return batch
+
+    # ---------------- link accounting ----------------
+    def wire_time(self, nbytes):
+        """Seconds `nbytes` take on the line."""
+        return nbytes * BITS_PER_BYTE / self.baud
+
+    def _buffered(self, now):
+        """Estimated bytes written but not yet across the wire."""
+        return max(0.0, self._wire_free - now) * self.baud / BITS_PER_BYTE
+
+    def _pace(self, nbytes):
+        """Seconds to hold a frame back so the downstream buffer stays within
+        controller_buffer (a frame bigger than the buffer waits for it to drain)."""
+        if self.controller_buffer is None:
+            return 0.0
+        over = self._buffered(self.clock()) + nbytes - max(self.controller_buffer, nbytes)
+        return self.wire_time(over) if over > 0 else 0.0
+
+    def _account(self, nbytes):
+        now = self.clock()
+        wire = self.wire_time(nbytes)
+        self._wire_free = max(self._wire_free, now) + wire
+        self.bytes_written += nbytes
+        self.wire_s += wire
+        self.peak_buffer = max(self.peak_buffer, int(self._buffered(now)))
+        self._recent.append((now, nbytes))
+        while self._recent and now - self._recent[0][0] > RATE_WINDOW_S:
+            self._recent.popleft()
+
+    @property
+    def backlog_s(self):
+        """Estimated wire time until everything queued or buffered is out."""
+        return self.wire_time(self._queued_bytes + self._buffered(self.clock()))
+
+    @property
+    def saturated(self):
+        """True while the link is more than high_water_s behind; producers
+        should wait (backpressure) rather than queue more motion."""
+        if self.backlog_s > self.high_water_s:
+            self.saturated_count += 1
+            return True
+        return False
+
+    def bytes_per_s(self):
+        now = self.clock()
+        return sum(n for t, n in list(self._recent) if now - t <= RATE_WINDOW_S) / RATE_WINDOW_S
+
+    def metrics(self):
+        """Flat numbers for a dashboard / status line."""
+        rate = self.bytes_per_s()
+        buffered = self._buffered(self.clock())
+        return {"bytes_per_s": rate,
+                "utilization": rate * BITS_PER_BYTE / self.baud,
+                "queue_frames": sum(self.depth),
+                "queue_bytes": self._queued_bytes,
+                "backlog_ms": self.backlog_s * 1000.0,
+                "buffer_bytes": buffered,
+                "buffer_pct": 100.0 * buffered / self.controller_buffer if self.controller_buffer else 0.0,
+                "peak_buffer_bytes": self.peak_buffer,
+                "wire_s": self.wire_s,
+                "paced_s": self.paced_s,
+                "saturated_polls": self.saturated_count,
+                "write_calls": self.write_calls,
+                "syscalls_saved_pct": 100.0 * self.syscalls_saved()}
+
+    def syscalls_saved(self):
+        """Fraction of frames that did not need a write call of their own."""
+        frames = sum(self.written)
+        return 1.0 - self.write_calls / frames if frames else 0.0
+
+    def wait_idle(self, timeout=None):
+        """Block until every lane is empty and nothing is being written."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not any(self._lanes) and not self._busy, timeout)
+
+    @property
+    def depth(self):
+        return [len(q) for q in self._lanes]
+
+    def stats(self):
+        return {"written": dict(zip(LANES, self.written)), "queued": dict(zip(LANES, self.depth)),
+                "write_calls": self.write_calls, "syscalls_saved": self.syscalls_saved(),
+                "dropped": self.dropped, "errors": self.errors, "epoch": self.epoch,
+                "bytes": self.bytes_written, "peak_buffer_bytes": self.peak_buffer,
+                "stop_ms": self.stop_latency.summary()}
+
+
+class _Wire:
+    """Port at `baud` (10 bits/byte). blocking: write returns once the bytes are
+    on the wire; otherwise it returns at once (OS buffer) and peak counts the
+    bytes that were still waiting."""
+
+    def __init__(self, baud, blocking=True):
+        self.baud = baud
+        self.blocking = blocking
+        self.frames = []
+        self.peak = 0
+        self._free = time.perf_counter()
+
+    def write(self, data):
+        wire = len(data) * 10.0 / self.baud
+        if self.blocking:
+            time.sleep(wire)
+        else:
+            now = time.perf_counter()
+            self._free = max(self._free, now) + wire
+            self.peak = max(self.peak, int((self._free - now) * self.baud / 10))
+        self.frames.append(bytes(data))
+
+
+if __name__ == "__main__":
+    import random
+    from servo_frames import group_frame, servo_frame
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["bench", "load", "coalesce"])
+    ap.add_argument("--baud", type=int, default=115200)
+    ap.add_argument("--stops", type=int, default=50)
+    ap.add_argument("--backlog", type=int, default=30, help="motion frames queued at each stop")
+    ap.add_argument("--clicks", type=int, default=40, help="load: jog clicks, 30 servo lines each")
+    ap.add_argument("--click-ms", type=float, default=50.0, help="load: time between clicks")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    if args.cmd == "coalesce":
+        # jog clicks: six single-servo lines each (move_cartesian), plus a streamed move
+        clicks = [[servo_frame(i + 1, rng.randint(500, 2500), 200) for i in range(6)]
+                  for _ in range(args.clicks)]
+        stream = [group_frame([rng.uniform(0, 180) for _ in range(6)], 20) for _ in range(args.clicks)]
+        for window_ms in (0.0, 1.0, 2.0):
+            wire = _Wire(args.baud, blocking=False)
+            tx = TxScheduler(wire.write, baud=args.baud, controller_buffer=None,
+                             coalesce_s=window_ms / 1000.0).start()
+            for burst, f in zip(clicks, stream):
+                for line in burst:
+                    tx.send(line, CONTROL)
+                    time.sleep(0.0002)                # IK + print between lines
+                tx.send(f)
+                time.sleep(args.click_ms / 1000.0)
+            tx.wait_idle()
+            tx.close()
+            q = tx.queue_latency.summary()
+            print(f"window {window_ms:.0f} ms: {sum(tx.written)} frames in {tx.write_calls} writes "
+                  f"({100 * tx.syscalls_saved():4.1f} % fewer syscalls), "
+                  f"queue p50 {q['p50']:.2f} ms p99 {q['p99']:.2f} ms")
+        raise SystemExit
+
+    if args.cmd == "load":
+        burst = [servo_frame(i % 6 + 1, rng.randint(500, 2500), 200) for i in range(30)]
+        for paced in (False, True):
+            wire = _Wire(args.baud, blocking=False)
+            tx = TxScheduler(wire.write, baud=args.baud,
+                             controller_buffer=CONTROLLER_BUFFER if paced else None).start()
+            t0 = time.perf_counter()
+            held = 0.0
+            for _ in range(args.clicks):
+                t_click = time.perf_counter()
+                while paced and tx.saturated:         # backpressure: the jog waits
+                    time.sleep(0.001)
+                held += time.perf_counter() - t_click
+                for f in burst:
+                    tx.send(f, CONTROL)
+                time.sleep(max(0.0, args.click_ms / 1000.0 - (time.perf_counter() - t_click)))
+            m = tx.metrics()
+            tx.close()
+            elapsed = time.perf_counter() - t0
+            print(f"{'paced' if paced else 'free ':5s}: {tx.bytes_written} B in {elapsed:.2f} s, "
+                  f"offered {tx.bytes_written / elapsed * 10 / args.baud * 100:5.1f} % of the link, "
+                  f"peak unsent {wire.peak:5d} B ({wire.peak * 10 / args.baud * 1000:6.1f} ms), "
+                  f"producer held {held:.2f} s, writer paced {m['paced_s']:.2f} s")
+        raise SystemExit
+
+    motion = [group_frame([rng.uniform(0, 180) for _ in range(6)], 20) for _ in range(args.backlog)]
+    hold = group_frame([90.0] * 6, 20)
+    frame_ms = len(motion[0]) * 10.0 / args.baud * 1000.0
+
+    for mode in ("fifo", "lanes"):
+        wire = _Wire(args.baud)
+        tx = TxScheduler(wire.write, baud=args.baud, controller_buffer=None).start()
+        for _ in range(args.stops):
+            for f in motion:
+                tx.send(f)
+            time.sleep(rng.uniform(0.0, 0.01))        # press somewhere in the stream
+            if mode == "fifo":                        # old behaviour: behind the queue
+                t0 = time.perf_counter()
+                tx.send(hold)
+                tx.wait_idle()
+                tx.stop_latency.record(time.perf_counter() - t0)
+            else:
+                tx.stop(hold)
+                tx.wait_idle()
+        tx.close()
+        s = tx.stop_latency.summary()
+        print(f"{mode:5s}: stop -> wire p50 {s['p50']:6.2f} ms  p99 {s['p99']:6.2f} ms  "
+              f"max {s['max']:6.2f} ms  (one frame = {frame_ms:.2f} ms, "
+              f"{tx.dropped} queued frames dropped)")
@@ -0,0 +1,169 @@
+"""Reachability voxel map of the Group1 arm (0..180 deg on every joint).
+
+    python workspace.py build [--samples 1000000] [--voxel 0.01]
+    python workspace.py query X Y Z
+
+Files in cache/workspace/: occupancy.npy (bit-packed uint8, one bit per voxel),
+manip.npy (uint8, best position manipulability per voxel scaled to 0..255) and
+meta.json. Both arrays are memory-mapped on load; a query is a few integer ops
+and one byte read.
+"""
+import argparse
+import json
+import math
+import os
+import time
+import numpy as np
+
+from kinematics import (
+    DH_TABLE, BASE_OFFSET, N_JOINTS, JOINT_MIN, JOINT_MAX, jacobian_batch, joint_frames_batch,
+    load_model, manipulability_batch, model_signature
+)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "workspace")
+
+
+def _shift_or(grid):
+    """6-neighbour binary dilation of a 3D bool grid."""
+    out = grid.copy()
+    out[1:] |= grid[:-1]; out[:-1] |= grid[1:]
+    out[:, 1:] |= grid[:, :-1]; out[:, :-1] |= grid[:, 1:]
+    out[:, :, 1:] |= grid[:, :, :-1]; out[:, :, :-1] |= grid[:, :, 1:]
+    return out
+
+
+class WorkspaceMap:
+    def __init__(self, occupancy, manip, meta):
+        self.occupancy = occupancy          # packed bits, flat C order over dims
+        self.manip = manip                  # uint8 per voxel (or None)
+        self.meta = meta
+        self.voxel = meta["voxel"]
+        self.origin = np.array(meta["origin"])
+        self.dims = np.array(meta["dims"])
+        self.manip_scale = meta.get("manip_scale", 0.0)
+        # plain-float copies for the scalar fast path
+        self._o = tuple(float(v) for v in self.origin)
+        self._d = tuple(int(v) for v in self.dims)
+
+    # ---------------- build / persist ----------------
+    @classmethod
+    def build(cls, samples=1000000, voxel=0.01, with_manip=True, rng=None, chunk=50000):
+        """Sample joint space, mark every voxel an end-effector position falls in,
+        then close 1-voxel sampling holes (dilate + erode)."""
+        rng = np.random.default_rng(rng)
+        reach = sum(abs(d) + abs(a) for d, a, _ in DH_TABLE)
+        origin = np.array(BASE_OFFSET) - reach - voxel
+        dims = np.full(3, int(np.ceil(2 * (reach + voxel) / voxel)) + 1)
+        grid = np.zeros(dims, dtype=bool)
+        best = np.zeros(dims, dtype=float)
+        for i in range(0, samples, chunk):
+            q = rng.uniform(JOINT_MIN, JOINT_MAX, size=(min(chunk, samples - i), N_JOINTS))
+            pos = joint_frames_batch(q)[-1][:, :3, 3]
+            cells = np.floor((pos - origin) / voxel).astype(np.int64)
+            grid[cells[:, 0], cells[:, 1], cells[:, 2]] = True
+            if with_manip:
+                m = manipulability_batch(jacobian_batch(q)[:, :3])
+                np.maximum.at(best, (cells[:, 0], cells[:, 1], cells[:, 2]), m)
+        closed = ~_shift_or(~_shift_or(grid))
+        closed |= grid
+        meta = {"voxel": voxel, "origin": origin.tolist(), "dims": dims.tolist(),
+                "samples": samples, "model": model_signature(), "reachable_voxels": int(closed.sum())}
+        manip = None
+        if with_manip:
+            scale = float(best.max()) or 1.0
+            manip = np.round(best / scale * 255).astype(np.uint8).ravel()
+            meta["manip_scale"] = scale
+        return cls(np.packbits(closed.ravel()), manip, meta)
+
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "occupancy.npy"), self.occupancy)
+        if self.manip is not None:
+            np.save(os.path.join(path, "manip.npy"), self.manip)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """Memory-map a saved map. Returns None if missing or built for another DH table."""
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except OSError:
+            return None
+        if meta.get("model") != model_signature():
+            print("workspace map is stale (robot model changed), rebuild it")
+            return None
+        occupancy = np.load(os.path.join(path, "occupancy.npy"), mmap_mode="r")
+        manip_file = os.path.join(path, "manip.npy")
+        manip = np.load(manip_file, mmap_mode="r") if os.path.exists(manip_file) else None
+        return cls(occupancy, manip, meta)
+
+    # ---------------- query ----------------
+    def _flat(self, points):
+        """Flat voxel index per point, -1 outside the grid."""
+        cells = np.floor((np.asarray(points, dtype=float) - self.origin) / self.voxel).astype(np.int64)
+        inside = np.all((cells >= 0) & (cells < self.dims), axis=-1)
+        flat = (cells[..., 0] * self.dims[1] + cells[..., 1]) * self.dims[2] + cells[..., 2]
+        return np.where(inside, flat, -1)
+
+    def _flat_one(self, point):
+        v, (ox, oy, oz), (nx, ny, nz) = self.voxel, self._o, self._d
+        cx = math.floor((point[0] - ox) / v)
+        cy = math.floor((point[1] - oy) / v)
+        cz = math.floor((point[2] - oz) / v)
+        if not (0 <= cx < nx and 0 <= cy < ny and 0 <= cz < nz):
+            return -1
+        return (cx * ny + cy) * nz + cz
+
+    def reachable(self, point):
+        """True if the voxel of (x,y,z) holds a reachable position."""
+        i = self._flat_one(point)
+        if i < 0:
+            return False
+        return bool((int(self.occupancy[i >> 3]) >> (7 - (i & 7))) & 1)
+
+    def reachable_many(self, points):
+        """Vectorized reachable() for (N,3) points."""
+        i = self._flat(points)
+        ok = i >= 0
+        j = np.where(ok, i, 0)
+        bits = (np.asarray(self.occupancy)[j >> 3] >> (7 - (j & 7))) & 1
+        return ok & (bits == 1)
+
+    def manipulability(self, point):
+        """Best position manipulability seen in the voxel of (x,y,z) (0 if unknown)."""
+        i = self._flat_one(point)
+        if i < 0 or self.manip is None:
+            return 0.0
+        return float(self.manip[i]) / 255.0 * self.manip_scale
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--samples", type=int, default=1000000)
+    b.add_argument("--voxel", type=float, default=0.01)
+    b.add_argument("--no-manip", action="store_true")
+    b.add_argument("--path", default=DEFAULT_PATH)
+    q = sub.add_parser("query")
+    q.add_argument("xyz", type=float, nargs=3)
+    q.add_argument("--path", default=DEFAULT_PATH)
+    args = ap.parse_args()
+    load_model()
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        ws = WorkspaceMap.build(args.samples, args.voxel, with_manip=not args.no_manip)
+        ws.save(args.path)
+        print(f"{ws.meta['reachable_voxels']} reachable voxels from {args.samples} samples "
+              f"in {time.perf_counter() - t0:.1f} s -> {args.path}")
+    else:
+        ws = WorkspaceMap.load(args.path)
+        if ws is None:
+            raise SystemExit("no workspace map, run: python workspace.py build")
+        t0 = time.perf_counter()
+        ok = ws.reachable(args.xyz)
+        dt = time.perf_counter() - t0
+        print(f"reachable={ok} manipulability={ws.manipulability(args.xyz):.2e} ({dt*1e6:.1f} us)")
@@ -1,5 +1,8 @@
 # codedieukhien.py
+import json
+import os
 import sys
+import time
 import serial
 import serial.tools.list_ports
 import numpy as np
@@ -14,6 +17,16 @@ BAUD_RATE = 115200
 PULSE_STEP_PER_10DEG = [72.222, 50.0, 116.7, 105.55, 111.11, 105.55]
 PULSE_STEP_PER_DEG = [v / 10.0 for v in PULSE_STEP_PER_10DEG]
 
+# Tốc độ xung tối đa servo theo kịp khi có tải (us/s) -> tốc độ khớp = rate / step_per_deg
+SERVO_PULSE_RATE = 1000.0
+# Thời gian T nhỏ nhất cho một lệnh (ms)
+MIN_MOVE_MS = 20
+
+# Góc gửi lần cuối, lưu lại để lần chạy sau tiếp tục từ đó (ghi file tạm rồi os.replace)
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "last_state.json")
+# Trạng thái cũ hơn thế này -> không tin (tay có thể đã xoay servo khi tắt nguồn)
+STATE_MAX_AGE_S = 3600.0
+
 # Mặc định: xung "zero" (ở đây chọn 1500us làm trung tâm). Nếu servo thực tế khác, chỉnh list sau.
 PULSE_ZERO_OFFSET = [1500, 1500, 1500, 1500, 1500, 1500]
 
@@ -41,6 +54,61 @@ def angle_to_pulse(servo_index: int, angle_deg: float) -> int:
     return int(round(pulse))
 
 
+def sync_move_time_ms(start_angles, target_angles, pulse_rate=SERVO_PULSE_RATE):
+    """Thời gian (ms) để mọi khớp đến đích cùng lúc: khớp chậm nhất quyết định.
+       Servo i cần |dpulse_i| / pulse_rate giây; với chung một T, các khớp còn lại
+       tự chạy chậm hơn theo tỉ lệ. start_angles = None (chưa biết vị trí) -> tính
+       quãng đường xấu nhất từ biên 0/180 độ."""
+    t = 0.0
+    for i, target in enumerate(target_angles):
+        p1 = angle_to_pulse(i, target)
+        if start_angles is None:
+            dp = max(abs(p1 - angle_to_pulse(i, 0)), abs(p1 - angle_to_pulse(i, 180)))
+        else:
+            dp = abs(p1 - angle_to_pulse(i, start_angles[i]))
+        t = max(t, dp / pulse_rate)
+    return max(MIN_MOVE_MS, int(np.ceil(t * 1000.0)))
+
+
+def group_command(angles, time_ms):
+    """Một khung cho cả 6 servo: #1P..#2P..#6P..T<time>\r\n"""
+    body = "".join(f"#{i+1}P{angle_to_pulse(i, a)}" for i, a in enumerate(angles))
+    return f"{body}T{int(time_ms)}\r\n"
+
+
+def save_last_state(angles):
+    """Ghi góc + xung vừa gửi. File tạm + os.replace: bị ngắt giữa chừng thì file
+       cũ vẫn nguyên vẹn."""
+    data = {"t": time.time(), "angles": [float(a) for a in angles],
+            "pulses": [angle_to_pulse(i, a) for i, a in enumerate(angles)]}
+    tmp = STATE_FILE + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, STATE_FILE)
+    except OSError as e:
+        print("Không lưu được trạng thái:", e)
+
+
+def load_last_state(max_age_s=STATE_MAX_AGE_S):
+    """Góc đã lưu, hoặc (None, lý do) nếu thiếu / hỏng / quá cũ / bảng xung đã đổi."""
+    try:
+        with open(STATE_FILE) as f:
+            data = json.load(f)
+        angles = [float(a) for a in data["angles"]]
+        pulses = [int(p) for p in data["pulses"]]
+        age = time.time() - float(data["t"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, "không có trạng thái hợp lệ"
+    if len(angles) != 6 or any(not 0.0 <= a <= 180.0 for a in angles):
+        return None, "góc ngoài giới hạn"
+    if not 0.0 <= age <= max_age_s:
+        return None, f"trạng thái quá cũ ({age / 60:.0f} phút)"
+    if pulses != [angle_to_pulse(i, a) for i, a in enumerate(angles)]:
+        return None, "bảng xung đã thay đổi"
+    return angles, None
+
+
 class RobotController(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -52,6 +120,11 @@ class RobotController(QtWidgets.QMainWindow):
         self.current_port = None
         self.baud = BAUD_RATE
 
+        # Góc đã gửi lần cuối (None = chưa gửi gì, vị trí thật chưa biết)
+        self.last_angles = None
+        # True: move_home / send_all_joints dùng một khung chung, T theo khớp chậm nhất
+        self.sync_moves = True
+
         # SpinBox góc (tên chính xác từ robot_control.py)
         self.joint_spinboxes = [
             self.ui.spin_J1,
@@ -126,6 +199,19 @@ class RobotController(QtWidgets.QMainWindow):
                 for j in range(4):
                     self.ui.table_htm.setItem(i, j, QtWidgets.QTableWidgetItem("0.000000"))
 
+        # Vị trí lần chạy trước: hiện lên spinbox và coi như vị trí đã biết
+        # (không gửi gì, arm không chuyển động); không có thì như cũ -> chưa biết
+        angles, reason = load_last_state()
+        if angles is None:
+            print("Không khôi phục vị trí:", reason)
+        else:
+            for sb, a in zip(self.joint_spinboxes, angles):
+                sb.blockSignals(True)
+                sb.setValue(int(round(a)))
+                sb.blockSignals(False)
+            self.last_angles = angles
+            print("Khôi phục vị trí:", [round(a, 1) for a in angles])
+
         # Cập nhật label nút connect ban đầu
         self.update_connect_button_label()
 
@@ -202,15 +288,22 @@ class RobotController(QtWidgets.QMainWindow):
             return
         pulse = angle_to_pulse(servo_index, angle_deg)
         cmd = f"#{servo_index+1}P{pulse}T{int(speed)}\r\n"
+        if self.write_command(cmd) and self.last_angles is not None:
+            self.last_angles[servo_index] = float(angle_deg)
+            save_last_state(self.last_angles)
+
+    def write_command(self, cmd: str):
         if self.ser and self.ser.is_open:
             try:
                 self.ser.write(cmd.encode("ascii"))
                 print("Gửi:", cmd.strip())
+                return True
             except Exception as e:
                 print("Lỗi khi gửi serial:", e)
         else:
             # Khi chưa nối, in ra để debug
             print("Serial chưa mở — (simulate) Gửi:", cmd.strip())
+        return False
 
     # ---------- Joint control ----------
     def get_step_rot(self):
@@ -226,14 +319,33 @@ class RobotController(QtWidgets.QMainWindow):
         self.send_servo(joint_index, new_val, self.current_speed)
         self.update_htm_table()
 
+    def send_joints_sync(self, angles):
+        """Đưa cả 6 khớp tới `angles` trong một khung; T là thời gian nhỏ nhất mà
+           khớp có quãng xung dài nhất đạt được, nên mọi khớp đến cùng lúc và không
+           khớp nào vượt tốc độ servo."""
+        angles = [max(0.0, min(180.0, float(a))) for a in angles]
+        time_ms = sync_move_time_ms(self.last_angles, angles)
+        if self.write_command(group_command(angles, time_ms)):
+            # Chỉ cập nhật khi lệnh đã gửi đi; gửi lỗi thì vị trí vẫn là cái cũ
+            self.last_angles = angles
+            save_last_state(angles)
+        return time_ms
+
     def send_all_joints(self):
+        if self.sync_moves:
+            self.send_joints_sync([sb.value() for sb in self.joint_spinboxes])
+            return
         for i, sb in enumerate(self.joint_spinboxes):
             self.send_servo(i, sb.value(), self.current_speed)
 
     def move_home(self):
-        for i, sb in enumerate(self.joint_spinboxes):
+        for sb in self.joint_spinboxes:
             sb.setValue(90)
-            self.send_servo(i, 90, self.current_speed)
+        if self.sync_moves:
+            self.send_joints_sync([90] * 6)
+        else:
+            for i in range(6):
+                self.send_servo(i, 90, self.current_speed)
         self.update_htm_table()
 
     # ---------- Kinematics: DH and HTM ----------
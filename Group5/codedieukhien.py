@@ -1,3 +1,4 @@
+import math
 import sys
 import serial
 from PyQt5 import QtWidgets
@@ -7,6 +8,32 @@ from robot_control import Ui_MainWindow  # file giao diện đã convert từ .u
 SERIAL_PORT = 'COM3'   # Đổi lại theo cổng thực tế của bạn
 BAUD_RATE = 115200
 
+# Tốc độ xung tối đa servo theo kịp khi có tải (us/s); 2000us / 180° -> ~90°/s
+SERVO_PULSE_RATE = 1000.0
+# Thời gian T nhỏ nhất cho một lệnh (ms)
+MIN_MOVE_MS = 20
+
+
+def angle_to_pulse(angle):
+    """Góc (0..180) -> độ rộng xung (500..2500 us)."""
+    angle = max(0, min(180, angle))
+    return int(500 + (angle / 180) * 2000)
+
+
+def sync_move_time_ms(start_angles, target_angles, pulse_rate=SERVO_PULSE_RATE):
+    """Thời gian (ms) để mọi khớp đến đích cùng lúc: khớp đi xa nhất quyết định,
+    các khớp còn lại tự chạy chậm hơn với cùng T. start_angles = None (chưa biết
+    vị trí) -> tính quãng xấu nhất từ biên 0/180 độ."""
+    t = 0.0
+    for i, target in enumerate(target_angles):
+        p1 = angle_to_pulse(target)
+        if start_angles is None:
+            dp = max(abs(p1 - angle_to_pulse(0)), abs(p1 - angle_to_pulse(180)))
+        else:
+            dp = abs(p1 - angle_to_pulse(start_angles[i]))
+        t = max(t, dp / pulse_rate)
+    return max(MIN_MOVE_MS, int(math.ceil(t * 1000.0)))
+
 class RobotController(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -61,16 +88,39 @@ class RobotController(QtWidgets.QMainWindow):
 
         self.robot_on = False  # Trạng thái bật/tắt
 
-    def send_servo(self, servo_id, angle, speed=500):
-        """Gửi lệnh điều khiển servo qua Serial."""
+        # Góc đã gửi lần cuối; None = chưa biết vị trí (vừa khởi động)
+        self.last_angles = None
+
+    def write_command(self, cmd):
+        """Gửi một khung qua Serial; True nếu đã gửi được."""
         if self.ser and self.ser.is_open:
-            angle = max(0, min(180, angle))
-            pulse_width = int(500 + (angle / 180) * 2000)
-            cmd = f"#{servo_id+1}P{pulse_width}T{speed}\r\n"
             print(f"Gửi: {cmd.strip()}")
-            self.ser.write(cmd.encode('ascii'))
+            try:
+                self.ser.write(cmd.encode('ascii'))
+                return True
+            except serial.SerialException as e:
+                print("❌ Lỗi khi gửi serial:", e)
         else:
             print("❌ Serial chưa kết nối.")
+        return False
+
+    def send_servo(self, servo_id, angle, speed=500):
+        """Gửi lệnh điều khiển servo qua Serial."""
+        angle = max(0, min(180, angle))
+        cmd = f"#{servo_id+1}P{angle_to_pulse(angle)}T{speed}\r\n"
+        if self.write_command(cmd) and self.last_angles is not None:
+            self.last_angles[servo_id] = angle
+
+    def send_joints_sync(self, angles):
+        """Đưa các khớp tới `angles` trong một khung #1P..#4P..T..; T là thời gian
+        nhỏ nhất của khớp đi xa nhất, nên mọi khớp đến cùng lúc và không khớp nào
+        vượt tốc độ servo."""
+        angles = [max(0, min(180, a)) for a in angles]
+        time_ms = sync_move_time_ms(self.last_angles, angles)
+        body = "".join(f"#{i+1}P{angle_to_pulse(a)}" for i, a in enumerate(angles))
+        if self.write_command(f"{body}T{time_ms}\r\n"):
+            self.last_angles = angles
+        return time_ms
 
     def adjust_joint(self, joint_index, delta):
         """Điều chỉnh góc joint."""
@@ -81,15 +131,14 @@ class RobotController(QtWidgets.QMainWindow):
         self.send_servo(joint_index, new_val)
 
     def send_all_joints(self):
-        """Gửi toàn bộ góc hiện tại của các khớp."""
-        for i, spin in enumerate(self.joint_spinboxes):
-            self.send_servo(i, spin.value())
+        """Gửi toàn bộ góc hiện tại của các khớp (một khung, cùng đến đích)."""
+        self.send_joints_sync([spin.value() for spin in self.joint_spinboxes])
 
     def move_home(self):
         """Đưa robot về vị trí Home (90 độ mỗi khớp)."""
-        for i, spin in enumerate(self.joint_spinboxes):
+        for spin in self.joint_spinboxes:
             spin.setValue(90)
-            self.send_servo(i, 90)
+        self.send_joints_sync([90] * len(self.joint_spinboxes))
 
     def toggle_on(self):
         """Bật hoặc tắt robot."""